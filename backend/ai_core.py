@@ -1,36 +1,122 @@
 import os
 import json
+import logging
+import time
 import requests # Use the requests library for cleaner API calls
-import google.generativeai as genai
 from dotenv import load_dotenv
+from cities import get_city
+from geocode_cache import get_geocode_cache, normalize_location
+from triage import get_triage
+from http_client import get_http_client, maps_url
+from llm_cache import LLM_MODE, ReplayMissError, get_llm_cache, get_recordings, normalize_message
+from metrics import get_registry
+from structured_output import Field, JSONStreamParser, SchemaError, validate
 
 load_dotenv()
 
 # --- CONFIGURATION ---
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+# Used only to estimate spend in llm_cost_usd_total; set them to your contract's prices.
+GEMINI_USD_PER_MILLION_INPUT = float(os.getenv("GEMINI_USD_PER_MILLION_INPUT", "0.075"))
+GEMINI_USD_PER_MILLION_OUTPUT = float(os.getenv("GEMINI_USD_PER_MILLION_OUTPUT", "0.30"))
 
-# Check if keys are loaded
-if not GEMINI_API_KEY:
-    raise ValueError("Error: GEMINI_API_KEY environment variable not set.")
-if not GOOGLE_MAPS_API_KEY:
-    raise ValueError("Error: GOOGLE_MAPS_API_KEY environment variable not set.")
+log = logging.getLogger(__name__)
+LLM_SECONDS = get_registry().histogram("llm_request_duration_seconds", "Gemini call latency.", ("operation", "outcome"))
+LLM_TOKENS = get_registry().counter("llm_tokens_total", "Gemini tokens used.", ("operation", "kind"))
+LLM_COST = get_registry().counter("llm_cost_usd_total", "Estimated Gemini spend.", ("operation",))
+LLM_FALLBACKS = get_registry().counter(
+    "llm_fallbacks_total", "Answers served by a local fallback because the Gemini call failed.", ("operation",))
+LLM_INVALID = get_registry().counter(
+    "llm_invalid_replies_total", "Reply values dropped because they were not JSON or did not fit the schema.",
+    ("operation",))
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Gemini is imported and configured on first use, so importing this module (e.g. for
+# the ingestion pipeline's offline stubs, or a server worker starting up) does not
+# need keys, network access or the SDK's multi-second import.
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+_gemini_model = None
 
-# Use the latest, most compatible model. This is the key change.
-gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
+def get_gemini_model():
+    global _gemini_model
+    if _gemini_model is None:
+        if not GEMINI_API_KEY:
+            raise ValueError("Error: GEMINI_API_KEY environment variable not set.")
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        # Use the latest, most compatible model. This is the key change.
+        _gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    return _gemini_model
 
-
-# --- FUNCTION 1: GEMINI ANALYSIS (NEW ENHANCED VERSION) ---
-
-def analyze_sos_with_gemini(message: str) -> dict:
+def generate_json(operation: str, prompt: str, schema: dict, items: bool = False):
     """
-    Analyzes an SOS message for data extraction AND authenticity assessment.
+    One Gemini call, timed and token-counted under `operation`. The reply is streamed through a
+    tolerant JSON parser and each value checked against `schema` (structured_output.py); values
+    that do not fit are dropped and counted. Returns (the first valid object, or with items=True
+    every valid one, complete): a batch reply cut off mid-way still answers the messages before
+    the cut, but `complete` is only true for a reply that parsed to the end without repairs, the
+    only kind worth caching. LLM_MODE=replay answers from recorded replies instead (llm_cache.py).
     """
-    prompt = f"""
-    You are a sophisticated AI for a disaster response system. Your task is to analyze an incoming SOS message with two goals: data extraction and authenticity assessment.
+    started = time.perf_counter()
+    outcome = "error"
+    parser = JSONStreamParser()
+    values, chunks, error = [], [], None
+    try:
+        if LLM_MODE == "replay":
+            text = get_recordings().get(operation, prompt)
+            if text is None:
+                raise ReplayMissError(f"No recorded reply to this {operation} prompt.")
+            values = parser.feed(text)
+        else:
+            try:
+                response = get_gemini_model().generate_content(
+                    prompt, stream=True, generation_config={"response_mime_type": "application/json"})
+                for chunk in response:
+                    chunks.append(chunk.text)
+                    values.extend(parser.feed(chunk.text))
+                _count_tokens(operation, getattr(response, "usage_metadata", None))
+                if LLM_MODE == "record":
+                    get_recordings().add(operation, prompt, "".join(chunks))
+            except Exception as e:
+                if not values and not chunks:
+                    raise
+                error = e   # keep whatever arrived before the stream broke
+        repaired = parser.close()   # the reply stopped mid-value (token limit, broken stream)
+        values.extend(repaired)
+
+        results, invalid = [], parser.malformed
+        for value in values:
+            try:
+                results.append(validate(value, schema))
+            except SchemaError:
+                invalid += 1
+        if invalid:
+            LLM_INVALID.inc(operation, amount=invalid)
+            log.warning("Dropped invalid values from a Gemini reply", extra={"operation": operation, "invalid": invalid})
+        if not results:
+            raise error or SchemaError(f"No valid {operation} object in the reply.")
+        if error is not None:
+            log.warning("Gemini reply cut off; keeping what arrived",
+                        extra={"operation": operation, "values": len(results), "error": str(error)})
+        complete = error is None and not repaired
+        outcome = "ok" if complete else "partial"
+        return (results if items else results[0]), complete
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, operation, outcome)
+
+def _count_tokens(operation: str, usage):
+    if usage is None:
+        return
+    prompt_tokens, output_tokens = usage.prompt_token_count or 0, usage.candidates_token_count or 0
+    LLM_TOKENS.inc(operation, "prompt", amount=prompt_tokens)
+    LLM_TOKENS.inc(operation, "output", amount=output_tokens)
+    LLM_COST.inc(operation, amount=(prompt_tokens * GEMINI_USD_PER_MILLION_INPUT
+                                    + output_tokens * GEMINI_USD_PER_MILLION_OUTPUT) / 1e6)
+
 
+# --- FUNCTION 1: GEMINI ANALYSIS (NEW ENHANCED VERSION) ---
+
+ANALYSIS_INSTRUCTIONS = """
     **Part 1: Data Extraction**
     Extract the following fields:
     1.  **location**: The specific physical location (e.g., "Andheri station", "near Nagpur bridge"). If none, return "Unknown".
@@ -43,7 +129,42 @@ def analyze_sos_with_gemini(message: str) -> dict:
     1.  **authenticity_score**: An integer score from 1 (very likely fake/spam) to 10 (very likely authentic).
     2.  **reasoning**: A brief, one-sentence explanation for your score. Consider factors like specificity, vagueness, emotional tone, and presence of spam-like content.
     3.  **flags**: A list of any suspicious keywords or patterns detected (e.g., "vague location", "spam link", "generic plea"). If none, return an empty list [].
+"""
 
+URGENCY_LEVELS = ("Life-threatening", "Urgent", "Minor")
+NEED_TYPES = ("Rescue", "Medical", "Food", "Shelter", "Supplies", "Infrastructure")
+ANALYSIS_SCHEMA = {
+    "location": Field(default="Unknown"),
+    "urgency": Field(required=True, choices=URGENCY_LEVELS),
+    "need_type": Field(required=True, choices=NEED_TYPES),
+    "summary": Field(default=""),
+    # Required, so an item cut off before its score fails validation and is retried rather than
+    # stored (and hidden by is_visible) with no score.
+    "authenticity_score": Field("integer", required=True, minimum=1, maximum=10),
+    "reasoning": Field(default=""),
+    "flags": Field("list", default=[]),
+}
+BATCH_ANALYSIS_SCHEMA = {"id": Field(required=True), **ANALYSIS_SCHEMA}
+SITUATION_SCHEMA = {
+    "temperature": Field(required=True),
+    "condition": Field(required=True),
+    "insight": Field(required=True),
+}
+# Analyses are cached per message under one name, so a batch answer also serves a later single call.
+ANALYSIS_CACHE = "analyze"
+
+def analyze_sos_with_gemini(message: str) -> dict:
+    """
+    Analyzes an SOS message for data extraction AND authenticity assessment.
+    Repeats of a message already analysed (retweets, forwards) come from the response cache.
+    Falls back to the local triage model when Gemini is unavailable.
+    """
+    cached = get_llm_cache().get(ANALYSIS_CACHE, message)
+    if cached is not None:
+        return cached
+    prompt = f"""
+    You are a sophisticated AI for a disaster response system. Your task is to analyze an incoming SOS message with two goals: data extraction and authenticity assessment.
+    {ANALYSIS_INSTRUCTIONS}
     **Return the output ONLY as a single, valid JSON object.**
 
     **Message:** "{message}"
@@ -51,36 +172,105 @@ def analyze_sos_with_gemini(message: str) -> dict:
     **JSON Output:**
     """
     try:
-        response = gemini_model.generate_content(prompt)
-        # Clean up the response to ensure it's valid JSON
-        json_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(json_text)
+        analysis, complete = generate_json("analyze", prompt, ANALYSIS_SCHEMA)
     except Exception as e:
-        print(f"Gemini analysis failed: {e}")
-        return None
+        log.warning("Gemini analysis failed, using local triage", extra={"error": str(e)})
+        LLM_FALLBACKS.inc("analyze")
+        return local_analysis([message])[0]
+    if complete:
+        get_llm_cache().put(ANALYSIS_CACHE, message, analysis)
+    return analysis
+
+def analyze_sos_batch_with_gemini(messages: list) -> dict:
+    """
+    Analyzes several SOS messages in one Gemini call.
+    `messages` is a list of (message_id, text); returns {message_id: analysis}.
+    Messages already in the response cache are answered from it, and repeats within the batch are sent once.
+    Messages missing from the reply are simply absent, so callers can retry them one by one.
+    Only answers from a reply that parsed to the end are cached; a truncated one is used, not kept.
+    If the call itself fails, every uncached message is answered by the local triage model instead.
+    """
+    cache = get_llm_cache()
+    answers, pending = {}, {}   # pending: normalized text -> [(message_id, text), ...]
+    for message_id, text in messages:
+        cached = cache.get(ANALYSIS_CACHE, text)
+        if cached is not None:
+            answers[message_id] = cached
+        else:
+            pending.setdefault(normalize_message(text), []).append((message_id, text))
+    if not pending:
+        return answers
+
+    asked = [copies[0] for copies in pending.values()]
+    numbered = "\n".join(f'    {{"id": {json.dumps(str(message_id))}, "message": {json.dumps(text)}}}' for message_id, text in asked)
+    prompt = f"""
+    You are a sophisticated AI for a disaster response system. Your task is to analyze a batch of incoming SOS messages with two goals: data extraction and authenticity assessment.
+    For EACH message, produce the fields below.
+    {ANALYSIS_INSTRUCTIONS}
+    **Return the output ONLY as a valid JSON array with one object per message, each including its "id" exactly as given.**
+
+    **Messages:**
+{numbered}
+
+    **JSON Output:**
+    """
+    try:
+        results, complete = generate_json("analyze_batch", prompt, BATCH_ANALYSIS_SCHEMA, items=True)
+    except Exception as e:
+        log.warning("Gemini batch analysis failed, using local triage",
+                    extra={"messages": len(asked), "error": str(e)})
+        LLM_FALLBACKS.inc("analyze_batch", amount=len(asked))
+        copies = [copy for copies in pending.values() for copy in copies]
+        answers.update((message_id, analysis) for (message_id, _), analysis
+                       in zip(copies, local_analysis([text for _, text in copies])))
+        return answers
+    by_id = {str(message_id): key for key, ((message_id, _), *_) in pending.items()}
+    for item in results:
+        key = by_id.pop(item.pop("id"), None)
+        if key is None:
+            continue
+        copies = pending[key]
+        if complete:
+            cache.put(ANALYSIS_CACHE, copies[0][1], item)
+        for message_id, _ in copies:
+            answers[message_id] = {**item, "flags": list(item["flags"])}
+    return answers
+
+def local_analysis(messages: list) -> list:
+    """Gemini-shaped analyses from the local triage classifier, flagged so reviewers know no LLM saw them."""
+    analyses = get_triage().analyze_batch(messages)
+    for analysis in analyses:
+        analysis["flags"].append("local triage fallback")
+    return analyses
 
 # --- FUNCTION 2: GEOLOCATION (IMPROVED) ---
-# --- FUNCTION 2: GEOLOCATION (IMPROVED FOR DEBUGGING) ---
 def get_coordinates(location_text: str) -> dict:
-    """Converts a location text into latitude and longitude using Google Maps Geocoding API."""
-    if not location_text or location_text == "Unknown":
-        print(f"Skipping geocoding because location is '{location_text}'.")
+    """
+    Converts a location text into latitude and longitude. Known landmarks and
+    previously seen places come from the geocode cache; only new places reach Google.
+    """
+    if not location_text or normalize_location(location_text) in ("", "unknown"):
+        log.debug("Skipping geocoding of an unknown location", extra={"location": location_text})
         return None
-    
+    return get_geocode_cache(fetch=geocode_with_google).lookup(location_text)
+
+# --- FUNCTION 2: GEOLOCATION (IMPROVED FOR DEBUGGING) ---
+def geocode_with_google(location_text: str) -> dict:
+    """Converts a location text into latitude and longitude using Google Maps Geocoding API."""
     if not GOOGLE_MAPS_API_KEY:
-        print("Skipping geocoding because GOOGLE_MAPS_API_KEY is not set.")
+        log.warning("Skipping geocoding because GOOGLE_MAPS_API_KEY is not set")
         return None
         
     params = {
         'address': location_text,
         'key': GOOGLE_MAPS_API_KEY
     }
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
+    url = maps_url("/maps/api/geocode/json")
     
-    print(f"Attempting to geocode location: '{location_text}'")
+    log.info("Geocoding location", extra={"location": location_text})
     
     try:
-        response = requests.get(url, params=params)
+        response = get_http_client().get("geocoding", url, params=params)
         response.raise_for_status() # Raises an HTTPError for bad responses (4xx or 5xx)
         
         result = response.json()
@@ -88,17 +278,16 @@ def get_coordinates(location_text: str) -> dict:
         # --- THIS IS THE NEW DEBUGGING LOGIC ---
         if result['status'] == 'OK':
             coordinates = result['results'][0]['geometry']['location']
-            print(f"Successfully found coordinates: {coordinates}")
+            log.info("Geocoded location", extra={"location": location_text, **coordinates})
             return coordinates
         else:
             # Tell us exactly why it failed!
-            print(f"Geocoding failed. Status: {result['status']}")
-            if 'error_message' in result:
-                print(f"Error Message: {result['error_message']}")
+            log.warning("Geocoding failed", extra={"location": location_text, "status": result['status'],
+                                                   "error": result.get('error_message')})
             return None
             
     except requests.exceptions.RequestException as e:
-        print(f"Geocoding request failed with an exception: {e}")
+        log.warning("Geocoding request failed", extra={"location": location_text, "error": str(e)})
         return None
 
 # --- FUNCTION 3: SEVERITY SCORING ---
@@ -114,46 +303,55 @@ def assign_severity_score(analysis: dict) -> int:
     return score
 
 # --- ORCHESTRATOR ---
-def process_sos_message(message_id: int, text: str) -> dict:
-    print(f"Processing message {message_id}: '{text}'")
-    analysis = analyze_sos_with_gemini(text)
-    if not analysis:
-        return {"id": message_id, "error": "AI analysis failed."}
-    
-    location_text = analysis.get("location")
-    coordinates = get_coordinates(f"{location_text}, Mumbai") if location_text else None
-    
-    severity = assign_severity_score(analysis)
-
+def build_incident_record(message_id, text: str, analysis: dict, coordinates: dict) -> dict:
+    """Shapes an analysis + geocode result into the incident record the dashboard consumes."""
     return {
         "id": message_id,
         "original_message": text,
-        "location_text": location_text,
+        "location_text": analysis.get("location"),
         "urgency": analysis.get("urgency"),
         "need_type": analysis.get("need_type"),
         "summary": analysis.get("summary"),
-        "severity_score": severity,
+        "severity_score": assign_severity_score(analysis),
         "coordinates": coordinates,
         "authenticity_score": analysis.get("authenticity_score"),
         "reasoning": analysis.get("reasoning"),
         "flags": analysis.get("flags", [])
     }
 
+def process_sos_message(message_id: int, text: str) -> dict:
+    log.info("Processing message", extra={"message_id": message_id})
+    analysis = analyze_sos_with_gemini(text)
+    if not analysis:
+        return {"id": message_id, "error": "AI analysis failed."}
+    
+    location_text = analysis.get("location")
+    coordinates = get_coordinates(get_city().geocode_query(location_text)) if location_text else None
+
+    return build_incident_record(message_id, text, analysis, coordinates)
+
 # --- FUNCTION 4: SITUATION OVERVIEW (NEW) ---
-def generate_situation_report() -> dict:
+def generate_situation_report(aggregates: dict = None) -> dict:
     """
-    Generates a brief, realistic 2-sentence summary of Mumbai's current condition 
+    Generates a brief, realistic 2-sentence summary of the city's current condition
     (weather/traffic) based on the time of day using Gemini.
+    `aggregates` (see situation_report.incident_aggregates) grounds the insight in live incident data.
     """
     import datetime
     current_time = datetime.datetime.now().strftime("%I:%M %p")
+    city = get_city().label
+    incident_context = ""
+    if aggregates:
+        incident_context = f"""
+    Live incident picture (use it to ground the insight): {json.dumps(aggregates)}
+    """
     
     prompt = f"""
-    You are an AI reporting on the current status of Mumbai for a disaster dashboard.
+    You are an AI reporting on the current status of {city} for a disaster dashboard.
     Current Time: {current_time}.
-    
+    {incident_context}
     Generate a JSON object with:
-    1. "temperature": A realistic temperature for Mumbai at this time (e.g., "28°C").
+    1. "temperature": A realistic temperature for {city} at this time (e.g., "28°C").
     2. "condition": Short weather description (e.g., "Humid & Cloudy", "Heavy Rain").
     3. "insight": A 1-sentence strategic insight for emergency responders (e.g., "Expect delays on Western Express Highway due to peak hour traffic.", "High tide expected at 4 PM, monitor coastal areas.").
     
@@ -161,11 +359,10 @@ def generate_situation_report() -> dict:
     """
     
     try:
-        response = gemini_model.generate_content(prompt)
-        json_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(json_text)
+        return generate_json("situation_report", prompt, SITUATION_SCHEMA)[0]
     except Exception as e:
-        print(f"Situation Report generation failed: {e}")
+        log.warning("Situation report generation failed", extra={"error": str(e)})
+        LLM_FALLBACKS.inc("situation_report")
         return {
             "temperature": "30°C", 
             "condition": "Clear", 
@@ -174,6 +371,8 @@ def generate_situation_report() -> dict:
 
 # --- EXAMPLE USAGE ---
 if __name__ == "__main__":
+    from logs import configure_logging
+    configure_logging()
     sample_messages = [
         "Family of 4 trapped in our car near Nagpur bridge. My son is having trouble breathing. Urgent medical help needed!",
         "Stuck on the roof at Andheri station, water level rising fast! Need immediate rescue. #MumbaiFloods",
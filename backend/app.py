@@ -1,63 +1,361 @@
 import json
+import logging
+import math
 import os
+import time
+import zlib
 import requests
 from datetime import datetime
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 from dotenv import load_dotenv
+from cities import get_city
+from incident_store import DEFAULT_PAGE_SIZE, IncidentStore
+from incident_table import COLUMNS_MIME, json_document
+from geo_index import CODE_PRECISION, parse_time, precision_for_zoom
+from geocode_cache import get_geocode_cache
+from routing import get_road_graph
+from fleet import FLEET_STATE_FILE, FleetRegistry
+from poi_index import get_poi_index, start_background_refresh
+from situation_report import SITUATION_REPORT_FILE, SituationReportCache, incident_aggregates
+from triage import get_triage
+from http_client import get_http_client, maps_url
+from logs import configure_logging
+from metrics import METRICS_DIR, get_registry
+from profiler import SamplingProfiler
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+log = logging.getLogger("app")
 
 app = Flask(__name__)
 CORS(app)
 
 # --- Configuration ---
-PROCESSED_DATA_FILE = "processed_data.json"
-RESCUE_HQ_COORDS = "18.9486,72.8336"
+# The city this process serves (CITY / CITIES_FILE, see cities.py): its data files, HQ and fleet.
+# router.py runs one such process per city behind a single endpoint.
+CITY = get_city()
+PROCESSED_DATA_FILE = CITY.path("processed_data.json")
+SSE_HEARTBEAT_SECONDS = 15
+# Any of these switches /get_sos_data from the full feed to a filtered, paged query.
+SOS_QUERY_PARAMS = ("bbox", "after", "before", "hours", "category", "min_severity", "min_authenticity",
+                    "cursor", "limit", "view", "cursors")
+RESCUE_HQ_COORDS = f"{CITY.hq[0]},{CITY.hq[1]}"
+ROAD_GRAPH_FILE = CITY.path(CITY.road_graph)
+ROUTING_PROVIDER = os.getenv("ROUTING_PROVIDER", "local")  # "local" road graph or "google" Directions API
+POI_DATA_FILE = CITY.path(CITY.poi_data)
+POI_RADIUS_M = 5000
+POI_REFRESH_HOURS = float(os.getenv("POI_REFRESH_HOURS", "0"))  # 0 = serve the bundled file only
+SITUATION_REPORT_INTERVAL_SECONDS = float(os.getenv("SITUATION_REPORT_INTERVAL_SECONDS", "300"))
+# Set by asgi.py when several worker processes serve this app; they then share the fleet and
+# situation report through the SHARED_* files in the city's data_dir and follow each other's journal writes.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SHARED_FLEET_FILE = CITY.path(FLEET_STATE_FILE)
+SHARED_REPORT_FILE = CITY.path(SITUATION_REPORT_FILE)
+SHARED_METRICS_DIR = CITY.path(METRICS_DIR)
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"   # per-request latency histograms
+PROFILER_HZ = float(os.getenv("PROFILER_HZ", "0"))           # > 0 starts the sampling profiler (/debug/profile)
 
 if not GOOGLE_MAPS_API_KEY:
-    print("Warning: GOOGLE_MAPS_API_KEY not found in environment. Checking .env file...")
-    # Double check if .env exists
-    if os.path.exists(".env"):
-        print(".env file found.")
-    else:
-        print(".env file NOT found.")
-    raise ValueError("Error: GOOGLE_MAPS_API_KEY environment variable is not set.")
+    # Only provider=google routing and the Places refresh need it; everything else is served locally.
+    log.warning("GOOGLE_MAPS_API_KEY is not set (checked the environment and .env). "
+                "Google Directions and Places calls will fail until it is.")
+
+# --- Incident Store ---
+# Recovered from snapshot + journal once at startup; /get_sos_data serves from memory from then on.
+incident_store = IncidentStore(PROCESSED_DATA_FILE)
+try:
+    log.info("Loaded incidents", extra={"incidents": incident_store.load(), "path": PROCESSED_DATA_FILE})
+except (FileNotFoundError, json.JSONDecodeError) as e:
+    log.warning("Incident store not loaded yet; will retry on the first request", extra={"error": str(e)})
+if SERVER_WORKERS > 1:
+    incident_store.start_following()   # wake /sos_stream clients for reports other workers took
+
+# --- Fleet Registry ---
+# Starts with the city's configured units (Mumbai: the dashboard's defaults); positions/status arrive via POST /fleet.
+fleet_registry = FleetRegistry(units=CITY.fleet, path=SHARED_FLEET_FILE if SERVER_WORKERS > 1 else None)
+
+# --- POI Index ---
+# Optional: keep poi_data.json fresh from the Places API off the request path.
+if POI_REFRESH_HOURS > 0:
+    start_background_refresh(GOOGLE_MAPS_API_KEY, POI_REFRESH_HOURS * 3600, POI_DATA_FILE)
+
+# --- Situation Report ---
+# One Gemini call per interval for every dashboard, grounded in the live incident picture.
+def build_situation_report():
+    from ai_core import generate_situation_report
+    return generate_situation_report(incident_aggregates(incident_store.snapshot()))
+
+situation_cache = SituationReportCache(build_situation_report, SITUATION_REPORT_INTERVAL_SECONDS,
+                                       shared_path=SHARED_REPORT_FILE if SERVER_WORKERS > 1 else None)
+situation_cache.start()
+
+# --- Metrics & Profiling ---
+# Per-endpoint latency here; upstream, LLM, cache and journal instruments live in their modules.
+metrics = get_registry()
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "Request latency by endpoint.",
+                                    ("endpoint", "method", "status"))
+SSE_CLIENTS = metrics.gauge("sos_stream_clients", "Open /sos_stream connections.")
+
+def collect_app_metrics():
+    store, journal = incident_store.stats(), incident_store.journal.stats()
+    return [
+        ("incident_store_incidents", "gauge", "Incidents in memory.",
+         [({"visibility": "visible"}, store["visible"]), ({"visibility": "hidden"}, store["hidden"])]),
+        ("incident_store_change_log", "gauge", "Changes kept for ?since= deltas.", [({}, store["change_log"])]),
+        ("incident_journal_queue_depth", "gauge", "Journal records waiting, by stage.",
+         [({"stage": stage}, journal[stage]) for stage in ("unsynced", "unpolled", "since_rotate")]),
+        ("fleet_units", "gauge", "Units in the fleet registry.", [({}, len(fleet_registry))]),
+        ("situation_report_refreshes", "gauge", "Reports taken into this process's cache.",
+         [({}, situation_cache.refresh_count)]),
+    ]
+
+metrics.add_collector(collect_app_metrics)
+if SERVER_WORKERS > 1:
+    metrics.share(SHARED_METRICS_DIR)   # /metrics on any worker reports the whole server
+
+profiler = None
+if PROFILER_HZ > 0:
+    profiler = SamplingProfiler(PROFILER_HZ)
+    profiler.start()
+
+@app.before_request
+def start_timer():
+    if METRICS_ENABLED:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    if METRICS_ENABLED and 'request_started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_started,
+                                request.endpoint or "unmatched", request.method, str(response.status_code))
+    return response
 
 # --- API Endpoints ---
 @app.route('/get_sos_data', methods=['GET'])
 def get_sos_data():
-    # This function remains the same...
-    print("\n--- Received request for SOS data ---")
+    """
+    Full incident feed, or only what changed with ?since=<revision>[&epoch=<epoch>],
+    or one page of a filtered query (see query_sos_data).
+    All honour If-None-Match, so an unchanged feed costs a 304 and no body. The feed and query
+    pages come as binary columns instead of JSON for Accept: application/x-incident-columns.
+    """
     try:
-        with open(PROCESSED_DATA_FILE, 'r', encoding='utf-8') as f:
-            all_data = json.load(f)
-        filtered_data = [
-            item for item in all_data 
-            if item.get("coordinates") and item.get("authenticity_score", 0) >= 4
-        ]
-        sorted_data = sorted(filtered_data, key=lambda x: x['severity_score'], reverse=True)
-        print(f"Returning {len(sorted_data)} pre-processed and filtered messages.")
-        return jsonify(sorted_data)
+        if not incident_store.loaded:
+            incident_store.load()
+        incident_store.refresh()   # reports taken by other worker processes
+        if any(name in request.args for name in SOS_QUERY_PARAMS):
+            return query_sos_data(request.args)
+        since = request.args.get('since', type=int)
+        if since is not None:
+            etag, body, added = incident_store.changes_since_json(since, request.args.get('epoch'))
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            log.debug("Returning delta", extra={"since": since, "added": added})
+            response = Response(body, mimetype='application/json')
+        elif wants_columns():
+            etag, body = incident_store.versioned_snapshot_columns()
+            etag = "c-" + etag   # same revision, different body
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            log.debug("Returning full feed", extra={"etag": etag})
+            response = Response(body, mimetype=COLUMNS_MIME)
+        else:
+            etag, body = incident_store.versioned_snapshot_json()
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            log.debug("Returning full feed", extra={"etag": etag})
+            response = Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['X-Incident-Revision'] = etag.rpartition('-')[2]
+        response.vary.add('Accept')
+        return response
     except FileNotFoundError:
         return jsonify({"error": "Processed data file not found. Run the pre-processing script."}), 500
     except json.JSONDecodeError:
         return jsonify({"error": "Failed to decode the processed data file."}), 500
 
+def wants_columns() -> bool:
+    """Content negotiation: binary columns only when the client prefers them to JSON (browsers send */*)."""
+    return request.accept_mimetypes.best_match(['application/json', COLUMNS_MIME]) == COLUMNS_MIME
+
+def parse_incident_filters(args) -> dict:
+    """
+    Filters shared by the /get_sos_data query mode and /get_sos_tiles. Raises ValueError on bad input.
+    bbox is south,west,north,east (the map's getBounds().toUrlValue()); after/before are ISO timestamps;
+    hours=N keeps the last N hours; category is a comma-separated list.
+    """
+    filters = {}
+    if 'bbox' in args:
+        try:
+            south, west, north, east = (float(value) for value in args['bbox'].split(','))
+        except ValueError:
+            raise ValueError("bbox must be four numbers: south,west,north,east.")
+        if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+            raise ValueError("bbox must satisfy south <= north and west <= east, in degrees.")
+        filters['bbox'] = (south, west, north, east)
+    for name in ('after', 'before'):
+        if name in args:
+            value = parse_time(args[name])
+            if math.isnan(value):
+                raise ValueError(f"{name} must be an ISO 8601 timestamp.")
+            filters[name] = value
+    if 'hours' in args:
+        # The window slides by whole minutes, so a polling dashboard still gets 304s in between.
+        after = (time.time() // 60 * 60) - number_arg(args, 'hours', float) * 3600
+        filters['after'] = max(filters.get('after', after), after)
+    if args.get('category'):
+        filters['categories'] = [name.strip() for name in args['category'].split(',') if name.strip()]
+    for name in ('min_severity', 'min_authenticity'):
+        if name in args:
+            filters[name] = number_arg(args, name, float)
+    return filters
+
+def number_arg(args, name, cast):
+    try:
+        return cast(args[name])
+    except ValueError:
+        raise ValueError(f"{name} must be a number.")
+
+def query_sos_data(args):
+    """
+    One page of incidents matching the filters, in feed order:
+    {"incidents", "total", "next_cursor", "epoch", "revision"}. Pass next_cursor back as ?cursor= for the
+    next page (limit= sets the page size). view=summary trims each incident to what a map marker needs;
+    with Accept: application/x-incident-columns the page comes as binary columns (view is ignored).
+    cursors=1 adds each incident's own cursor (`cursors`), which router.py needs to merge cities' pages.
+    """
+    try:
+        filters = parse_incident_filters(args)
+        limit = number_arg(args, 'limit', int) if 'limit' in args else DEFAULT_PAGE_SIZE
+        view = args.get('view', 'full')
+        if view not in ('full', 'summary'):
+            raise ValueError("view must be 'full' or 'summary'.")
+        if wants_columns():
+            view = 'columns'
+        cursors = args.get('cursors') == '1'
+        page = incident_store.query(cursor=args.get('cursor'), limit=limit, view=view, cursors=cursors, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Same data revision + same normalized query = same page.
+    query_key = repr((sorted(filters.items()), args.get('cursor'), limit, view, cursors))
+    etag = f"{page.pop('etag')}-q{zlib.crc32(query_key.encode()):08x}"
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    if view == 'columns':
+        response = Response(page['body'], mimetype=COLUMNS_MIME)
+    elif view == 'summary':
+        response = jsonify(page)
+    else:
+        incidents = page.pop('incidents')
+        response = Response(json_document(page, incidents=incidents), mimetype='application/json')
+    log.debug("Returning query page", extra={"view": view, "total": page['total']})
+    response.set_etag(etag)
+    response.headers['X-Incident-Revision'] = str(page['revision'])
+    response.vary.add('Accept')
+    return response
+
+@app.route('/get_sos_tiles', methods=['GET'])
+def get_sos_tiles():
+    """
+    Clustered markers: incident count, mean position and top severity per geohash cell, for
+    ?zoom=<map zoom> (or precision=1-8) plus the /get_sos_data filters, usually bbox.
+    """
+    try:
+        if not incident_store.loaded:
+            incident_store.load()
+        incident_store.refresh()
+        filters = parse_incident_filters(request.args)
+        if 'precision' in request.args:
+            precision = number_arg(request.args, 'precision', int)
+        elif 'zoom' in request.args:
+            precision = precision_for_zoom(number_arg(request.args, 'zoom', float))
+        else:
+            raise ValueError("Missing zoom (or precision) parameter.")
+        if not 1 <= precision <= CODE_PRECISION:
+            raise ValueError(f"precision must be between 1 and {CODE_PRECISION}.")
+    except FileNotFoundError:
+        return jsonify({"error": "Processed data file not found. Run the pre-processing script."}), 500
+    except json.JSONDecodeError:   # a ValueError too, so caught first
+        return jsonify({"error": "Failed to decode the processed data file."}), 500
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tiles = incident_store.tiles(precision, **filters)
+    etag = f"{tiles.pop('etag')}-t{zlib.crc32(repr((sorted(filters.items()), precision)).encode()):08x}"
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = jsonify(tiles)
+    response.set_etag(etag)
+    response.headers['X-Incident-Revision'] = str(tiles['revision'])
+    return response
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+@app.route('/sos_stream', methods=['GET'])
+def sos_stream():
+    """
+    Server-sent events: one `incident` event per new or updated incident, and one `removed`
+    event ({"id", "city"}) per incident taken off the feed.
+    Event ids are "<epoch>-<revision>", so EventSource reconnects resume via Last-Event-ID; the
+    first message only sets the id, so a reconnect before any event resumes from the connect time too.
+    A `reset` event tells the client to refetch /get_sos_data.
+    """
+    if not incident_store.loaded:
+        incident_store.load(missing_ok=True)
+    resume_from = request.headers.get('Last-Event-ID', '')
+    epoch, _, revision = resume_from.rpartition('-')
+    if epoch and revision.isdigit():
+        start_epoch, start_revision = epoch, int(revision)
+    else:
+        start_epoch, start_revision = incident_store.epoch, incident_store.revision
+
+    def stream(epoch, revision):
+        SSE_CLIENTS.inc()
+        try:
+            yield f"retry: 3000\nid: {epoch}-{revision}\n\n"
+            yield from follow(epoch, revision)
+        finally:
+            SSE_CLIENTS.dec()
+
+    def follow(epoch, revision):
+        while True:
+            if incident_store.wait_for_change(revision, SSE_HEARTBEAT_SECONDS) == revision:
+                yield ": keep-alive\n\n"
+                continue
+            delta = incident_store.changes_since(revision, epoch)
+            event_id = delta["etag"]
+            if delta["reset"]:
+                yield f"id: {event_id}\nevent: reset\ndata: {json.dumps({'revision': delta['revision']})}\n\n"
+            else:
+                for incident in delta["added"] + delta["updated"]:   # already JSON text
+                    yield f"id: {event_id}\nevent: incident\ndata: {incident}\n\n"
+                for incident_id, city in zip(delta["removed"], delta["removed_cities"]):
+                    removed = json.dumps({"id": incident_id, "city": city})
+                    yield f"id: {event_id}\nevent: removed\ndata: {removed}\n\n"
+            epoch, revision = delta["epoch"], delta["revision"]
+
+    return Response(stream(start_epoch, start_revision), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/get_situation_update', methods=['GET'])
 def get_situation_update():
-    from ai_core import generate_situation_report
+    """Cached report; a stale one is served while the next is generated in the background."""
     try:
-        report = generate_situation_report()
-        return jsonify(report)
+        return jsonify(situation_cache.get())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/get_route', methods=['GET'])
 def get_route():
-    # This function remains the same...
+    """
+    Route from a unit (or HQ) to an incident, answered by the offline road graph.
+    Pass provider=google to use the Directions API instead.
+    """
     destination_lat = request.args.get('lat')
     destination_lng = request.args.get('lng')
     start_lat = request.args.get('start_lat')
@@ -68,11 +366,25 @@ def get_route():
     
     origin = f"{start_lat},{start_lng}" if start_lat and start_lng else RESCUE_HQ_COORDS
     destination_coords = f"{destination_lat},{destination_lng}"
-    
-    url = "https://maps.googleapis.com/maps/api/directions/json"
+
+    if request.args.get('provider', ROUTING_PROVIDER) == 'google':
+        return get_google_route(origin, destination_coords)
+
+    try:
+        origin_lat, origin_lng = (float(value) for value in origin.split(','))
+        route_info = get_road_graph(ROAD_GRAPH_FILE).route(origin_lat, origin_lng,
+                                                           float(destination_lat), float(destination_lng))
+    except ValueError:
+        return jsonify({"error": "Latitude and longitude must be numbers."}), 400
+    if route_info is None:
+        return jsonify({"error": "Offline routing could not find a route.", "status": "ZERO_RESULTS"}), 404
+    return jsonify(route_info)
+
+def get_google_route(origin, destination_coords):
+    url = maps_url("/maps/api/directions/json")
     params = {'origin': origin, 'destination': destination_coords, 'key': GOOGLE_MAPS_API_KEY}
     try:
-        response = requests.get(url, params=params)
+        response = get_http_client().get("directions", url, params=params)
         response.raise_for_status()
         directions = response.json()
         if directions['status'] == 'OK':
@@ -96,44 +408,31 @@ def get_route():
 def get_nearby_places():
     """
     Finds nearby hospitals, police stations, and fire stations for given coordinates.
+    Answered from the local POI index; no Places API call on the request path.
     """
     lat = request.args.get('lat')
     lng = request.args.get('lng')
     if not lat or not lng:
         return jsonify({"error": "Missing latitude or longitude parameters."}), 400
 
-    location = f"{lat},{lng}"
-    radius = 5000  # Search within a 5km radius
-
-    # A helper function to perform the search for a specific place type
-    def find_places(place_type):
-        url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-        params = {
-            'location': location,
-            'radius': radius,
-            'type': place_type,
-            'key': GOOGLE_MAPS_API_KEY
-        }
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            results = response.json().get('results', [])
-            # We only need the name and location for the map
-            return [{"name": place['name'], "location": place['geometry']['location']} for place in results]
-        except requests.exceptions.RequestException as e:
-            print(f"Error finding {place_type}: {e}")
-            return []
-
-    # Perform searches for all three types
-    hospitals = find_places('hospital')
-    police_stations = find_places('police')
-    fire_stations = find_places('fire_station')
-
-    return jsonify({
-        "hospitals": hospitals,
-        "police_stations": police_stations,
-        "fire_stations": fire_stations
-    })
+    radius = request.args.get('radius', POI_RADIUS_M, type=float)  # Search within a 5km radius by default
+    try:
+        return jsonify(get_poi_index(POI_DATA_FILE).nearby(float(lat), float(lng), radius))
+    except ValueError:
+        return jsonify({"error": "Latitude and longitude must be numbers."}), 400
+
+@app.route('/get_nearby_places/batch', methods=['POST'])
+def get_nearby_places_batch():
+    """Body: {"points": [{"lat", "lng"}, ...], "radius": 5000}. Returns one result per point, in order."""
+    data = request.get_json(silent=True) or {}
+    points = data.get('points')
+    if not isinstance(points, list):
+        return jsonify({"error": "Expected a list of points with lat and lng."}), 400
+    try:
+        coords = [(float(p['lat']), float(p['lng'])) for p in points]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Every point needs numeric lat and lng."}), 400
+    return jsonify(get_poi_index(POI_DATA_FILE).nearby_batch(coords, float(data.get('radius', POI_RADIUS_M))))
 
 # ==============================================================================
 # === NEW: REPORT INCIDENT ENDPOINT ===
@@ -141,41 +440,29 @@ def get_nearby_places():
 @app.route('/report_incident', methods=['POST'])
 def report_incident():
     data = request.json
-    print(f"Received new incident report: {data}")
+    log.info("Received incident report", extra={"report": data})
     
     # 1. Basic Validation
     if not data or 'description' not in data or 'lat' not in data or 'lng' not in data:
         return jsonify({"error": "Missing required fields (description, lat, lng)"}), 400
 
-    # 2. Simulate AI Analysis (or use real AI if key exists)
-    # In a real scenario, we would send 'data['description']' to Gemini here.
-    # For now, we will auto-generate some fields based on the description to keep it fast/responsive.
-    
+    # 2. Local triage: lexicon + small trained model, microseconds instead of an LLM round trip.
+    # Reports no keyword rule matched keep the old generic defaults; unsure ones are flagged for review.
+    # The report has coordinates, so naming no gazetteer place is no reason for doubt here.
     description = data['description']
-    
-    # Simple keyword based classification for the demo
-    urgency = "Urgent"
-    severity = 5
-    need = "General Assistance"
-    
-    desc_lower = description.lower()
-    if "fire" in desc_lower or "explosion" in desc_lower:
-        urgency = "Life-threatening"
-        severity = 9
-        need = "Firefighters"
-    elif "flood" in desc_lower or "drowning" in desc_lower:
-        urgency = "Life-threatening"
-        severity = 8
-        need = "Rescue Boat"
-    elif "medical" in desc_lower or "blood" in desc_lower or "heart" in desc_lower:
-        urgency = "Life-threatening"
-        severity = 9
-        need = "Medical Support"
+    triage = get_triage().classify(description)
+    if not triage["keywords"]:
+        urgency, severity, need = "Urgent", 5, "General Assistance"
+    else:
+        urgency, severity, need = triage["urgency"], triage["severity"], triage["label"]
+    flags = [f"spam keyword: {keyword}" for keyword in triage["spam"]]
+    if not triage["confident"]:
+        flags.append("low triage confidence")
     
     new_incident = {
         "id": int(str(int(data['lat'] * 1000)) + str(int(data['lng'] * 1000))), # Fake ID generation
         "original_message": description,
-        "location_text": "User Reported Location",
+        "location_text": get_geocode_cache().reverse(float(data['lat']), float(data['lng'])) or "User Reported Location",
         "urgency": urgency,
         "need_type": need,
         "summary": description,
@@ -186,32 +473,94 @@ def report_incident():
         },
         "authenticity_score": 10, # User reported is generally high for demo
         "reasoning": "Direct verified report from user on ground.",
-        "flags": [],
-        "timestamp": datetime.now().isoformat()
+        "flags": flags,
+        "triage_confidence": triage["confidence"],
+        "timestamp": datetime.now().isoformat(),
+        "city": CITY.name
     }
 
-    # 3. Add to our in-memory data (so it shows up in /get_sos_data calls)
+    # 3. Journal it and add it to the in-memory index (so it shows up in /get_sos_data calls)
     try:
-        # Load existing
-        if os.path.exists(PROCESSED_DATA_FILE):
-             with open(PROCESSED_DATA_FILE, 'r', encoding='utf-8') as f:
-                current_data = json.load(f)
-        else:
-            current_data = []
-
-        # Prepend new incident
-        current_data.insert(0, new_incident)
+        if not incident_store.loaded:
+            incident_store.load(missing_ok=True)
+        incident_store.add(new_incident)
 
-        # Save back
-        with open(PROCESSED_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(current_data, f, indent=4)
-            
-        print("Incident saved successfully.")
+        log.info("Incident saved", extra={"incident_id": new_incident["id"]})
         return jsonify({"message": "Incident reported successfully", "incident": new_incident})
 
-    except Exception as e:
-        print(f"Error saving incident: {e}")
+    except Exception:
+        log.exception("Error saving incident")
         return jsonify({"error": "Internal Server Error"}), 500
 
+# ==============================================================================
+# === FLEET REGISTRY & BATCH DISPATCH ===
+# ==============================================================================
+@app.route('/fleet', methods=['GET', 'POST'])
+def fleet():
+    """GET lists every unit; POST upserts a list of units ({id, type, status, lat, lng, ...})."""
+    if request.method == 'GET':
+        return jsonify(fleet_registry.all())
+    units = request.json
+    if not isinstance(units, list) or not all(isinstance(u, dict) and {'id', 'lat', 'lng'} <= u.keys() for u in units):
+        return jsonify({"error": "Expected a list of units with id, lat and lng."}), 400
+    try:
+        count = fleet_registry.upsert(units)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Unit lat/lng must be numbers."}), 400
+    return jsonify({"message": f"Updated {count} units", "fleet_size": len(fleet_registry)})
+
+@app.route('/dispatch/batch', methods=['POST'])
+def dispatch_batch():
+    """
+    Assigns available units to many open incidents at once.
+    Body (all optional): {"incident_ids": [...], "min_severity": 7, "commit": false}
+    """
+    options = request.get_json(silent=True) or {}
+    if not isinstance(options, dict):
+        return jsonify({"error": "Expected a JSON object."}), 400
+    incident_ids = options.get('incident_ids')
+    if incident_ids is not None and not (isinstance(incident_ids, list) and all(
+            isinstance(i, (int, str)) and not isinstance(i, bool) for i in incident_ids)):
+        return jsonify({"error": "incident_ids must be a list of incident ids."}), 400
+    try:
+        if isinstance(options.get('min_severity'), bool):
+            raise ValueError
+        min_severity = float(options.get('min_severity', 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "min_severity must be a number."}), 400
+    if not incident_store.loaded:
+        incident_store.load(missing_ok=True)
+    incident_store.refresh()
+    # Skipping served incidents here saves decoding them; the registry checks again under its lock.
+    incidents = incident_store.incidents(ids=incident_ids, min_severity=min_severity,
+                                         exclude_ids=fleet_registry.dispatched_incident_ids())
+
+    result = fleet_registry.dispatch_batch(incidents, commit=bool(options.get('commit')))
+    log.info("Batch dispatch", extra={"assigned": len(result['assignments']),
+                                      "waiting": len(result['unassigned']),
+                                      "already_dispatched": len(result['already_dispatched']), "elapsed_ms": result['elapsed_ms']})
+    return jsonify(result)
+
+# ==============================================================================
+# === OBSERVABILITY ===
+# ==============================================================================
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text format: latency histograms, cache/LLM/upstream counters, queue depths."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    Folded stacks from the sampling profiler (this worker only), for flamegraph.pl or speedscope.
+    Needs PROFILER_HZ > 0. ?reset=1 starts a fresh window after reading.
+    """
+    if profiler is None:
+        return jsonify({"error": "Profiler is off; start the server with PROFILER_HZ=100."}), 404
+    samples = profiler.samples
+    body = profiler.collapsed(reset=request.args.get('reset') == '1')
+    return Response(body, mimetype='text/plain', headers={'X-Profile-Samples': str(samples)})
+
 if __name__ == '__main__':
+    # Development server. For production use the ASGI entry point: python asgi.py --workers 4
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
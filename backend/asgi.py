@@ -0,0 +1,234 @@
+"""
+Production entry point: serves app.py over ASGI (uvicorn) with several worker processes.
+
+Flask stays the one definition of every endpoint. The event loop only parses
+HTTP and moves bytes; each view runs on a bounded thread pool, so file I/O,
+outbound HTTP and CPU-heavy routing never block the loop or each other.
+Streaming responses (/sos_stream) are pulled chunk by chunk on a pool of their
+own, so open dashboards cannot starve ordinary requests. (asgiref's WsgiToAsgi
+is not used: it runs every request on one shared thread.)
+
+Workers are separate processes, each with its own in-memory indexes. With
+SERVER_WORKERS > 1, app.py shares the mutable state through files in its
+city's data_dir (cities.py): the incident journal (appends under a lock file, each worker tails the
+others' records), the fleet (fleet_state.json), the situation report
+(one worker generates it, the rest read situation_report.json) and the
+metrics (each worker publishes to metrics/, /metrics adds them up).
+
+app.py is imported by create_app() inside each worker, never by the launcher
+process, so only workers load data and start background threads.
+
+Run from backend/:
+    python asgi.py --workers 4 --port 5001
+    python asgi.py --city pune --port 5002      # one city of CITIES_FILE (router.py starts these)
+    SERVER_WORKERS=4 uvicorn asgi:create_app --factory --workers 4 --port 5001
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cities import get_city
+from fleet import FLEET_STATE_FILE
+from metrics import METRICS_DIR
+from situation_report import SITUATION_REPORT_FILE
+
+# --- CONFIGURATION ---
+DEFAULT_PORT = 5001
+REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", "32"))   # concurrent views per worker
+STREAM_THREADS = int(os.getenv("STREAM_THREADS", "256"))    # concurrent /sos_stream clients per worker
+_DONE = object()
+
+log = logging.getLogger(__name__)
+
+
+def build_environ(scope: dict, body: bytes, multiprocess: bool = False) -> dict:
+    """WSGI environ for one ASGI HTTP request (PEP 3333 strings are latin-1)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": multiprocess,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name, value = raw_name.decode("latin-1"), raw_value.decode("latin-1")
+        if name == "content-type":
+            environ["CONTENT_TYPE"] = value
+        elif name == "content-length":
+            environ["CONTENT_LENGTH"] = value
+        else:
+            key = "HTTP_" + name.upper().replace("-", "_")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ExecutorWSGI:
+    """ASGI app that runs a WSGI app's views on thread pools."""
+
+    def __init__(self, wsgi_app, request_threads: int = REQUEST_THREADS, stream_threads: int = STREAM_THREADS,
+                 multiprocess: bool = False):
+        self.wsgi_app = wsgi_app
+        self.multiprocess = multiprocess
+        self.request_pool = ThreadPoolExecutor(request_threads, thread_name_prefix="request")
+        self.stream_pool = ThreadPoolExecutor(stream_threads, thread_name_prefix="stream")
+        self.on_startup = []    # blocking callables run in the background once the worker is up
+        self.on_shutdown = []
+        self.open_streams = 0   # only touched on the event loop
+
+    def collect_metrics(self) -> list:
+        """Queue depths: views waiting for a request thread, and streams holding a stream thread."""
+        return [
+            ("asgi_request_queue_depth", "gauge", "Requests waiting for a free request thread.",
+             [({}, self.request_pool._work_queue.qsize())]),
+            ("asgi_open_streams", "gauge", "Streaming responses in progress.", [({}, self.open_streams)]),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    # --- internal helpers ---
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                for warm in self.on_startup:
+                    loop.run_in_executor(self.request_pool, warm)   # not awaited: serve while warming
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for stop in self.on_shutdown:
+                    await loop.run_in_executor(None, stop)
+                self.request_pool.shutdown(wait=False)
+                self.stream_pool.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        status, headers, body, stream = await loop.run_in_executor(
+            self.request_pool, self._call, build_environ(scope, b"".join(chunks), self.multiprocess))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if stream is None:
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        disconnected = asyncio.Event()
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch())
+        chunks = iter(stream)
+        self.open_streams += 1
+        try:
+            while not disconnected.is_set():
+                chunk = await loop.run_in_executor(self.stream_pool, next, chunks, _DONE)
+                if chunk is _DONE:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            self.open_streams -= 1
+            watcher.cancel()
+            if hasattr(stream, "close"):
+                await loop.run_in_executor(self.stream_pool, stream.close)
+
+    def _call(self, environ: dict):
+        """
+        Runs the view on a pool thread. Returns (status, headers, body, stream): responses
+        with a Content-Length are read whole here; others are handed back as an iterator.
+        """
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started["status"], started["headers"] = status, response_headers
+
+        try:
+            iterable = self.wsgi_app(environ, start_response)
+        except Exception:
+            log.exception("Unhandled error", extra={"path": environ['PATH_INFO']})
+            return 500, [(b"content-type", b"text/plain")], b"Internal Server Error", None
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in started["headers"]]
+        status = int(started["status"].split(" ", 1)[0])
+        if any(name == b"content-length" for name, _ in headers):
+            try:
+                return status, headers, b"".join(iterable), None
+            finally:
+                if hasattr(iterable, "close"):
+                    iterable.close()
+        return status, headers, b"", iterable
+
+
+def create_app() -> ExecutorWSGI:
+    """ASGI app factory; runs once in each worker process."""
+    import app as backend
+
+    def warm_indexes():
+        # Build the lazily loaded indexes now, so the first real requests do not pay for them.
+        started = time.perf_counter()
+        backend.get_road_graph(backend.ROAD_GRAPH_FILE)
+        backend.get_poi_index(backend.POI_DATA_FILE)
+        backend.get_triage()
+        log.info("Worker warmed indexes", extra={"seconds": round(time.perf_counter() - started, 2)})
+
+    asgi_app = ExecutorWSGI(backend.app, multiprocess=backend.SERVER_WORKERS > 1)
+    asgi_app.on_startup.append(warm_indexes)
+    asgi_app.on_shutdown.append(backend.incident_store.journal.close)
+    backend.metrics.add_collector(asgi_app.collect_metrics)
+    return asgi_app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the backend API with uvicorn worker processes.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--city", help="configured city to serve (default: $CITY, else the first)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    city = get_city(args.city)
+    os.environ["SERVER_WORKERS"] = str(args.workers)   # inherited by the worker processes
+    os.environ["CITY"] = city.name
+    # Start every run from the default fleet, a fresh report and zeroed metrics, as the dev server does.
+    for path in (city.path(FLEET_STATE_FILE), city.path(SITUATION_REPORT_FILE)):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.rmtree(city.path(METRICS_DIR), ignore_errors=True)
+    uvicorn.run("asgi:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                access_log=False, log_level="warning")
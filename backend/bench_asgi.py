@@ -0,0 +1,99 @@
+"""
+Benchmark: the Flask dev server (python app.py) vs. the ASGI mode (python asgi.py)
+under concurrent /get_sos_data + /get_route load.
+
+Each server runs as its own process in a scratch directory seeded with
+generated incidents, and is driven by load_replay.py's open-loop replay at
+increasing request rates. Dashboards poll /get_sos_data with If-None-Match,
+as load_replay does, so most feed requests are 304s once a client has the
+current ETag; in ASGI mode that ETag is the same on every worker.
+
+Run from backend/:  python bench_asgi.py [--rates 100,200,400] [--workers 1,2]
+Needs ports 5001 (the dev server's fixed port) and 5002 free.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from incident_journal import reset
+from load_replay import HTTPTarget, replay
+from scenario_generator import generate_incidents
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MIX = {"get_sos_data": 1, "get_route": 1}
+DURATION_SECONDS = 10.0
+CONCURRENCY = 64
+INCIDENTS = 2000
+SHARED_FILES = ("road_graph.json", "poi_data.json")   # read relative to the working directory
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+def start_server(command: list, url: str, workdir: str) -> tuple:
+    """Starts a server in its own process group; returns (process, seconds until it answered)."""
+    env = {**os.environ, "SITUATION_REPORT_INTERVAL_SECONDS": "3600"}
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    while time.perf_counter() - started < STARTUP_TIMEOUT_SECONDS:
+        try:
+            requests.get(url + "/get_sos_data", timeout=1)
+            return process, time.perf_counter() - started
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"{' '.join(command)} did not come up on {url}")
+
+
+def stop_server(process):
+    # The dev server's reloader and uvicorn's workers are children; stop the whole group.
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dev server vs. ASGI mode under concurrent load.")
+    parser.add_argument("--rates", default="100,200,400", help="offered requests per second, comma separated")
+    parser.add_argument("--workers", default="1,2", help="ASGI worker counts to try, comma separated")
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS)
+    parser.add_argument("--incidents", type=int, default=INCIDENTS)
+    args = parser.parse_args()
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    servers = [("dev server", [sys.executable, os.path.join(HERE, "app.py")], "http://127.0.0.1:5001")]
+    for workers in args.workers.split(","):
+        servers.append((f"asgi x{workers}", [sys.executable, os.path.join(HERE, "asgi.py"), "--workers", workers,
+                                             "--port", "5002"], "http://127.0.0.1:5002"))
+
+    print(f"{'server':<12} | {'rate':>5} | {'achieved':>8} | {'errors':>6} | {'sos p50':>8} | {'sos p99':>8} | "
+          f"{'route p50':>9} | {'route p99':>9}")
+    print("-" * 87)
+    for label, command, url in servers:
+        with tempfile.TemporaryDirectory(prefix="bench_asgi_") as workdir:
+            reset(os.path.join(workdir, "processed_data.json"), generate_incidents(args.incidents, seed=1))
+            for name in SHARED_FILES:
+                os.symlink(os.path.join(HERE, name), os.path.join(workdir, name))
+            process, startup = start_server(command, url, workdir)
+            try:
+                print(f"{label:<12} | started in {startup:.2f}s")
+                for rate in rates:
+                    report = replay(HTTPTarget(url), rate, args.duration, MIX, CONCURRENCY)
+                    sos, route = report["endpoints"]["get_sos_data"], report["endpoints"]["get_route"]
+                    errors = sos["errors"] + route["errors"]
+                    print(f"{label:<12} | {rate:>5.0f} | {report['achieved_rate']:>8.1f} | {errors:>6} | "
+                          f"{sos['p50_ms']:>8.2f} | {sos['p99_ms']:>8.2f} | {route['p50_ms']:>9.2f} | "
+                          f"{route['p99_ms']:>9.2f}")
+            finally:
+                stop_server(process)
+
+
+if __name__ == '__main__':
+    main()
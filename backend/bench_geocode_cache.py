@@ -0,0 +1,65 @@
+"""
+Benchmark: geocode cache hit rates and per-lookup latency.
+
+Feeds location strings the way SOS messages phrase them (exact landmark names,
+abbreviations, "near ..." prefixes, typos and some places outside the gazetteer)
+through a cold and then a warm cache, with StubGeocoder standing in for Google.
+
+Run from backend/:  python bench_geocode_cache.py
+"""
+import os
+import random
+import tempfile
+
+from geocode_cache import GeocodeCache
+from ingest_stubs import StubGeocoder
+from preprocess_data import LOCATIONS
+
+LOOKUPS = 2_000
+UNKNOWN_PLACES = ["Nagpur bridge", "Causeway House", "KEM Hospital Parel", "Hindmata junction",
+                  "Milan subway", "Kalina university", "Saki Naka metro", "Wadala depot"]
+
+
+def variants(name: str) -> list:
+    typo = name[:-2] + name[-1] + name[-2] if len(name) > 4 else name
+    return [name, name.replace("Station", "Stn"), f"near {name}", f"{name}, Mumbai", typo, name.lower()]
+
+
+def workload(count: int) -> list:
+    queries = []
+    for _ in range(count):
+        if random.random() < 0.1:
+            queries.append(random.choice(UNKNOWN_PLACES))
+        else:
+            queries.append(random.choice(variants(random.choice(LOCATIONS)["name"])))
+    return queries
+
+
+def run(cache: GeocodeCache, queries: list, label: str):
+    for query in queries:
+        cache.lookup(query)
+    stats = cache.stats()
+    print(f"\n{label}: {stats['lookups']} lookups, hit rate {stats['hit_rate']:.1%}")
+    for tier, tier_stats in stats["tiers"].items():
+        print(f"  {tier:<10} {tier_stats['count']:>6}  avg {tier_stats['avg_ms']:.3f} ms")
+
+
+def main():
+    random.seed(11)
+    queries = workload(LOOKUPS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "geocode_cache.sqlite3")
+        geocoder = StubGeocoder(latency_seconds=0.05)
+
+        cache = GeocodeCache(path, fetch=geocoder.geocode)
+        run(cache, queries, "cold start (seeded gazetteer only)")
+        cache.close()
+
+        # A restart: memory is empty, but network answers are on disk now.
+        cache = GeocodeCache(path, fetch=geocoder.geocode)
+        run(cache, queries, "after restart (disk warm)")
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: the shared outbound client vs. bare requests.get, against
+fake_upstream.py with injected latency, errors, stalls and an outage.
+
+Run from backend/:  python bench_http_client.py
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+import fake_upstream
+from fake_upstream import FakeUpstream
+from http_client import OutboundClient
+
+CALLS = 200
+THREADS = 16
+BENCH_POLICY = {"timeout": (0.5, 0.5), "retries": 2, "failure_threshold": 5, "reset_seconds": 1.0,
+                "rate_per_second": 1000.0, "burst": 1000}
+fake_upstream.STALL_SECONDS = 3.0   # a bare call with no timeout waits this long
+
+
+def bare_get(url, params):
+    return requests.get(url, params=params)   # what the handlers did before: no session, no timeout
+
+
+def run_calls(call, url, addresses, threads: int = THREADS) -> dict:
+    latencies, ok = [], [0]
+    lock = threading.Lock()
+
+    def one(address):
+        start = time.perf_counter()
+        try:
+            response = call(url, {"address": address})
+            success = response.status_code == 200
+        except requests.exceptions.RequestException:
+            success = False
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            ok[0] += success
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, addresses))
+    seconds = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {"ok": ok[0], "seconds": seconds, "p50": np.percentile(ms, 50), "p99": np.percentile(ms, 99),
+            "max": ms.max()}
+
+
+def row(label: str, result: dict, upstream_calls: int):
+    print(f"{label:<34} | {result['ok']:>4}/{CALLS:<4} | {result['seconds']:>7.2f} | {result['p50']:>8.1f} | "
+          f"{result['p99']:>8.1f} | {result['max']:>8.1f} | {upstream_calls:>8}")
+
+
+def main():
+    upstream = FakeUpstream().start()
+    url = upstream.base_url + "/maps/api/geocode/json"
+    addresses = [f"Dadar Station {i}, Mumbai" for i in range(CALLS)]
+    scenarios = [
+        ("clean, sequential", dict(), 1),
+        ("20 ms latency, 20% 500s", dict(latency=0.02, error_rate=0.2), THREADS),
+        ("2% stalls", dict(latency=0.01, stall_rate=0.02), THREADS),
+    ]
+    print(f"{'scenario / client':<34} | {'ok':>9} | {'seconds':>7} | {'p50 ms':>8} | {'p99 ms':>8} | "
+          f"{'max ms':>8} | {'upstream':>8}")
+    print("-" * 100)
+    for label, faults, threads in scenarios:
+        for name, call in (("bare", bare_get), ("client", None)):
+            upstream.configure(latency=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0, stall_rate=0.0)
+            upstream.configure(**faults)
+            if call is None:
+                client = OutboundClient({"geocoding": BENCH_POLICY})
+                call = lambda u, p, client=client: client.get("geocoding", u, params=p)
+            before = upstream.requests
+            result = run_calls(call, url, addresses, threads)
+            row(f"{label} [{name}]", result, upstream.requests - before)
+
+    # Coalescing: a burst of identical lookups while the first is still in flight.
+    upstream.configure(latency=0.1, error_rate=0.0, stall_rate=0.0)
+    same = ["Andheri Station, Mumbai"] * CALLS
+    for name in ("bare", "client"):
+        client = OutboundClient({"geocoding": BENCH_POLICY})
+        call = bare_get if name == "bare" else (lambda u, p: client.get("geocoding", u, params=p))
+        before = upstream.requests
+        result = run_calls(call, url, same, threads=CALLS)
+        row(f"identical burst [{name}]", result, upstream.requests - before)
+
+    # Outage and recovery: the breaker stops hammering a dead upstream, then lets a trial call through.
+    print("\nOutage (100% 500s for 2s, then healthy), client only:")
+    client = OutboundClient({"geocoding": BENCH_POLICY})
+    upstream.configure(latency=0.0, error_rate=1.0)
+    before = upstream.requests
+    start = time.perf_counter()
+    outcomes = {"ok": 0, "failed": 0}
+    while time.perf_counter() - start < 4.0:
+        if time.perf_counter() - start > 2.0:
+            upstream.configure(error_rate=0.0)
+        try:
+            ok = client.get("geocoding", url, params={"address": "Dadar"}).status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        outcomes["ok" if ok else "failed"] += 1
+        time.sleep(0.01)
+    stats = client.stats()["geocoding"]
+    print(f"  calls {sum(outcomes.values())}, ok {outcomes['ok']}, failed {outcomes['failed']}, "
+          f"short-circuited {stats['short_circuited']}, upstream requests {upstream.requests - before}, "
+          f"circuit now {stats['circuit']}")
+    upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
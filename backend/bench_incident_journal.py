@@ -0,0 +1,61 @@
+"""
+Load test: concurrent /report_incident writes through the incident journal.
+
+Fires reports from many threads in rounds while the dataset grows, prints the
+throughput of each round, then recovers the store from disk (as a restart
+would) and checks that no report was lost or duplicated.
+
+Run from backend/:  python bench_incident_journal.py
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from incident_journal import IncidentJournal, reset
+from incident_store import IncidentStore
+from preprocess_data import make_incident
+
+BASE_INCIDENTS = 10_000
+ROUNDS = 5
+REPORTS_PER_ROUND = 2_000
+WRITER_THREADS = 16
+COMPACT_EVERY = 3_000
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed_data.json")
+        reset(path, [make_incident(i) for i in range(BASE_INCIDENTS)])
+
+        store = IncidentStore(path, IncidentJournal(path, compact_every=COMPACT_EVERY))
+        store.load()
+
+        print(f"{'round':>5} | {'dataset':>8} | {'reports/s':>10}")
+        print("-" * 31)
+        next_id = BASE_INCIDENTS
+        with ThreadPoolExecutor(max_workers=WRITER_THREADS) as pool:
+            for round_no in range(1, ROUNDS + 1):
+                batch = [make_incident(next_id + i) for i in range(REPORTS_PER_ROUND)]
+                next_id += REPORTS_PER_ROUND
+                start = time.perf_counter()
+                list(pool.map(store.add, batch))
+                elapsed = time.perf_counter() - start
+                print(f"{round_no:>5} | {len(store):>8} | {REPORTS_PER_ROUND / elapsed:>10.0f}")
+
+        store.journal.close()
+
+        recovered = IncidentStore(path)
+        recovered.load()
+        expected = BASE_INCIDENTS + ROUNDS * REPORTS_PER_ROUND
+        ids = [item["id"] for item in recovered.journal.recover()]
+        recovered.journal.close()
+        lost = expected - len(set(ids))
+        duplicated = len(ids) - len(set(ids))
+        print(f"\nRecovered {len(ids)} incidents (expected {expected}): lost={lost}, duplicated={duplicated}")
+        if lost or duplicated:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
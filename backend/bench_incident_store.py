@@ -0,0 +1,75 @@
+"""
+Benchmark: /get_sos_data file-scan path vs. the in-memory IncidentStore.
+
+Run from backend/:  python bench_incident_store.py
+"""
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from incident_store import IncidentStore, is_visible
+from preprocess_data import make_incident
+
+SIZES = [1_000, 10_000, 100_000]
+REQUESTS = 50
+
+
+def file_scan(path: str) -> str:
+    """The pre-store request path: parse, filter, sort, encode."""
+    with open(path, 'r', encoding='utf-8') as f:
+        all_data = json.load(f)
+    filtered_data = [item for item in all_data if is_visible(item)]
+    sorted_data = sorted(filtered_data, key=lambda x: x['severity_score'], reverse=True)
+    return json.dumps(sorted_data)
+
+
+def percentiles(samples: list) -> tuple:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return p50 * 1000, p99 * 1000
+
+
+def timed(fn, repeat: int = REQUESTS) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    print(f"{'incidents':>10} | {'path':<22} | {'p50 ms':>9} | {'p99 ms':>9}")
+    print("-" * 60)
+    for size in SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "processed_data.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump([make_incident(i) for i in range(size)], f)
+
+            store = IncidentStore(path)
+            store.load()
+            store.snapshot_json()  # warm
+
+            next_id = [size]
+
+            def report_then_poll():
+                store.add(make_incident(next_id[0]))
+                next_id[0] += 1
+                store.snapshot_json()
+
+            repeat = REQUESTS if size < 100_000 else 10
+            rows = [
+                ("file scan (old)", timed(lambda: file_scan(path), repeat)),
+                ("store poll", timed(store.snapshot_json)),
+                ("store report + poll", timed(report_then_poll, repeat)),
+            ]
+            for name, (p50, p99) in rows:
+                print(f"{size:>10} | {name:<22} | {p50:>9.3f} | {p99:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
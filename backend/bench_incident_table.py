@@ -0,0 +1,94 @@
+"""
+Benchmark: memory per incident and full-feed encode time, incidents kept as
+dicts (the old store) vs. the compact IncidentTable.
+
+Memory is what tracemalloc sees allocated for each representation after
+loading the same JSON array (NumPy reports its buffers to tracemalloc too).
+Encoding is a full-feed rebuild: json.dumps of the dicts vs. joining the
+table's pre-encoded rows, plus the binary columnar layout.
+
+Run from backend/:  python bench_incident_table.py [--incidents 100000]
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from incident_store import _sort_key, incident_category
+from incident_table import IncidentTable, read_columns
+from scenario_generator import generate_incidents
+
+INCIDENTS = 100_000
+REPEAT = 5
+
+
+def traced(build) -> tuple:
+    """(result, bytes still allocated once build() returns)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(fn, repeat: int = REPEAT) -> tuple:
+    """Median ms and output bytes of fn()."""
+    samples, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(fn())
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, size
+
+
+def build_table(text: str) -> IncidentTable:
+    incidents = json.loads(text)
+    keys = sorted(_sort_key(incident, seq) for seq, incident in enumerate(incidents))
+    incidents = [incidents[seq] for _, seq in keys]
+    table = IncidentTable()
+    table.extend(incidents, [incident_category(incident) for incident in incidents], keys)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict vs. columnar incident storage: memory and encode time.")
+    parser.add_argument("--incidents", type=int, default=INCIDENTS)
+    args = parser.parse_args()
+
+    text = json.dumps(generate_incidents(args.incidents, seed=1))
+    n = args.incidents
+    _, dict_bytes = traced(lambda: json.loads(text))
+    table, table_bytes = traced(lambda: build_table(text))
+    rows = table.order
+    encoded_bytes = sum(sys.getsizeof(item) for item in table.encoded)
+
+    print(f"{n} incidents ({len(text) / n:.0f} bytes of JSON each)")
+    print(f"{'representation':<28} | {'MB':>8} | {'bytes/incident':>14}")
+    print("-" * 58)
+    for name, size in [("dicts", dict_bytes), ("IncidentTable (total)", table_bytes),
+                       ("  typed columns", table.records.nbytes), ("  encoded JSON rows", encoded_bytes)]:
+        print(f"{name:<28} | {size / 2**20:>8.1f} | {size / n:>14.0f}")
+
+    columns = table.to_columns(table.order_array)
+    header, decoded = read_columns(columns)
+    assert header["rows"] == n and (decoded["lat"] == table.column("lat")[table.order_array]).all()
+    assert table.json_array(rows) == json.dumps([table.record(row) for row in rows])
+
+    print()
+    print(f"{'full-feed encode':<28} | {'ms':>8} | {'MB':>8}")
+    print("-" * 50)
+    ordered = [table.record(row) for row in rows]
+    for name, fn in [("json.dumps(dicts)", lambda: json.dumps(ordered)),
+                     ("table.json_array", lambda: table.json_array(rows)),
+                     ("table.to_columns", lambda: table.to_columns(table.order_array))]:
+        ms, size = timed(fn)
+        print(f"{name:<28} | {ms:>8.1f} | {size / 2**20:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
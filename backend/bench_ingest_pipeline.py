@@ -0,0 +1,60 @@
+"""
+Benchmark: ingestion throughput (messages/sec) vs. batch size and concurrency,
+using the offline stubs in ingest_stubs.py.
+
+Run from backend/:  python bench_ingest_pipeline.py
+"""
+import random
+import threading
+
+from ingest_pipeline import IngestPipeline
+from ingest_stubs import StubGeocoder, StubLLM
+from preprocess_data import LOCATIONS, SCENARIOS
+
+MESSAGES = 200
+# Scaled-down latencies keep the serial baseline short; ratios match the defaults.
+LLM_CALL_SECONDS = 0.05
+LLM_PER_MESSAGE_SECONDS = 0.004
+GEOCODE_SECONDS = 0.01
+
+CONFIGS = [
+    # (batch_size, llm_workers, geocode_workers)
+    (1, 1, 1),
+    (1, 4, 4),
+    (1, 16, 16),
+    (8, 1, 4),
+    (8, 4, 8),
+    (8, 16, 16),
+    (16, 8, 16),
+]
+
+
+def synthetic_messages(count: int):
+    for i in range(count):
+        loc = random.choice(LOCATIONS)
+        scenario = random.choice(SCENARIOS)
+        yield {"id": i, "message": f"SOS! {scenario['desc']} at {loc['name']}."}
+
+
+def main():
+    random.seed(7)
+    print(f"{'batch':>5} | {'llm':>4} | {'geo':>4} | {'msgs/s':>8} | {'llm calls':>9} | {'ingested':>8}")
+    print("-" * 54)
+    for batch_size, llm_workers, geocode_workers in CONFIGS:
+        sink_lock = threading.Lock()
+        sunk = []
+
+        def sink(incident):
+            with sink_lock:
+                sunk.append(incident)
+
+        llm = StubLLM(LLM_CALL_SECONDS, LLM_PER_MESSAGE_SECONDS)
+        pipeline = IngestPipeline(llm.analyze_batch, llm.analyze_one, StubGeocoder(GEOCODE_SECONDS).geocode, sink,
+                                  batch_size=batch_size, llm_workers=llm_workers, geocode_workers=geocode_workers)
+        stats = pipeline.run(synthetic_messages(MESSAGES))
+        print(f"{batch_size:>5} | {llm_workers:>4} | {geocode_workers:>4} | {stats['messages_per_sec']:>8.1f} | "
+              f"{stats['llm_calls']:>9} | {stats['ingested']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark: structured-output parsing and the LLM response cache.
+
+    1. parse tolerance: on replies shaped the ways Gemini's go wrong (fences,
+       prose around the JSON, trailing commas, Python literals, odd enum
+       spellings, a batch cut off at the token limit), how many analyses the
+       old strip-fences-then-json.loads parser recovers vs. the streaming
+       parser + schema (structured_output.py), and the cost per reply
+    2. cache: Gemini calls, messages sent (what prompt tokens scale with) and
+       hit rate for a burst with retweets and forwarded SMS, on a cold cache
+       and again after a restart (a new LLMCache on the same file), through
+       ai_core.analyze_sos_batch_with_gemini and the offline StubGeminiModel
+    3. replay: the same burst recorded (LLM_MODE=record), then replayed
+       against an empty cache with no model at all; the analyses must match
+
+Run from backend/:  python bench_llm_output.py
+"""
+import json
+import os
+import random
+import tempfile
+import time
+
+import ai_core
+import llm_cache
+from ingest_stubs import StubGeminiModel, StubLLM
+from preprocess_data import LOCATIONS, SCENARIOS
+from structured_output import SchemaError, parse_json_values, validate
+
+REPLIES_PER_SHAPE = 300
+BATCH_SIZE = 8
+BURST_MESSAGES = 800
+REPEAT_SHARE = 0.4       # messages that are a retweet/forward of an earlier one
+REPEAT_FORMS = ["RT @{user}: {text}", "Fwd: {text}", "{text} https://t.co/{user}", "  {text}  ",
+                "FW: RT @{user}: {text}"]
+
+
+def old_parse(text: str) -> list:
+    """What ai_core did before: strip fences, json.loads, all-or-nothing. Only exact enum spellings score."""
+    try:
+        result = json.loads(text.strip().replace("```json", "").replace("```", ""))
+    except ValueError:
+        return []
+    return [item for item in (result if isinstance(result, list) else [result])
+            if item.get("urgency") in ai_core.URGENCY_LEVELS and item.get("need_type") in ai_core.NEED_TYPES]
+
+
+def new_parse(text: str, schema: dict) -> list:
+    results = []
+    for value in parse_json_values(text):
+        try:
+            results.append(validate(value, schema))
+        except SchemaError:
+            pass
+    return results
+
+
+def random_message(rng: random.Random) -> str:
+    scenario, loc = rng.choice(SCENARIOS), rng.choice(LOCATIONS)
+    return f"{scenario['desc']} at {loc['name']}. #{rng.randrange(10000)}"
+
+
+def reply_shapes(rng: random.Random) -> dict:
+    """shape -> [(reply text, analyses it holds)]."""
+    def batch(size):
+        return [{"id": str(i), **StubLLM._analyze(random_message(rng))} for i in range(size)]
+
+    shapes = {name: [] for name in ("clean", "fenced", "prose", "trailing commas", "python literals",
+                                    "enum spelling", "truncated batch")}
+    for _ in range(REPLIES_PER_SHAPE):
+        items = batch(BATCH_SIZE)
+        text = json.dumps(items, indent=2)
+        shapes["clean"].append((text, len(items)))
+        shapes["fenced"].append((f"```json\n{text}\n```", len(items)))
+        shapes["prose"].append((f"Here is the analysis of the messages:\n{text}\nLet me know if you need more.",
+                                len(items)))
+        shapes["trailing commas"].append((text.replace("\n  }", ",\n  }").replace("\n]", ",\n]"), len(items)))
+        shapes["python literals"].append((json.dumps([{**item, "verified": True, "notes": None} for item in items])
+                                          .replace("true", "True").replace("null", "None"), len(items)))
+        shapes["enum spelling"].append((json.dumps([{**item, "urgency": item["urgency"].upper().replace("-", " ")}
+                                                    for item in items]), len(items)))
+        cut = int(len(text) * rng.uniform(0.5, 0.95))
+        whole = sum(1 for item in items if text.find(f'"id": "{item["id"]}"') >= 0
+                    and text.index("}", text.find(f'"id": "{item["id"]}"')) < cut)
+        shapes["truncated batch"].append((text[:cut], whole))
+    return shapes
+
+
+def bench_parsing(rng: random.Random):
+    print(f"1. parse tolerance ({REPLIES_PER_SHAPE} batch replies of {BATCH_SIZE} per shape)")
+    print(f"{'shape':<16} | {'expected':>8} | {'old':>6} | {'new':>6} | {'old us':>7} | {'new us':>7}")
+    print("-" * 66)
+    for shape, replies in reply_shapes(rng).items():
+        expected = sum(count for _, count in replies)
+        row = []
+        for parse in (old_parse, lambda text: new_parse(text, ai_core.BATCH_ANALYSIS_SCHEMA)):
+            started = time.perf_counter()
+            recovered = sum(len(parse(text)) for text, _ in replies)
+            row.append((recovered, (time.perf_counter() - started) * 1e6 / len(replies)))
+        (old, old_us), (new, new_us) = row
+        print(f"{shape:<16} | {expected:>8} | {old / expected:>6.0%} | {min(new, expected) / expected:>6.0%} | "
+              f"{old_us:>7.0f} | {new_us:>7.0f}")
+
+
+def burst(rng: random.Random) -> list:
+    messages = []
+    for message_id in range(BURST_MESSAGES):
+        if messages and rng.random() < REPEAT_SHARE:
+            text = rng.choice(REPEAT_FORMS).format(user=f"user{rng.randrange(500)}", text=rng.choice(messages)[1])
+        else:
+            text = random_message(rng)
+        messages.append((message_id, text))
+    return messages
+
+
+def run_burst(messages: list) -> dict:
+    answers = {}
+    for start in range(0, len(messages), BATCH_SIZE):
+        answers.update(ai_core.analyze_sos_batch_with_gemini(messages[start:start + BATCH_SIZE]))
+    return answers
+
+
+def use_cache(path: str):
+    llm_cache._shared_cache = llm_cache.LLMCache(path)
+    return llm_cache._shared_cache
+
+
+def bench_cache(rng: random.Random, workdir: str):
+    messages = burst(rng)
+    unique = len({llm_cache.normalize_message(text) for _, text in messages})
+    print(f"\n2. response cache ({BURST_MESSAGES} messages, {unique} distinct after normalization, "
+          f"batches of {BATCH_SIZE})")
+    print(f"{'run':<22} | {'gemini calls':>12} | {'messages sent':>13} | {'hit rate':>8} | {'seconds':>7}")
+    print("-" * 76)
+    path = os.path.join(workdir, "bench_llm_cache.sqlite3")
+    no_cache_calls = -(-len(messages) // BATCH_SIZE)
+    print(f"{'no cache (before)':<22} | {no_cache_calls:>12} | {len(messages):>13} | {'-':>8} | {'-':>7}")
+    for run in ("cold cache", "warm (after restart)"):
+        cache = use_cache(path)
+        model = ai_core._gemini_model = StubGeminiModel(call_seconds=0.005, per_message_seconds=0.0005)
+        started = time.perf_counter()
+        answers = run_burst(messages)
+        elapsed = time.perf_counter() - started
+        assert len(answers) == len(messages)
+        print(f"{run:<22} | {model.calls:>12} | {model.messages:>13} | {cache.stats()['hit_rate']:>8.0%} | "
+              f"{elapsed:>7.2f}")
+        cache.close()
+
+
+def bench_replay(rng: random.Random, workdir: str):
+    messages = burst(rng)
+    recordings = os.path.join(workdir, "bench_llm_recordings.jsonl")
+    llm_cache._shared_recordings = llm_cache.Recordings(recordings)
+    print("\n3. record, then replay offline against an empty cache")
+    runs = {}
+    for mode, model in (("record", StubGeminiModel(call_seconds=0.0, per_message_seconds=0.0)), ("replay", None)):
+        ai_core.LLM_MODE, ai_core._gemini_model = mode, model
+        cache = use_cache(os.path.join(workdir, f"bench_llm_{mode}.sqlite3"))
+        started = time.perf_counter()
+        runs[mode] = run_burst(messages)
+        print(f"{mode:<8} {len(runs[mode])} analyses in {time.perf_counter() - started:.2f}s")
+        cache.close()
+    ai_core.LLM_MODE = "live"
+    print(f"replay matches record: {runs['record'] == runs['replay']}")
+
+
+def main():
+    rng = random.Random(7)
+    bench_parsing(rng)
+    with tempfile.TemporaryDirectory(prefix="bench_llm_") as workdir:
+        bench_cache(rng, workdir)
+        bench_replay(rng, workdir)
+
+
+if __name__ == '__main__':
+    main()
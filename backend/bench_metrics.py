@@ -0,0 +1,96 @@
+"""
+Benchmark: cost of the instrumentation on the hottest path, /get_sos_data.
+
+Runs the same requests through the whole Flask stack (test client, no
+network) with request metrics on and off, and with the sampling profiler
+running. "off" also swaps the feed cache counter for a no-op, so the
+difference is everything metrics adds to these requests. Dashboards mostly
+revalidate (304), so that path matters most.
+
+Run from backend/:  python bench_metrics.py [--incidents 2000] [--requests 20000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from incident_journal import reset
+from scenario_generator import generate_incidents
+
+INCIDENTS = 2000
+REQUESTS = 20000
+ROUNDS = 10
+MODES = ("off", "metrics", "metrics + profiler")
+
+
+class _NoCounter:
+    def inc(self, *label_values, amount: float = 1.0):
+        pass
+
+
+def per_request_us(client, headers: dict, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get('/get_sos_data', headers=headers)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Instrumentation overhead on /get_sos_data.")
+    parser.add_argument("--incidents", type=int, default=INCIDENTS)
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_metrics_")
+    reset(os.path.join(workdir, "processed_data.json"), generate_incidents(args.incidents, seed=1))
+    os.chdir(workdir)   # app.py reads its data files relative to the working directory
+    os.environ.update({"SITUATION_REPORT_INTERVAL_SECONDS": "3600", "LOG_LEVEL": "WARNING"})
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    import incident_store
+    from profiler import SamplingProfiler
+
+    client = app.app.test_client()
+    etag = client.get('/get_sos_data').headers['ETag']
+    feed_counter = incident_store.FEED_CACHE
+    paths = [("304 revalidate", {'If-None-Match': etag}), ("200 cached body", {})]
+
+    def configure(mode):
+        app.METRICS_ENABLED = mode != "off"
+        incident_store.FEED_CACHE = _NoCounter() if mode == "off" else feed_counter
+
+    print(f"{'path':<16} | {'mode':<18} | {'us/request':>10} | {'overhead':>8}")
+    print("-" * 62)
+    for label, headers in paths:
+        per_request_us(client, headers, args.requests // 10)   # warm up
+        samples = {mode: [] for mode in MODES}
+        for _ in range(ROUNDS):
+            # Modes take turns within each round, so drift on the machine hits them alike.
+            for mode in MODES:
+                configure(mode)
+                profiler = SamplingProfiler() if mode == "metrics + profiler" else None
+                if profiler:
+                    profiler.start()
+                samples[mode].append(per_request_us(client, headers, args.requests // ROUNDS))
+                if profiler:
+                    profiler.stop()
+        baseline = statistics.median(samples["off"])
+        for mode in MODES:
+            median = statistics.median(samples[mode])
+            print(f"{label:<16} | {mode:<18} | {median:>10.1f} | {(median / baseline - 1) * 100:>7.1f}%")
+    # The end-to-end numbers carry a few percent of machine noise; this is the instruments' own cost.
+    calls = 100_000
+    start = time.perf_counter()
+    for _ in range(calls):
+        started = time.perf_counter()
+        app.REQUEST_SECONDS.observe(time.perf_counter() - started, "get_sos_data", "GET", "304")
+        feed_counter.inc("json", "hit")
+    print(f"histogram observe + counter inc: {(time.perf_counter() - start) / calls * 1e6:.2f} us per request")
+    configure("metrics")
+    app.incident_store.journal.close()
+
+
+if __name__ == '__main__':
+    main()
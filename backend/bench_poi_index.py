@@ -0,0 +1,43 @@
+"""
+Benchmark: local POI index latency, single lookups vs. batch queries.
+
+Run from backend/:  python bench_poi_index.py
+"""
+import random
+import statistics
+import time
+
+from poi_index import POIIndex
+
+LOOKUPS = 2_000
+BATCH_SIZES = [100, 1_000, 10_000]
+
+
+def random_point() -> tuple:
+    return random.uniform(18.90, 19.25), random.uniform(72.80, 72.98)
+
+
+def main():
+    random.seed(9)
+    index = POIIndex.from_file()
+    print(f"{len(index)} places indexed\n")
+
+    samples = []
+    for _ in range(LOOKUPS):
+        lat, lng = random_point()
+        start = time.perf_counter()
+        index.nearby(lat, lng)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"single lookup: p50 {statistics.median(samples):.3f} ms, p99 {samples[int(len(samples) * 0.99)]:.3f} ms")
+
+    for size in BATCH_SIZES:
+        points = [random_point() for _ in range(size)]
+        start = time.perf_counter()
+        index.nearby_batch(points)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"batch of {size:>6}: {elapsed:8.1f} ms total, {elapsed / size * 1000:7.1f} us per point")
+
+
+if __name__ == '__main__':
+    main()
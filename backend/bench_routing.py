@@ -0,0 +1,67 @@
+"""
+Benchmark: offline routing throughput (routes/sec), cold vs. cached.
+
+Runs on the bundled Mumbai graph and on a synthetic grid road network of
+OSM-like size, with origins/destinations scattered over the city bounds.
+
+Run from backend/:  python bench_routing.py
+"""
+import random
+import time
+
+from routing import DEFAULT_SPEED_KPH, RoadGraph
+
+ROUTES = 2_000
+LAT_RANGE = (18.90, 19.25)
+LNG_RANGE = (72.80, 72.98)
+
+
+def grid_graph(side: int) -> RoadGraph:
+    """side x side street grid over the city bounds, with ~10% of streets faster arterials."""
+    names, lats, lngs, edges = [], [], [], []
+    for row in range(side):
+        for col in range(side):
+            names.append(f"n{row}_{col}")
+            lats.append(LAT_RANGE[0] + (LAT_RANGE[1] - LAT_RANGE[0]) * row / (side - 1))
+            lngs.append(LNG_RANGE[0] + (LNG_RANGE[1] - LNG_RANGE[0]) * col / (side - 1))
+    step_m = 38_000 / side
+    for row in range(side):
+        for col in range(side):
+            node = row * side + col
+            for neighbour, arterial in ((node + 1, row % 10 == 0), (node + side, col % 10 == 0)):
+                if (neighbour == node + 1 and col == side - 1) or neighbour >= side * side:
+                    continue
+                speed = 50.0 if arterial else DEFAULT_SPEED_KPH
+                edges += [(node, neighbour, step_m, speed), (neighbour, node, step_m, speed)]
+    return RoadGraph(names, lats, lngs, edges)
+
+
+def random_points(count: int) -> list:
+    return [(random.uniform(*LAT_RANGE), random.uniform(*LNG_RANGE),
+             random.uniform(*LAT_RANGE), random.uniform(*LNG_RANGE)) for _ in range(count)]
+
+
+def bench(label: str, graph: RoadGraph, routes: list):
+    start = time.perf_counter()
+    for route in routes:
+        graph.route(*route)
+    cold = len(routes) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for route in routes:
+        graph.route(*route)
+    warm = len(routes) / (time.perf_counter() - start)
+    print(f"{label:<28} | {len(graph):>7} | {cold:>12.0f} | {warm:>12.0f}")
+
+
+def main():
+    random.seed(3)
+    print(f"{'graph':<28} | {'nodes':>7} | {'cold rt/s':>12} | {'cached rt/s':>12}")
+    print("-" * 70)
+    bench("Mumbai (road_graph.json)", RoadGraph.from_file(), random_points(ROUTES))
+    for side in (100, 300):
+        bench(f"synthetic grid {side}x{side}", grid_graph(side), random_points(ROUTES // 10))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark: throughput of the sharded deployment (router.py + one shard per
+city) as cities and cores are added, on synthetic multi-city load.
+
+For each city count n, a scratch CITIES_FILE gets n synthetic cities (the
+Mumbai gazetteer shifted 1 degree north per city), each seeded with generated
+incidents, and router.py starts a single-worker shard per city plus n router
+workers. Closed-loop client processes (`--clients-per-city` per city) then
+send what dashboards and reporters send: incident reports and zoomed-in
+map queries (bbox around a landmark, summary view), each for a random city.
+With --direct the clients call the shards themselves, which shows what the
+router's hop costs.
+
+Throughput should grow close to linearly with n while there are free cores
+for the extra shards (and for the clients, which run on the same machine);
+efficiency is req/s per city relative to one city.
+
+Run from backend/:  python bench_shards.py [--cities 1,2,4] [--duration 10] [--direct]
+Needs ports 5401 and 5411 onwards free.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from incident_journal import reset
+from preprocess_data import LOCATIONS
+from scenario_generator import generate_incidents
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROUTER_PORT = 5401
+SHARD_BASE_PORT = 5411
+DURATION_SECONDS = 10.0
+CLIENTS_PER_CITY = 4
+INCIDENTS_PER_CITY = 5000
+REPORT_SHARE = 0.25          # the rest are map queries
+QUERY_RADIUS_DEG = 0.02      # half the side of a zoomed-in viewport
+SHARED_FILES = ("road_graph.json", "poi_data.json")
+STARTUP_TIMEOUT_SECONDS = 120
+
+
+def synthetic_cities(count: int) -> list:
+    """`count` copies of Mumbai, 1 degree of latitude apart, so every city has its own bounds."""
+    cities = []
+    for index in range(count):
+        shift = float(index)
+        cities.append({
+            "name": f"city{index}", "label": f"City {index}", "hq": [18.9486 + shift, 72.8336],
+            "center": [19.0760 + shift, 72.8777], "bounds": [18.85 + shift, 72.75, 19.35 + shift, 73.10],
+            "gazetteer": [{**loc, "lat": loc["lat"] + shift} for loc in LOCATIONS],
+        })
+    return cities
+
+
+def prepare(workdir: str, count: int, incidents: int) -> str:
+    """Writes the cities file and each city's data directory; returns the cities file path."""
+    from cities import City
+    path = os.path.join(workdir, "cities.json")
+    entries = synthetic_cities(count)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    for entry in entries:
+        city = City.from_dict(entry, workdir)
+        os.makedirs(city.data_dir, exist_ok=True)
+        reset(city.path("processed_data.json"), generate_incidents(incidents, seed=1, city=city))
+        for name in SHARED_FILES:
+            os.symlink(os.path.join(HERE, name), city.path(name))
+    return path
+
+
+def start_router(cities_file: str, workdir: str, count: int):
+    env = {**os.environ, "CITIES_FILE": cities_file, "SITUATION_REPORT_INTERVAL_SECONDS": "3600",
+           "LOG_LEVEL": "WARNING"}
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, "router.py"), "--host", "127.0.0.1",
+                                "--port", str(ROUTER_PORT), "--shard-base-port", str(SHARD_BASE_PORT),
+                                "--workers", str(count)],
+                               cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    started = time.perf_counter()
+    while time.perf_counter() - started < STARTUP_TIMEOUT_SECONDS:
+        try:
+            requests.get(f"http://127.0.0.1:{ROUTER_PORT}/cities", timeout=1).raise_for_status()
+            return process
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    stop_router(process)
+    raise RuntimeError("router.py did not come up")
+
+
+def stop_router(process):
+    # SIGTERM lets router.py stop its shards (each in a process group of its own) on the way out.
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def run_client(args: tuple) -> tuple:
+    """Closed loop for `duration` seconds; returns (completed, errors)."""
+    targets, cities, duration, seed = args
+    rng = random.Random(seed)
+    session = requests.Session()
+    completed = errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        index = rng.randrange(len(cities))
+        loc = rng.choice(cities[index]["gazetteer"])
+        base = targets[index]
+        try:
+            if rng.random() < REPORT_SHARE:
+                response = session.post(base + "/report_incident", json={
+                    "description": "Water entering homes, elderly people need help",
+                    "lat": loc["lat"] + rng.uniform(-0.003, 0.003), "lng": loc["lng"] + rng.uniform(-0.003, 0.003)},
+                    timeout=30)
+            else:
+                bbox = (loc["lat"] - QUERY_RADIUS_DEG, loc["lng"] - QUERY_RADIUS_DEG,
+                        loc["lat"] + QUERY_RADIUS_DEG, loc["lng"] + QUERY_RADIUS_DEG)
+                response = session.get(base + "/get_sos_data", params={
+                    "bbox": ",".join(f"{value:.4f}" for value in bbox), "limit": 50, "view": "summary"}, timeout=30)
+            if response.status_code == 200:
+                completed += 1
+            else:
+                errors += 1
+        except requests.exceptions.RequestException:
+            errors += 1
+    return completed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded router throughput from 1 to N cities/cores.")
+    parser.add_argument("--cities", default="1,2,4", help="city counts to try, comma separated")
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS)
+    parser.add_argument("--clients-per-city", type=int, default=CLIENTS_PER_CITY)
+    parser.add_argument("--incidents", type=int, default=INCIDENTS_PER_CITY, help="seeded incidents per city")
+    parser.add_argument("--direct", action="store_true", help="clients call the shards, bypassing the router")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs; {args.clients_per_city} client processes per city; "
+          f"{'direct to shards' if args.direct else 'through router.py'}")
+    print(f"{'cities':>6} | {'req/s':>8} | {'errors':>6} | {'speedup':>7} | {'efficiency':>10}")
+    print("-" * 50)
+    baseline = None
+    for count in (int(value) for value in args.cities.split(",")):
+        workdir = tempfile.mkdtemp(prefix="bench_shards_")
+        process = None
+        try:
+            cities_file = prepare(workdir, count, args.incidents)
+            process = start_router(cities_file, workdir, count)
+            cities = synthetic_cities(count)
+            if args.direct:
+                targets = [f"http://127.0.0.1:{SHARD_BASE_PORT + index}" for index in range(count)]
+            else:
+                targets = [f"http://127.0.0.1:{ROUTER_PORT}"] * count
+            clients = count * args.clients_per_city
+            with multiprocessing.Pool(clients) as pool:
+                started = time.perf_counter()
+                results = pool.map(run_client, [(targets, cities, args.duration, seed) for seed in range(clients)])
+                elapsed = time.perf_counter() - started
+        finally:
+            if process is not None:
+                stop_router(process)
+            shutil.rmtree(workdir, ignore_errors=True)
+        rate = sum(completed for completed, _ in results) / elapsed
+        errors = sum(failed for _, failed in results)
+        baseline = baseline or rate
+        speedup = rate / baseline
+        print(f"{count:>6} | {rate:>8.1f} | {errors:>6} | {speedup:>6.2f}x | {speedup / count * 100:>9.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: near-duplicate clustering ahead of LLM analysis, on a synthetic
+burst where each distinct incident (a SCENARIOS template at a LOCATIONS
+landmark) is reported many times with the usual noise: different pleas,
+abbreviations, typos, dropped words, hashtags.
+
+Reports dedup throughput per chunk size, clustering quality against the ground
+truth, and the LLM calls / wall time of the stub ingest pipeline with and
+without the dedup stage.
+
+Run from backend/:  python bench_sos_dedup.py
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+from ingest_pipeline import IngestPipeline
+from ingest_stubs import StubGeocoder, StubLLM
+from preprocess_data import LOCATIONS, SCENARIOS
+from sos_dedup import SOSDeduplicator
+
+DISTINCT_INCIDENTS = 150
+MEAN_REPORTS = 8            # geometric number of reports per incident
+BURST_SECONDS = 20 * 60
+THROUGHPUT_MESSAGES = 20000
+CHUNK_SIZES = [1, 32, 256, 1024]
+# Scaled-down latencies, same ratios as bench_ingest_pipeline.py.
+LLM_CALL_SECONDS = 0.05
+LLM_PER_MESSAGE_SECONDS = 0.004
+GEOCODE_SECONDS = 0.01
+
+PREFIXES = ["SOS!", "Help!", "URGENT:", "Please help,", "", "Emergency -"]
+SUFFIXES = ["", "Please send help!", "pls hurry", "Need help ASAP.", "#MumbaiRains", "Someone come quick"]
+CONNECTORS = ["at", "near", "outside", "opposite"]
+ABBREVIATIONS = {"Station": "Stn", "building": "bldg", "Hospital": "Hosp", "Road": "Rd", "road": "rd"}
+
+
+def _typo(word: str) -> str:
+    if len(word) < 4:
+        return word
+    i = random.randrange(1, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def report_text(scenario: dict, loc: dict) -> str:
+    words = scenario["desc"].rstrip(".").split()
+    if random.random() < 0.3:
+        del words[random.randrange(len(words))]
+    if random.random() < 0.3:
+        i = random.randrange(len(words))
+        words[i] = _typo(words[i])
+    place = loc["name"]
+    for long, short in ABBREVIATIONS.items():
+        if random.random() < 0.5:
+            place = place.replace(long, short)
+            words = [short if w == long else w for w in words]
+    text = f"{random.choice(PREFIXES)} {' '.join(words)} {random.choice(CONNECTORS)} {place}. {random.choice(SUFFIXES)}"
+    return text.lower() if random.random() < 0.2 else text
+
+
+def synthetic_burst(distinct: int = DISTINCT_INCIDENTS, mean_reports: float = MEAN_REPORTS) -> list:
+    """Message rows with a `truth` field naming the incident they describe, in arrival order."""
+    pairs = random.sample([(s, l) for s in range(len(SCENARIOS)) for l in range(len(LOCATIONS))], distinct)
+    start = time.time() - BURST_SECONDS
+    rows = []
+    for truth, (s, l) in enumerate(pairs):
+        first = random.uniform(0, BURST_SECONDS * 0.75)
+        reports = 1
+        while random.random() > 1.0 / mean_reports:
+            reports += 1
+        for _ in range(reports):
+            at = first + random.expovariate(1 / 120.0)
+            rows.append({"message": report_text(SCENARIOS[s], LOCATIONS[l]), "timestamp": start + at, "truth": truth})
+    rows.sort(key=lambda row: row["timestamp"])
+    for i, row in enumerate(rows):
+        row["id"] = i
+    return rows
+
+
+def pair_scores(truth: list, predicted: list) -> tuple:
+    """Pairwise precision/recall of a clustering against the ground truth."""
+    def pairs(counter):
+        return sum(n * (n - 1) // 2 for n in counter.values())
+    together = pairs(Counter(zip(truth, predicted)))
+    same_pred, same_truth = pairs(Counter(predicted)), pairs(Counter(truth))
+    return (together / same_pred if same_pred else 1.0), (together / same_truth if same_truth else 1.0)
+
+
+def run_pipeline(rows: list, dedup) -> tuple:
+    sink_lock = threading.Lock()
+    sunk = []
+
+    def sink(incident):
+        with sink_lock:
+            sunk.append(incident)
+
+    llm = StubLLM(LLM_CALL_SECONDS, LLM_PER_MESSAGE_SECONDS)
+    pipeline = IngestPipeline(llm.analyze_batch, llm.analyze_one, StubGeocoder(GEOCODE_SECONDS).geocode, sink,
+                              dedup=dedup)
+    return pipeline.run(iter(rows)), sunk
+
+
+def main():
+    random.seed(11)
+    rows = synthetic_burst()
+    print(f"Burst: {len(rows)} messages describing {DISTINCT_INCIDENTS} incidents "
+          f"(duplication rate {1 - DISTINCT_INCIDENTS / len(rows):.0%})\n")
+
+    dedup = SOSDeduplicator()
+    assigned = dedup.assign(rows)
+    precision, recall = pair_scores([row["truth"] for row in rows], [cid for cid, _ in assigned])
+    clusters = sum(1 for _, is_new in assigned if is_new)
+    print(f"Clusters: {clusters} (truth {DISTINCT_INCIDENTS}) | pair precision {precision:.3f} | pair recall {recall:.3f}\n")
+
+    big = [dict(row, id=i) for i, row in enumerate(rows * (THROUGHPUT_MESSAGES // len(rows) + 1))][:THROUGHPUT_MESSAGES]
+    print(f"{'chunk':>6} | {'msgs/s':>10}")
+    print("-" * 20)
+    for chunk_size in CHUNK_SIZES:
+        dedup = SOSDeduplicator()
+        start = time.perf_counter()
+        for i in range(0, len(big), chunk_size):
+            dedup.assign(big[i:i + chunk_size])
+        print(f"{chunk_size:>6} | {len(big) / (time.perf_counter() - start):>10.0f}")
+
+    print(f"\n{'pipeline':>9} | {'llm calls':>9} | {'incidents':>9} | {'seconds':>8} | {'max reports':>11}")
+    print("-" * 60)
+    for label, dedup in (("plain", None), ("dedup", SOSDeduplicator())):
+        stats, sunk = run_pipeline(rows, dedup)
+        most = max((incident.get("report_count", 1) for incident in sunk), default=0)
+        print(f"{label:>9} | {stats['llm_calls']:>9} | {len(sunk):>9} | {stats['seconds']:>8.2f} | {most:>11}")
+
+
+if __name__ == '__main__':
+    main()
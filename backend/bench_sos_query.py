@@ -0,0 +1,83 @@
+"""
+Benchmark: what a dashboard pays to draw the map from a large incident store,
+full feed vs. the filtered query modes of /get_sos_data and /get_sos_tiles.
+
+Each row is the store call plus JSON encoding of the response body, after a
+fresh report (so the full feed's cached JSON has to be rebuilt, as it is
+whenever anything changes). The viewports are a few streets, one ward and the
+whole city around the generated scenario's centre.
+
+Run from backend/:  python bench_sos_query.py [--incidents 100000]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from geo_index import precision_for_zoom
+from incident_journal import reset
+from incident_store import IncidentStore
+from incident_table import json_document
+from scenario_generator import generate_incidents
+
+INCIDENTS = 100_000
+REPEAT = 20
+# (label, half-size in degrees, map zoom)
+VIEWPORTS = [("streets", 0.005, 16), ("ward", 0.03, 14), ("city", 0.2, 11)]
+
+
+def timed(store: IncidentStore, fn, repeat: int = REPEAT) -> tuple:
+    """Median ms and response bytes of fn() -> body, each run after one new report."""
+    samples, size = [], 0
+    for i in range(repeat):
+        store.add(generate_incidents(1, seed=10_000 + i)[0])
+        start = time.perf_counter()
+        size = len(fn())
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full feed vs. bbox/summary/tile queries on a large store.")
+    parser.add_argument("--incidents", type=int, default=INCIDENTS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "processed_data.json")
+        incidents = generate_incidents(args.incidents, seed=1)
+        reset(path, incidents)
+        store = IncidentStore(path)
+        start = time.perf_counter()
+        store.load()
+        print(f"Loaded {len(store)} incidents in {time.perf_counter() - start:.2f}s.")
+        lat = statistics.median(i["coordinates"]["lat"] for i in incidents)
+        lng = statistics.median(i["coordinates"]["lng"] for i in incidents)
+
+        def page(bbox, summary=False, **filters):
+            result = store.query(bbox=bbox, view="summary" if summary else "full", **filters)
+            if summary:
+                return json.dumps(result)
+            return json_document(result, incidents=result.pop("incidents"))
+
+        rows = [("full feed", "-", timed(store, store.snapshot_json))]
+        for label, half, zoom in VIEWPORTS:
+            bbox = (lat - half, lng - half, lat + half, lng + half)
+            rows += [
+                ("page (1000)", label, timed(store, lambda: page(bbox))),
+                ("summary page", label, timed(store, lambda: page(bbox, summary=True))),
+                ("summary, sev >= 8, 24h", label,
+                 timed(store, lambda: page(bbox, summary=True, min_severity=8, after=time.time() - 86400))),
+                (f"tiles (zoom {zoom})", label,
+                 timed(store, lambda: json.dumps(store.tiles(precision_for_zoom(zoom), bbox=bbox)))),
+            ]
+        print(f"{'request':<24} | {'viewport':<8} | {'ms':>8} | {'KB':>9}")
+        print("-" * 58)
+        for name, viewport, (ms, size) in rows:
+            print(f"{name:<24} | {viewport:<8} | {ms:>8.2f} | {size / 1024:>9.1f}")
+        store.journal.close()
+
+
+if __name__ == '__main__':
+    main()
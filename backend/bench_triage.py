@@ -0,0 +1,113 @@
+"""
+Benchmark: local triage throughput and the LLM calls it saves.
+
+    1. lexicon scan: the old chain of `in` checks vs. the Aho-Corasick automaton
+    2. classification: one message at a time vs. classify_batch
+    3. stub ingest pipeline with and without the triage stage
+
+The message mix is synthetic SCENARIOS x LOCATIONS reports, the real
+sos_messages.csv, and vague/spam messages that should still reach the LLM.
+
+Run from backend/:  python bench_triage.py
+"""
+import random
+import threading
+import time
+
+from ingest_pipeline import IngestPipeline, read_csv_messages
+from ingest_stubs import StubGeocoder, StubLLM
+from preprocess_data import LOCATIONS, SCENARIOS
+from train_triage import SCENARIO_LABELS, SPAM_TEMPLATES
+from triage import get_triage
+
+MESSAGES = 10000
+PIPELINE_MESSAGES = 400
+VAGUE = ["Please help us, the situation is very bad here", "Anyone out there? We need help",
+         "My basement is flooded. What should I do?", "HELP!!! MUMBAI IS SINKING!!!"]
+# Scaled-down latencies, same ratios as bench_ingest_pipeline.py.
+LLM_CALL_SECONDS = 0.05
+LLM_PER_MESSAGE_SECONDS = 0.004
+GEOCODE_SECONDS = 0.01
+
+
+def message_mix(count: int) -> list:
+    real = [row["message"] for row in read_csv_messages("sos_messages.csv")]
+    rows = []
+    for i in range(count):
+        roll = random.random()
+        if roll < 0.75:
+            scenario, loc = random.choice(SCENARIOS), random.choice(LOCATIONS)
+            text, truth = f"SOS! {scenario['desc']} at {loc['name']}.", SCENARIO_LABELS[scenario["type"]]
+        elif roll < 0.85:
+            text, truth = random.choice(real), None
+        elif roll < 0.95:
+            text, truth = random.choice(VAGUE), None
+        else:
+            text, truth = random.choice(SPAM_TEMPLATES).format(place=random.choice(LOCATIONS)["name"]), None
+        rows.append({"id": i, "message": text, "truth": truth})
+    return rows
+
+
+def keyword_chain(text: str) -> str:
+    """The original report_incident classification."""
+    desc_lower = text.lower()
+    if "fire" in desc_lower or "explosion" in desc_lower:
+        return "Firefighters"
+    elif "flood" in desc_lower or "drowning" in desc_lower:
+        return "Rescue Boat"
+    elif "medical" in desc_lower or "blood" in desc_lower or "heart" in desc_lower:
+        return "Medical Support"
+    return "General Assistance"
+
+
+def timed(label: str, count: int, fn):
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    print(f"{label:<34} | {count / seconds:>12,.0f} msgs/s | {seconds * 1e6 / count:>8.1f} us/msg")
+
+
+def run_pipeline(rows: list, triage) -> dict:
+    sink_lock = threading.Lock()
+    sunk = []
+
+    def sink(incident):
+        with sink_lock:
+            sunk.append(incident)
+
+    llm = StubLLM(LLM_CALL_SECONDS, LLM_PER_MESSAGE_SECONDS)
+    pipeline = IngestPipeline(llm.analyze_batch, llm.analyze_one, StubGeocoder(GEOCODE_SECONDS).geocode, sink,
+                              triage=triage)
+    return pipeline.run(iter(rows))
+
+
+def main():
+    random.seed(3)
+    triage = get_triage()
+    rows = message_mix(MESSAGES)
+    texts = [row["message"] for row in rows]
+
+    print(f"{'stage':<34} | {'throughput':>19} | {'latency':>15}")
+    print("-" * 76)
+    timed("keyword chain (old)", len(texts), lambda: [keyword_chain(t) for t in texts])
+    timed("Aho-Corasick lexicon + gazetteer", len(texts), lambda: [triage._scan(t) for t in texts])
+    timed("classify() one at a time", len(texts), lambda: [triage.classify(t) for t in texts])
+    results = []
+    timed("classify_batch()", len(texts), lambda: results.extend(triage.classify_batch(texts)))
+
+    escalated = sum(result["escalate"] for result in results)
+    scored = [(row, result) for row, result in zip(rows, results) if row["truth"] and not result["escalate"]]
+    agree = sum((result["urgency"], result["need_type"]) == row["truth"] for row, result in scored)
+    print(f"\nEscalated to the LLM: {escalated}/{len(rows)} ({escalated / len(rows):.0%}); "
+          f"agreement with scenario labels on the rest: {agree / max(1, len(scored)):.1%}")
+
+    print(f"\n{'pipeline':>9} | {'llm calls':>9} | {'avoided':>8} | {'seconds':>8}")
+    print("-" * 44)
+    subset = rows[:PIPELINE_MESSAGES]
+    for label, stage in (("plain", None), ("triage", triage)):
+        stats = run_pipeline(subset, stage)
+        print(f"{label:>9} | {stats['llm_calls']:>9} | {stats['llm_avoided']:>8} | {stats['seconds']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
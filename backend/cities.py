@@ -0,0 +1,120 @@
+"""
+Per-city deployment settings: HQ, map bounds, landmark gazetteer, starting
+fleet and where the city's data files live. They replace the Mumbai
+constants app.py, ai_core.py, fleet.py and the ingest pipeline used to carry.
+
+A deployment serves the cities listed in CITIES_FILE, a JSON array of
+objects with the keys of City.to_dict() (relative paths are resolved against
+the file's directory); without it, Mumbai alone, with its data files in the
+working directory as before. Each process serves one city, named by the CITY
+environment variable (router.py starts one shard process per city); a plain
+single-process server serves the first.
+
+Cities keep their incidents, fleet, situation report, geocode cache and
+metrics under their own `data_dir`, so shards never share mutable state.
+"""
+import json
+import os
+import threading
+
+from preprocess_data import LOCATIONS
+
+# --- CONFIGURATION ---
+CITIES_FILE = os.getenv("CITIES_FILE")
+
+
+class City:
+    def __init__(self, name: str, label: str, hq: tuple, center: tuple, bounds: tuple, data_dir: str = "",
+                 gazetteer: list = (), fleet: list = None, road_graph: str = "road_graph.json",
+                 poi_data: str = "poi_data.json"):
+        self.name = name
+        self.label = label
+        self.hq = tuple(hq)                  # (lat, lng) routes start from when no unit position is given
+        self.center = tuple(center)          # origin of the local km projection used by fleet and POI lookups
+        self.bounds = tuple(bounds)          # (south, west, north, east); decides which shard a point belongs to
+        self.data_dir = data_dir             # "" = the working directory
+        self.gazetteer = list(gazetteer)     # [{"name", "lat", "lng", "area"}, ...]
+        self.fleet = fleet                   # starting units; None = fleet.DEFAULT_FLEET
+        self.road_graph = road_graph
+        self.poi_data = poi_data
+
+    @classmethod
+    def from_dict(cls, entry: dict, base_dir: str) -> "City":
+        """One CITIES_FILE entry; `gazetteer` may also name a JSON file holding the list."""
+        options = dict(entry)
+        gazetteer = options.get("gazetteer", [])
+        if isinstance(gazetteer, str):
+            with open(os.path.join(base_dir, gazetteer), 'r', encoding='utf-8') as f:
+                options["gazetteer"] = json.load(f)
+        options["data_dir"] = os.path.join(base_dir, options.get("data_dir", options["name"]))
+        options.setdefault("fleet", [])
+        return cls(**options)
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "label": self.label, "hq": list(self.hq), "center": list(self.center),
+                "bounds": list(self.bounds), "data_dir": self.data_dir, "gazetteer": self.gazetteer,
+                "fleet": self.fleet, "road_graph": self.road_graph, "poi_data": self.poi_data}
+
+    def path(self, filename: str) -> str:
+        """A file of this city's (absolute paths pass through unchanged)."""
+        return os.path.join(self.data_dir, filename)
+
+    def contains(self, lat: float, lng: float) -> bool:
+        south, west, north, east = self.bounds
+        return south <= lat <= north and west <= lng <= east
+
+    def intersects(self, bbox: tuple) -> bool:
+        south, west, north, east = bbox
+        return not (north < self.bounds[0] or south > self.bounds[2] or east < self.bounds[1] or west > self.bounds[3])
+
+    def geocode_query(self, location_text: str) -> str:
+        """'Andheri station' -> 'Andheri station, Mumbai': keeps the geocoder inside the city."""
+        return f"{location_text}, {self.label}"
+
+
+MUMBAI = City("mumbai", "Mumbai", hq=(18.9486, 72.8336), center=(19.0760, 72.8777),
+              bounds=(18.85, 72.75, 19.35, 73.10), data_dir="", gazetteer=LOCATIONS)
+
+
+def load_cities(path: str = None) -> list:
+    """The cities in a CITIES_FILE, or [MUMBAI] without one. Raises ValueError on duplicate names."""
+    if not path:
+        return [MUMBAI]
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    cities = [City.from_dict(entry, base_dir) for entry in entries]
+    names = [city.name for city in cities]
+    if not cities or len(set(names)) != len(names):
+        raise ValueError(f"{path} must list at least one city, each with a unique name.")
+    return cities
+
+
+def city_for_point(cities: list, lat: float, lng: float):
+    """The first city whose bounds hold the point, or None."""
+    return next((city for city in cities if city.contains(lat, lng)), None)
+
+
+_shared_cities = None
+_shared_lock = threading.Lock()
+
+
+def get_cities() -> list:
+    """Every city of this deployment (CITIES_FILE), loaded once."""
+    global _shared_cities
+    with _shared_lock:
+        if _shared_cities is None:
+            _shared_cities = load_cities(CITIES_FILE)
+        return _shared_cities
+
+
+def get_city(name: str = None) -> City:
+    """The named city, by default the one this process serves ($CITY, else the first)."""
+    cities = get_cities()
+    name = name or os.getenv("CITY")   # read late: asgi.py --city sets it after importing this module
+    if name is None:
+        return cities[0]
+    for city in cities:
+        if city.name == name:
+            return city
+    raise ValueError(f"Unknown city '{name}'. Configured: {', '.join(city.name for city in cities)}")
@@ -0,0 +1,153 @@
+"""
+Local stand-in for the Google Maps web services, with injectable faults.
+
+Serves /maps/api/geocode/json, /maps/api/directions/json and
+/maps/api/place/nearbysearch/json with canned answers built from the
+LOCATIONS gazetteer and poi_data.json. Each request can be delayed (latency
+plus jitter), failed with a 500, throttled with a 429, or stalled past the
+client's read timeout, at configurable rates. Settings can be changed while
+the server runs, e.g. to simulate an outage and recovery.
+
+    python fake_upstream.py --port 8099 --latency 0.2 --error-rate 0.1
+    MAPS_API_BASE_URL=http://127.0.0.1:8099 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from preprocess_data import LOCATIONS
+from routing import encode_polyline, format_distance, format_duration, haversine_m
+
+# --- CONFIGURATION ---
+DEFAULT_PORT = 8099
+STALL_SECONDS = 30.0      # long enough to trip any client read timeout
+POI_DATA_FILE = "poi_data.json"
+
+
+class FakeUpstream:
+    def __init__(self, port: int = 0, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, stall_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stall_rate = stall_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        try:
+            with open(POI_DATA_FILE, 'r', encoding='utf-8') as f:
+                self._places = json.load(f)["places"]
+        except FileNotFoundError:
+            self._places = {}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeUpstream":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def configure(self, **settings):
+        """Changes fault settings on the fly (latency, jitter, error_rate, throttle_rate, stall_rate)."""
+        for name, value in settings.items():
+            setattr(self, name, value)
+
+    # --- canned answers ---
+    def geocode(self, query: dict) -> dict:
+        address = query.get("address", [""])[0].lower()
+        for loc in LOCATIONS:
+            if loc["name"].lower() in address or loc["area"].lower() in address:
+                return {"status": "OK", "results": [{"geometry": {"location": {"lat": loc["lat"], "lng": loc["lng"]}}}]}
+        return {"status": "ZERO_RESULTS", "results": []}
+
+    def directions(self, query: dict) -> dict:
+        try:
+            start = [float(v) for v in query["origin"][0].split(",")]
+            end = [float(v) for v in query["destination"][0].split(",")]
+        except (KeyError, ValueError):
+            return {"status": "INVALID_REQUEST", "routes": []}
+        metres = float(haversine_m(start[0], start[1], end[0], end[1])) * 1.3
+        return {"status": "OK", "routes": [{
+            "legs": [{"distance": {"text": format_distance(metres), "value": int(metres)},
+                      "duration": {"text": format_duration(metres / 7.0), "value": int(metres / 7.0)}}],
+            "overview_polyline": {"points": encode_polyline([start, end])},
+        }]}
+
+    def nearby(self, query: dict) -> dict:
+        category = {"hospital": "hospitals", "police": "police_stations", "fire_station": "fire_stations"}
+        places = self._places.get(category.get(query.get("type", [""])[0], ""), [])
+        return {"status": "OK", "results": [
+            {"place_id": f"fake-{i}", "name": p["name"], "geometry": {"location": {"lat": p["lat"], "lng": p["lng"]}}}
+            for i, p in enumerate(places[:20])]}
+
+    def _handler(self):
+        upstream = self
+        routes = {"/maps/api/geocode/json": self.geocode, "/maps/api/directions/json": self.directions,
+                  "/maps/api/place/nearbysearch/json": self.nearby}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # keep-alive, so client connection pooling is observable
+            disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+            def do_GET(self):
+                with upstream._lock:
+                    upstream.requests += 1
+                parsed = urlparse(self.path)
+                roll = random.random()
+                delay = max(0.0, upstream.latency + random.uniform(-upstream.jitter, upstream.jitter))
+                if roll < upstream.stall_rate:
+                    delay = STALL_SECONDS
+                time.sleep(delay)
+                if roll < upstream.stall_rate + upstream.error_rate:
+                    return self._reply(500, {"status": "UNKNOWN_ERROR"})
+                if roll < upstream.stall_rate + upstream.error_rate + upstream.throttle_rate:
+                    return self._reply(429, {"status": "OVER_QUERY_LIMIT"}, {"Retry-After": "0.1"})
+                answer = routes.get(parsed.path)
+                if answer is None:
+                    return self._reply(404, {"status": "NOT_FOUND"})
+                self._reply(200, answer(parse_qs(parsed.query)))
+
+            def _reply(self, status: int, body: dict, headers: dict = None):
+                payload = json.dumps(body).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    for name, value in (headers or {}).items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass   # the client gave up (timeout) before we answered
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Google Maps upstream with fault injection.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share answered with 429")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share that hang past client timeouts")
+    args = parser.parse_args()
+    server = FakeUpstream(args.port, args.latency, args.jitter, args.error_rate, args.throttle_rate, args.stall_rate)
+    print(f"Fake upstream listening on {server.base_url}")
+    server.start()._thread.join()
@@ -0,0 +1,261 @@
+"""
+Server-side fleet registry and batch dispatch.
+
+Units are indexed per type with a KD-tree over locally projected (km)
+coordinates. Batch dispatch builds a sparse cost matrix from each incident's
+nearest available units of the right type and solves it as a minimum-cost
+bipartite matching, instead of the dashboard's greedy nearest-unit loop.
+Every incident also gets a private "leave unassigned" option whose cost
+grows with severity, so when units run short the most severe incidents win.
+
+With a `path`, the registry is shared by several worker processes: changes
+are written to that JSON file under a lock file, and every read first picks
+up whatever another worker wrote.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+
+from file_lock import FileLock
+from geo_projection import project_km
+from routing import DEFAULT_SPEED_KPH, ROAD_DETOUR_FACTOR
+
+# --- CONFIGURATION ---
+AVAILABLE_STATUS = "IDLE"
+DISPATCHED_STATUS = "DISPATCHED"
+CANDIDATES_PER_INCIDENT = 8
+MATCHING_ROUNDS = 4      # later rounds re-match leftovers against units nobody's shortlist reached
+UNASSIGNED_SECONDS_PER_SEVERITY = 3600.0  # leaving an incident unserved costs an hour of driving per severity point
+FLEET_STATE_FILE = "fleet_state.json"   # shared copy when several server workers run
+
+# Same starting fleet the dashboard shows (App.js `resources`); Mumbai's, other cities configure their own.
+DEFAULT_FLEET = [
+    {"id": "amb-1", "type": "ambulance", "status": "IDLE", "lat": 19.0760, "lng": 72.8777, "name": "Ambulance 1"},
+    {"id": "amb-2", "type": "ambulance", "status": "IDLE", "lat": 19.0200, "lng": 72.8400, "name": "Ambulance 2"},
+    {"id": "pol-1", "type": "police", "status": "IDLE", "lat": 19.0800, "lng": 72.8900, "name": "Patrol Alpha"},
+    {"id": "fire-1", "type": "fire", "status": "IDLE", "lat": 19.0600, "lng": 72.8500, "name": "Fire Engine 4"},
+]
+
+
+def required_unit_type(incident: dict) -> str:
+    """Same rule as the dashboard's auto-dispatch: fire beats medical, everything else gets police."""
+    needs = incident.get("need_type") or []
+    if isinstance(needs, str):
+        needs = [needs]
+    needs = " ".join(needs).lower()
+    if "fire" in needs:
+        return "fire"
+    if "medical" in needs or "ambulance" in needs:
+        return "ambulance"
+    return "police"
+
+
+def travel_seconds(km):
+    return km * ROAD_DETOUR_FACTOR / DEFAULT_SPEED_KPH * 3600.0
+
+
+class FleetRegistry:
+    def __init__(self, units: list = None, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()   # one batch at a time, so committed units are never handed out twice
+        self._file_lock = FileLock(path + ".lock") if path else None
+        self._units = {}
+        self._indexes = {}   # unit type -> (unit ids, cKDTree) over available units, rebuilt when dirty
+        self._stamp = None   # (inode, mtime) of the shared file we last loaded or wrote
+        with self._writing(), self._lock:
+            if not self._reload():   # the first worker up seeds the shared file
+                self._upsert(units if units is not None else DEFAULT_FLEET)
+
+    def upsert(self, units: list) -> int:
+        """Adds or updates units (matched by id). Unknown fields are kept as-is."""
+        with self._writing(), self._lock:
+            self._reload()
+            self._upsert(units)
+        return len(units)
+
+    def set_status(self, unit_id: str, status: str):
+        with self._writing(), self._lock:
+            self._reload()
+            if unit_id not in self._units:
+                raise ValueError(f"Unknown unit {unit_id!r}.")
+            self._units[unit_id]["status"] = status
+            self._indexes.clear()
+            self._save()
+
+    def all(self) -> list:
+        with self._lock:
+            self._reload()
+            return [dict(unit) for unit in self._units.values()]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._reload()
+            return len(self._units)
+
+    def available_index(self, unit_type: str):
+        """(unit ids, projected km points, cKDTree) of available units of one type; tree is None when there are none."""
+        with self._lock:
+            self._reload()
+            if unit_type not in self._indexes:
+                units = [u for u in self._units.values()
+                         if u.get("type") == unit_type and u.get("status") == AVAILABLE_STATUS]
+                ids = [u["id"] for u in units]
+                points = project_km([u["lat"] for u in units], [u["lng"] for u in units])
+                self._indexes[unit_type] = (ids, points, cKDTree(points) if units else None)
+            return self._indexes[unit_type]
+
+    def nearest(self, lat: float, lng: float, unit_type: str, k: int = 1) -> list:
+        """Up to k nearest available units of a type, as (unit id, km)."""
+        ids, _, tree = self.available_index(unit_type)
+        if tree is None:
+            return []
+        k = min(k, len(ids))
+        distances, indices = tree.query(project_km([lat], [lng])[0], k=k)
+        return [(ids[i], float(d)) for d, i in zip(np.atleast_1d(distances), np.atleast_1d(indices))]
+
+    def dispatched_incident_ids(self) -> set:
+        """Ids of the incidents a DISPATCHED unit is on."""
+        with self._lock:
+            self._reload()
+            return {unit.get("incident_id") for unit in self._units.values()
+                    if unit.get("status") == DISPATCHED_STATUS}
+
+    def dispatch_batch(self, incidents: list, commit: bool = False,
+                       candidates: int = CANDIDATES_PER_INCIDENT) -> dict:
+        """
+        Assigns at most one available unit to each incident (with coordinates),
+        minimising total travel time plus the severity-weighted cost of leaving
+        incidents unserved. With commit=True the chosen units are marked DISPATCHED.
+        Incidents a DISPATCHED unit is already on are skipped (listed as already_dispatched).
+        """
+        with self._dispatch_lock, self._writing():
+            return self._dispatch_batch(incidents, commit, candidates)
+
+    # --- internal helpers ---
+    def _writing(self):
+        """Excludes other worker processes while the shared fleet changes."""
+        return self._file_lock if self._file_lock is not None else contextlib.nullcontext()
+
+    def _upsert(self, units: list):
+        # Caller holds self._lock (and the file lock when shared).
+        for unit in units:
+            current = self._units.setdefault(unit["id"], {"status": AVAILABLE_STATUS})
+            current.update(unit)
+            current["lat"] = float(current["lat"])
+            current["lng"] = float(current["lng"])
+        self._indexes.clear()
+        self._save()
+
+    def _reload(self) -> bool:
+        """Caller holds self._lock. Loads the shared file if another worker changed it; False if there is none."""
+        if self.path is None:
+            return False
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if (stat.st_ino, stat.st_mtime_ns) != self._stamp:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._units = {unit["id"]: unit for unit in json.load(f)}
+            self._indexes.clear()
+            self._stamp = (stat.st_ino, stat.st_mtime_ns)
+        return True
+
+    def _save(self):
+        # Caller holds self._lock and the file lock.
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._units.values()), f)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    def _dispatch_batch(self, incidents: list, commit: bool, candidates: int) -> dict:
+        start = time.perf_counter()
+        served = self.dispatched_incident_ids()
+        by_type, already_dispatched = {}, []
+        for incident in incidents:
+            if incident.get("id") in served:
+                already_dispatched.append(incident.get("id"))
+            elif incident.get("coordinates"):
+                by_type.setdefault(required_unit_type(incident), []).append(incident)
+
+        assignments, unassigned = [], []
+        for unit_type, group in by_type.items():
+            ids, points, tree = self.available_index(unit_type)
+            free = np.ones(len(ids), dtype=bool)
+            remaining = group
+            for round_no in range(MATCHING_ROUNDS):
+                if tree is None or not remaining:
+                    break
+                live = np.flatnonzero(free)
+                round_tree = tree if round_no == 0 else cKDTree(points[live])
+                matched, remaining = _solve(remaining, round_tree, min(candidates, len(live)))
+                for incident, column, km in matched:
+                    free[live[column]] = False
+                    assignments.append({
+                        "incident_id": incident.get("id"),
+                        "unit_id": ids[live[column]],
+                        "unit_type": unit_type,
+                        "distance_m": int(round(km * ROAD_DETOUR_FACTOR * 1000)),
+                        "eta_seconds": int(round(travel_seconds(km))),
+                    })
+                if not matched or not free.any():
+                    break
+            unassigned += [incident.get("id") for incident in remaining]
+
+        if commit:
+            with self._lock:
+                for assignment in assignments:
+                    unit = self._units[assignment["unit_id"]]
+                    unit["status"] = DISPATCHED_STATUS
+                    unit["incident_id"] = assignment["incident_id"]
+                self._indexes.clear()
+                self._save()
+
+        return {
+            "assignments": assignments,
+            "unassigned": unassigned,
+            "already_dispatched": already_dispatched,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+
+def _solve(incidents: list, tree, k: int):
+    """
+    Min-cost matching of incidents to their k nearest units in `tree` (plus one
+    'unassigned' column each). Returns ([(incident, tree index, km)], [missed incidents]).
+    """
+    n, n_units = len(incidents), tree.n
+    points = project_km([i["coordinates"]["lat"] for i in incidents], [i["coordinates"]["lng"] for i in incidents])
+    distances, indices = tree.query(points, k=k)
+    distances = distances.reshape(n, k)
+    indices = indices.reshape(n, k)
+
+    severity = np.array([incident.get("severity_score") or 0 for incident in incidents], dtype=np.float64)
+    # Strictly positive weights: sparse matrices drop explicit zeros, which would hide a unit parked on the incident.
+    costs = np.column_stack((travel_seconds(distances) + 1e-3,
+                             np.maximum(severity, 0.1) * UNASSIGNED_SECONDS_PER_SEVERITY))
+    columns = np.column_stack((indices, n_units + np.arange(n)))
+    rows = np.repeat(np.arange(n), k + 1)
+    matrix = csr_matrix((costs.ravel(), (rows, columns.ravel())), shape=(n, n_units + n))
+
+    _, matched_columns = min_weight_full_bipartite_matching(matrix)
+    matched, missed = [], []
+    for row, column in enumerate(matched_columns):
+        if column < n_units:
+            km = float(distances[row][indices[row] == column][0])
+            matched.append((incidents[row], int(column), km))
+        else:
+            missed.append(incidents[row])
+    return matched, missed
@@ -0,0 +1,111 @@
+"""
+Geohash arithmetic for viewport queries and map tiles (see incident_table).
+
+Geohashes are handled as integers: 5 bits per character, longitude and
+latitude bits interleaved, so the geohash of any coarser precision is a
+prefix of a finer one, i.e. a right shift.
+"""
+from datetime import datetime
+
+import numpy as np
+
+# --- CONFIGURATION ---
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+CODE_PRECISION = 8            # geohash characters stored per incident (40 bits)
+INDEX_PRECISION = 6           # cell size of the row buckets
+MAX_COVER_CELLS = 4096        # a bbox needing more index cells is answered by a full scan
+FULL_SCAN_FRACTION = 4        # ... as is one holding more than 1/4 of the rows
+# Map zoom -> geohash precision for clustered tiles: a few cells per 256 px map tile.
+ZOOM_PRECISION = [(3, 1), (5, 2), (8, 3), (10, 4), (12, 5), (14, 6), (16, 7)]
+_CODE_BITS = 5 * CODE_PRECISION
+_AXIS_BITS = _CODE_BITS // 2  # 20 bits each for longitude and latitude
+_SPREAD_STEPS = ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                 (2, 0x3333333333333333), (1, 0x5555555555555555))
+
+
+def precision_for_zoom(zoom: float) -> int:
+    for max_zoom, precision in ZOOM_PRECISION:
+        if zoom <= max_zoom:
+            return precision
+    return CODE_PRECISION
+
+
+def _spread_bits(values):
+    """Spreads the low 20 bits of each value to the even bit positions (bit i -> bit 2i)."""
+    x = np.asarray(values, dtype=np.uint64) & np.uint64(0xFFFFF)
+    for shift, mask in _SPREAD_STEPS:
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+
+def _interleave(lng_cells, lat_cells):
+    # Geohash bits alternate longitude, latitude, ... starting from the most significant bit.
+    return ((_spread_bits(lng_cells) << np.uint64(1)) | _spread_bits(lat_cells)).astype(np.int64)
+
+
+def geohash_codes(lats, lngs):
+    """Precision-8 geohashes of many points, as 40-bit integers."""
+    scale = float(1 << _AXIS_BITS)
+    lat_cells = np.clip(((np.asarray(lats, dtype=np.float64) + 90.0) / 180.0 * scale), 0, scale - 1)
+    lng_cells = np.clip(((np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * scale), 0, scale - 1)
+    return _interleave(lng_cells.astype(np.uint64), lat_cells.astype(np.uint64))
+
+
+def geohash_code(lat: float, lng: float) -> int:
+    """geohash_codes() for one point, in plain integer arithmetic (no array overhead)."""
+    scale = 1 << _AXIS_BITS
+    lat_cell = min(max(int((lat + 90.0) / 180.0 * scale), 0), scale - 1)
+    lng_cell = min(max(int((lng + 180.0) / 360.0 * scale), 0), scale - 1)
+    return (_spread_int(lng_cell) << 1) | _spread_int(lat_cell)
+
+
+def _spread_int(x: int) -> int:
+    for shift, mask in _SPREAD_STEPS:
+        x = (x | (x << shift)) & mask
+    return x
+
+
+def code_to_geohash(code: int, precision: int) -> str:
+    """A precision-p prefix code (code >> (40 - 5p)) as the usual base32 string."""
+    return "".join(BASE32[(int(code) >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def cell_bounds(code: int, precision: int) -> dict:
+    """South/west/north/east of a precision-p cell."""
+    code40 = int(code) << (_CODE_BITS - 5 * precision)
+    lng_cell = lat_cell = 0
+    for bit in range(_AXIS_BITS):
+        lng_cell |= ((code40 >> (2 * bit + 1)) & 1) << bit
+        lat_cell |= ((code40 >> (2 * bit)) & 1) << bit
+    lng_bits, lat_bits = (5 * precision + 1) // 2, 5 * precision // 2
+    width, height = 360.0 / (1 << lng_bits), 180.0 / (1 << lat_bits)
+    west = (lng_cell >> (_AXIS_BITS - lng_bits)) * width - 180.0
+    south = (lat_cell >> (_AXIS_BITS - lat_bits)) * height - 90.0
+    return {"south": south, "west": west, "north": south + height, "east": west + width}
+
+
+def covering_cells(bbox: tuple, precision: int, limit: int = MAX_COVER_CELLS):
+    """Prefix codes of the precision-p cells overlapping (south, west, north, east); None if more than `limit`."""
+    south, west, north, east = bbox
+    lng_bits, lat_bits = (5 * precision + 1) // 2, 5 * precision // 2
+    lng_lo, lng_hi = (int((v + 180.0) / 360.0 * (1 << lng_bits)) for v in (west, east))
+    lat_lo, lat_hi = (int((v + 90.0) / 180.0 * (1 << lat_bits)) for v in (south, north))
+    lng_hi, lat_hi = min(lng_hi, (1 << lng_bits) - 1), min(lat_hi, (1 << lat_bits) - 1)
+    if (lng_hi - lng_lo + 1) * (lat_hi - lat_lo + 1) > limit:
+        return None
+    lng_cells, lat_cells = np.meshgrid(np.arange(lng_lo, lng_hi + 1, dtype=np.uint64),
+                                       np.arange(lat_lo, lat_hi + 1, dtype=np.uint64))
+    codes = _interleave(lng_cells.ravel() << np.uint64(_AXIS_BITS - lng_bits),
+                        lat_cells.ravel() << np.uint64(_AXIS_BITS - lat_bits))
+    return codes >> (_CODE_BITS - 5 * precision)
+
+
+def parse_time(value) -> float:
+    """ISO timestamp (or epoch seconds) -> epoch seconds; NaN when missing or unparseable."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return float("nan")
+
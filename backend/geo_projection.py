@@ -0,0 +1,25 @@
+"""
+Local planar projection for nearest-neighbour work (fleet dispatch, POI and
+gazetteer KD-trees): degrees -> km on a grid centred on the city.
+"""
+import math
+
+import numpy as np
+
+from cities import get_city
+
+# --- CONFIGURATION ---
+KM_PER_DEGREE = 111.195
+
+
+def project_km(lats, lngs, origin: tuple = None):
+    """
+    Equirectangular projection to a local km grid, good enough for city-scale nearest-neighbour work.
+    The grid is centred on this process's city unless an origin (lat, lng) is given.
+    """
+    origin = origin or get_city().center
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    x = (lngs - origin[1]) * math.cos(math.radians(origin[0])) * KM_PER_DEGREE
+    y = (lats - origin[0]) * KM_PER_DEGREE
+    return np.column_stack((x, y))
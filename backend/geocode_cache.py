@@ -0,0 +1,217 @@
+"""
+Geocoding cache in front of the Google Geocoding API.
+
+Lookups go through four tiers, cheapest first:
+    1. in-memory LRU (with TTL), keyed by the normalized location string
+    2. SQLite on disk, which survives restarts and is shared between processes
+    3. the city's landmark gazetteer (cities.py; Mumbai's is LOCATIONS), matched by
+       alias, containment ("near Andheri stn" -> "andheri station") or fuzzy ratio
+    4. the network fetcher, whose answers are written back to tiers 1 and 2
+
+Reverse lookups (coordinates -> nearest landmark), which /report_incident uses
+to label user reports, only answer with gazetteer names: network results are
+named by whatever text was looked up, which is no label to show. The landmarks
+sit in a KD-tree, as in poi_index.py.
+"""
+import difflib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from cities import get_cities, get_city
+from geo_projection import project_km
+from metrics import get_registry
+from preprocess_data import LOCATIONS
+
+# --- CONFIGURATION ---
+GEOCODE_CACHE_FILE = "geocode_cache.sqlite3"
+MEMORY_CACHE_SIZE = 4096
+MEMORY_TTL_SECONDS = 60 * 60
+DISK_TTL_SECONDS = 30 * 24 * 60 * 60
+NEGATIVE_TTL_SECONDS = 10 * 60     # "not found" answers are only remembered in memory, briefly
+FUZZY_CUTOFF = 0.85
+REVERSE_MAX_KM = 1.5
+
+ABBREVIATIONS = {
+    "stn": "station", "sta": "station", "rly": "railway", "rd": "road", "mkt": "market",
+    "hosp": "hospital", "bldg": "building", "nr": "near", "opp": "opposite", "chk": "check",
+    "w": "west", "e": "east", "mt": "mount",
+}
+FILLER_WORDS = {"near", "the", "at", "opposite", "behind", "next", "to", "old", "in", "on", "of",
+                "outside", "area", "mumbai", "bombay", "maharashtra", "india"}
+for _city in get_cities():
+    FILLER_WORDS.update(_city.label.lower().split())   # the ", <City>" suffix geocode_query() adds
+
+LOOKUP_SECONDS = get_registry().histogram(
+    "geocode_lookup_duration_seconds", "Geocode lookups by the tier that answered (miss = no answer).", ("tier",))
+
+
+def normalize_location(text: str) -> str:
+    """'Near Andheri Stn., Mumbai' -> 'andheri station'."""
+    tokens = re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split()
+    tokens = [ABBREVIATIONS.get(token, token) for token in tokens]
+    return " ".join(token for token in tokens if token not in FILLER_WORDS)
+
+
+class GeocodeCache:
+    def __init__(self, path: str = GEOCODE_CACHE_FILE, fetch=None,
+                 memory_size: int = MEMORY_CACHE_SIZE, memory_ttl: float = MEMORY_TTL_SECONDS,
+                 disk_ttl: float = DISK_TTL_SECONDS, gazetteer: list = LOCATIONS):
+        self.fetch = fetch
+        self.memory_size = memory_size
+        self.memory_ttl = memory_ttl
+        self.disk_ttl = disk_ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> (expires_at, coordinates or None)
+        self._stats = {tier: {"hits": 0, "seconds": 0.0} for tier in ("memory", "disk", "gazetteer", "network")}
+        self._stats["miss"] = {"hits": 0, "seconds": 0.0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS geocodes (
+            key TEXT PRIMARY KEY, query TEXT, lat REAL, lng REAL, source TEXT, updated_at REAL)""")
+        self._db.commit()
+
+        self._aliases = {}       # normalized alias -> (canonical name, lat, lng)
+        self._place_names = []   # gazetteer names for reverse lookups, in _place_tree order
+        self._place_tree = None
+        self._origin = None      # projection origin of _place_tree (the gazetteer's centre)
+        self._seed(gazetteer)
+
+    # --- public API ---
+    def lookup(self, location_text: str) -> dict:
+        """Coordinates ({"lat", "lng"}) for a location string, or None."""
+        start = time.perf_counter()
+        key = normalize_location(location_text)
+        if not key:
+            return self._record("miss", start, None)
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            fresh = entry is not None and entry[0] > now
+            if fresh:
+                self._memory.move_to_end(key)
+            else:
+                row = self._db.execute("SELECT lat, lng, source, updated_at FROM geocodes WHERE key = ?",
+                                       (key,)).fetchone()
+        if fresh:   # a remembered "not found" is still a miss
+            return self._record("memory" if entry[1] is not None else "miss", start, entry[1])
+        if row is not None and (row[2] == "gazetteer" or row[3] + self.disk_ttl > now):
+            coordinates = {"lat": row[0], "lng": row[1]}
+            self._remember(key, coordinates, self.memory_ttl)
+            return self._record("disk", start, coordinates)
+
+        match = self.match_gazetteer(key)
+        if match is not None:
+            coordinates = {"lat": match[1], "lng": match[2]}
+            self._remember(key, coordinates, self.memory_ttl)
+            return self._record("gazetteer", start, coordinates)
+
+        if self.fetch is None:
+            return self._record("miss", start, None)
+        coordinates = self.fetch(location_text)
+        if coordinates:
+            self._store(key, location_text, coordinates["lat"], coordinates["lng"], "network")
+            self._remember(key, coordinates, self.memory_ttl)
+            return self._record("network", start, coordinates)
+        self._remember(key, None, NEGATIVE_TTL_SECONDS)
+        return self._record("miss", start, None)
+
+    def match_gazetteer(self, key: str):
+        """(name, lat, lng) of the landmark a normalized location string refers to, or None."""
+        if key in self._aliases:
+            return self._aliases[key]
+        padded = f" {key} "
+        contained = [alias for alias in self._aliases if f" {alias} " in padded]
+        if contained:
+            return self._aliases[max(contained, key=len)]
+        close = difflib.get_close_matches(key, self._aliases.keys(), n=1, cutoff=FUZZY_CUTOFF)
+        return self._aliases[close[0]] if close else None
+
+    def reverse(self, lat: float, lng: float, max_km: float = REVERSE_MAX_KM):
+        """Name of the closest gazetteer landmark within max_km of a point, or None."""
+        if self._place_tree is None:
+            return None
+        km, index = self._place_tree.query(project_km([lat], [lng], self._origin)[0], distance_upper_bound=max_km)
+        return self._place_names[index] if km <= max_km else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = sum(tier["hits"] for tier in self._stats.values())
+            cached = sum(self._stats[tier]["hits"] for tier in ("memory", "disk", "gazetteer"))
+            return {
+                "lookups": total,
+                "hit_rate": cached / total if total else 0.0,
+                "tiers": {name: {"count": tier["hits"],
+                                 "avg_ms": tier["seconds"] * 1000 / tier["hits"] if tier["hits"] else 0.0}
+                          for name, tier in self._stats.items()},
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- internal helpers ---
+    def _seed(self, gazetteer: list):
+        rows = []
+        for loc in gazetteer:
+            place = (loc["name"], loc["lat"], loc["lng"])
+            for alias in (loc["name"], f"{loc['name']}, {loc.get('area', '')}"):
+                key = normalize_location(alias)
+                self._aliases[key] = place
+                rows.append((key, alias, loc["lat"], loc["lng"], "gazetteer", time.time()))
+            # A bare area name ("Dadar") resolves to its first landmark unless one is named that way.
+            area_key = normalize_location(loc.get("area", ""))
+            if area_key:
+                self._aliases.setdefault(area_key, place)
+        if gazetteer:
+            lats, lngs = [loc["lat"] for loc in gazetteer], [loc["lng"] for loc in gazetteer]
+            self._origin = (float(np.mean(lats)), float(np.mean(lngs)))
+            self._place_names = [loc["name"] for loc in gazetteer]
+            self._place_tree = cKDTree(project_km(lats, lngs, self._origin))
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _store(self, key: str, query: str, lat: float, lng: float, source: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, query, lat, lng, source, time.time()))
+            self._db.commit()
+
+    def _remember(self, key: str, coordinates, ttl: float):
+        with self._lock:
+            self._memory[key] = (time.time() + ttl, coordinates)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _record(self, tier: str, start: float, result):
+        elapsed = time.perf_counter() - start
+        LOOKUP_SECONDS.observe(elapsed, tier)
+        with self._lock:
+            self._stats[tier]["hits"] += 1
+            self._stats[tier]["seconds"] += elapsed
+        return result
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_geocode_cache(fetch=None) -> GeocodeCache:
+    """Process-wide cache for this process's city, on GEOCODE_CACHE_FILE in its data_dir, like its other data files."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            city = get_city()
+            _shared_cache = GeocodeCache(city.path(GEOCODE_CACHE_FILE), fetch=fetch, gazetteer=city.gazetteer)
+        elif fetch is not None and _shared_cache.fetch is None:
+            _shared_cache.fetch = fetch
+        return _shared_cache
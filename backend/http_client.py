@@ -0,0 +1,312 @@
+"""
+Shared outbound HTTP client for every external API call (Geocoding, Directions, Places).
+
+One pooled requests.Session serves all threads, so keep-alive connections and
+TLS sessions are reused instead of re-handshaking per call. Every request is
+tagged with a service name, and the service's policy decides:
+    * timeouts: (connect, read) seconds, so a slow upstream cannot hang a worker
+    * retries: idempotent requests retry connection errors, timeouts, 5xx and 429
+      with full-jitter exponential backoff (honouring a short Retry-After)
+    * circuit breaker: after `failure_threshold` consecutive failures the service
+      is short-circuited for `reset_seconds`, then a single trial call is let through
+    * budgets: a token bucket (rate + burst) plus an optional daily quota
+    * coalescing: identical GETs already in flight share a single upstream call
+
+Every error raised here subclasses requests.exceptions.RequestException, so
+callers keep their existing error handling.
+
+MAPS_API_BASE_URL points the Maps calls somewhere else, e.g. at
+fake_upstream.py for testing under injected latency and errors.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+MAPS_API_BASE_URL = os.getenv("MAPS_API_BASE_URL", "https://maps.googleapis.com")
+POOL_SIZE = 32                    # keep-alive connections kept per host
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_CAP_SECONDS = 2.0
+MAX_RETRY_AFTER_SECONDS = 5.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CIRCUIT_STATES = ("closed", "half-open", "open")
+
+DEFAULT_POLICY = {
+    "timeout": (3.05, 10.0),      # (connect, read) seconds
+    "retries": 2,
+    "failure_threshold": 5,
+    "reset_seconds": 30.0,
+    "rate_per_second": 50.0,
+    "burst": 50,
+    "daily_quota": None,
+    "max_wait_seconds": 2.0,      # longest a call waits for a rate-limit token
+}
+SERVICES = {
+    "geocoding": {"timeout": (3.05, 5.0), "rate_per_second": 40.0, "burst": 40},
+    "directions": {"timeout": (3.05, 8.0), "rate_per_second": 40.0, "burst": 40},
+    "places": {"timeout": (3.05, 8.0), "rate_per_second": 10.0, "burst": 20},
+}
+
+
+UPSTREAM_SECONDS = get_registry().histogram(
+    "upstream_request_duration_seconds", "Outbound API call latency per attempt.", ("service", "outcome"))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The service has failed repeatedly and is being short-circuited."""
+
+
+class BudgetExceededError(requests.exceptions.RequestException):
+    """The service's rate limit or daily quota would be exceeded."""
+
+
+def maps_url(path: str) -> str:
+    return MAPS_API_BASE_URL.rstrip("/") + path
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        """True if a call may go out now; while half-open only one trial call is allowed at a time."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def cancel(self):
+        """The call allow() admitted never went out (e.g. it was throttled)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class RateBudget:
+    """Token bucket with an optional per-day quota."""
+
+    def __init__(self, rate_per_second: float, burst: int, daily_quota: int = None):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._day = time.strftime("%Y-%m-%d")
+        self.used_today = 0
+
+    def acquire(self, max_wait: float):
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                today = time.strftime("%Y-%m-%d")
+                if today != self._day:
+                    self._day, self.used_today = today, 0
+                if self.daily_quota is not None and self.used_today >= self.daily_quota:
+                    raise BudgetExceededError(f"Daily quota of {self.daily_quota} calls used up.")
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.used_today += 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            if now + wait > deadline:
+                raise BudgetExceededError(f"Rate limit of {self.rate_per_second}/s reached.")
+            time.sleep(wait)
+
+
+class OutboundClient:
+    def __init__(self, services: dict = None, pool_size: int = POOL_SIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._policies = {}
+        self._breakers = {}
+        self._budgets = {}
+        self._lock = threading.Lock()
+        self._inflight = {}    # coalescing key -> Future
+        self._stats = {}
+        for name, overrides in (services if services is not None else SERVICES).items():
+            self.configure(name, **overrides)
+
+    def configure(self, service: str, **overrides):
+        """Sets (or replaces) a service's policy; unspecified fields come from DEFAULT_POLICY."""
+        with self._lock:
+            self._install(service, {**DEFAULT_POLICY, **overrides})
+
+    def get(self, service: str, url: str, params: dict = None, **kwargs) -> requests.Response:
+        """GET with the service's policy; identical concurrent GETs share one upstream call."""
+        key = (service, url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            self._policy(service)
+            self._stats[service]["requests"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self._stats[service]["coalesced"] += 1
+        if not leader:
+            return future.result()
+        try:
+            response = self._send(service, "GET", url, idempotent=True, params=params, **kwargs)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def request(self, service: str, method: str, url: str, idempotent: bool = False, **kwargs) -> requests.Response:
+        """Any other request; only retried when the caller says it is idempotent."""
+        with self._lock:
+            self._policy(service)
+            self._stats[service]["requests"] += 1
+        return self._send(service, method, url, idempotent=idempotent, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {service: {**counts, "circuit": self._breakers[service].state,
+                              "used_today": self._budgets[service].used_today}
+                    for service, counts in self._stats.items()}
+
+    # --- internal helpers ---
+    def _policy(self, service: str) -> dict:
+        # Caller holds self._lock. Unknown services get the default policy on first use.
+        if service not in self._policies:
+            self._install(service, dict(DEFAULT_POLICY))
+        return self._policies[service]
+
+    def _install(self, service: str, policy: dict):
+        # Caller holds self._lock.
+        self._policies[service] = policy
+        self._breakers[service] = CircuitBreaker(policy["failure_threshold"], policy["reset_seconds"])
+        self._budgets[service] = RateBudget(policy["rate_per_second"], policy["burst"], policy["daily_quota"])
+        self._stats[service] = {key: 0 for key in ("requests", "upstream_calls", "retries", "failures",
+                                                   "coalesced", "short_circuited", "throttled")}
+
+    def _count(self, service: str, key: str):
+        with self._lock:
+            self._stats[service][key] += 1
+
+    def _send(self, service: str, method: str, url: str, idempotent: bool, **kwargs) -> requests.Response:
+        with self._lock:
+            policy = self._policies[service]
+            breaker, budget = self._breakers[service], self._budgets[service]
+        kwargs.setdefault("timeout", policy["timeout"])
+        attempts = 1 + (policy["retries"] if idempotent else 0)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                self._count(service, "short_circuited")
+                raise CircuitOpenError(f"{service} circuit is open after repeated failures.")
+            try:
+                budget.acquire(policy["max_wait_seconds"])
+            except BudgetExceededError:
+                breaker.cancel()
+                self._count(service, "throttled")
+                raise
+            self._count(service, "upstream_calls")
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, service, type(e).__name__)
+                breaker.record_failure()
+                error = e
+            else:
+                UPSTREAM_SECONDS.observe(time.perf_counter() - started, service, str(response.status_code))
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                error = requests.exceptions.HTTPError(f"{response.status_code} from {service}", response=response)
+                retry_after = response.headers.get("Retry-After")
+            if attempt == attempts - 1:
+                self._count(service, "failures")
+                if isinstance(error, requests.exceptions.HTTPError):
+                    return error.response   # let the caller's raise_for_status() report it as before
+                raise error
+            self._count(service, "retries")
+            time.sleep(self._backoff(attempt, retry_after))
+        raise AssertionError("unreachable")
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after) -> float:
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), MAX_RETRY_AFTER_SECONDS)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def collect_metrics() -> list:
+    """Scrape-time view of the shared client's counters, circuits and daily quota use."""
+    if _shared_client is None:
+        return []
+    stats = _shared_client.stats()
+    events = [({"service": service, "event": event}, value) for service, counts in stats.items()
+              for event, value in counts.items() if event not in ("circuit", "used_today")]
+    circuits = [({"service": service}, CIRCUIT_STATES.index(counts["circuit"])) for service, counts in stats.items()]
+    used = [({"service": service}, counts["used_today"]) for service, counts in stats.items()]
+    return [
+        ("upstream_events_total", "counter", "Outbound client events per service (requests, retries, ...).", events),
+        ("upstream_circuit_state", "gauge", "Circuit breaker state: 0 closed, 1 half-open, 2 open.", circuits),
+        ("upstream_calls_today", "gauge", "Calls counted against the daily quota.", used),
+    ]
+
+
+get_registry().add_collector(collect_metrics)
+
+
+def get_http_client() -> OutboundClient:
+    """Process-wide client, created on first use."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = OutboundClient()
+        return _shared_client
@@ -0,0 +1,462 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from file_lock import FileLock
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+JOURNAL_SUFFIX = ".journal"           # live append-only log next to the snapshot
+COMPACTING_SUFFIX = ".journal.compacting"
+LOCK_SUFFIX = ".journal.lock"         # held by whichever process is writing or rotating the journal
+COMPACT_LOCK_SUFFIX = ".journal.compact.lock"
+EPOCH_SUFFIX = ".journal.epoch"       # names this generation of the data; reset() starts a new one
+COMPACT_EVERY = 5000                  # journal records before a background compaction
+MERGED_REPORT = "merged_report"       # key of a record that folds repeat reports into an earlier incident
+
+log = logging.getLogger(__name__)
+FSYNC_SECONDS = get_registry().histogram("incident_journal_fsync_seconds", "Journal fsync latency.")
+GROUP_COMMIT_RECORDS = get_registry().histogram(
+    "incident_journal_group_commit_records", "Records made durable by one fsync.", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+COMPACTION_SECONDS = get_registry().histogram("incident_journal_compaction_seconds", "Snapshot compaction time.")
+
+
+def _fsync_dir(path: str):
+    """Makes a rename/unlink in `path`'s directory durable (no-op where unsupported)."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _read_journal(path: str) -> list:
+    """
+    Reads (seq, incident) pairs from a JSON Lines journal.
+    A torn final line (crash mid-write) is cut off so the next append starts clean.
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    good_offset = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(raw)
+                records.append((entry["seq"], entry["incident"]))
+            except (ValueError, KeyError, TypeError):
+                log.warning("Skipping corrupt journal record", extra={"path": path, "offset": good_offset})
+            good_offset += len(raw)
+    if good_offset < os.path.getsize(path):
+        log.warning("Truncating torn journal tail", extra={"path": path, "offset": good_offset})
+        with open(path, 'r+b') as f:
+            f.truncate(good_offset)
+    return records
+
+
+def _read_snapshot(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_temp_snapshot(path: str, incidents: list) -> str:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(incidents, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path
+
+
+def _write_snapshot(path: str, incidents: list):
+    """Atomically replaces the snapshot (write temp, fsync, rename)."""
+    os.replace(_write_temp_snapshot(path, incidents), path)
+    _fsync_dir(path)
+
+
+def _inode(path: str):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def _line_seq(raw: bytes):
+    """The seq of a journal line without parsing the incident (lines start with {"seq":N,)."""
+    if raw.startswith(b'{"seq":'):
+        try:
+            return int(raw[7:raw.find(b",", 7)])
+        except ValueError:
+            pass
+    return None
+
+
+def merged_report_record(journal_seq: int, report_count: int, duplicate_ids: list, last_reported=None) -> dict:
+    """
+    A journal record saying the incident journaled as `journal_seq` has now been
+    reported `report_count` times in all (see apply_merged_report).
+    """
+    return {MERGED_REPORT: {"journal_seq": journal_seq, "report_count": report_count,
+                            "duplicate_ids": list(duplicate_ids), "last_reported": last_reported}}
+
+
+def apply_merged_report(incident: dict, report: dict, seq: int):
+    """
+    Folds a merged_report into its incident. Idempotent, so replaying a record
+    that an interrupted compaction already folded in changes nothing.
+    """
+    incident["report_count"] = max(incident.get("report_count", 1), report["report_count"])
+    known = set(incident.get("duplicate_ids", []))
+    incident["duplicate_ids"] = incident.get("duplicate_ids", []) + [i for i in report["duplicate_ids"] if i not in known]
+    if report.get("last_reported") is not None:
+        incident["last_reported"] = report["last_reported"]
+    incident["merged_seq"] = max(incident.get("merged_seq", 0), seq)
+
+
+def last_seq(incident: dict) -> int:
+    """The newest journal record that went into a (snapshot) incident: its own, or a report merged into it."""
+    return max(incident.get("journal_seq", 0), incident.get("merged_seq", 0))
+
+
+def _merge(snapshot: list, journal_records: list) -> list:
+    """
+    Applies journal records on top of a snapshot, newest first, the same order
+    report_incident used to produce by inserting at the top of the file.
+    Records already folded into the snapshot (by an interrupted compaction) are skipped.
+    """
+    compacted_through = max((last_seq(item) for item in snapshot), default=0)
+    fresh, reports = [], []
+    for seq, record in sorted(journal_records, key=lambda r: r[0]):
+        if seq > compacted_through:
+            if MERGED_REPORT in record:
+                reports.append((seq, record[MERGED_REPORT]))
+            else:
+                fresh.append(record)
+    fresh.reverse()
+    merged = fresh + snapshot
+    if reports:
+        by_seq = {incident["journal_seq"]: incident for incident in merged if incident.get("journal_seq")}
+        for seq, report in reports:
+            incident = by_seq.get(report["journal_seq"])
+            if incident is not None:
+                apply_merged_report(incident, report, seq)
+    return merged
+
+
+def reset(snapshot_path: str, incidents: list):
+    """Writes a brand new snapshot and discards any journal that belonged to the old one."""
+    _write_snapshot(snapshot_path, incidents)
+    for suffix in (JOURNAL_SUFFIX, COMPACTING_SUFFIX, EPOCH_SUFFIX):
+        if os.path.exists(snapshot_path + suffix):
+            os.remove(snapshot_path + suffix)
+    _fsync_dir(snapshot_path)
+
+
+class IncidentJournal:
+    """
+    Write-ahead journal for reported incidents.
+
+    The snapshot (processed_data.json) stays a plain JSON array so existing tools
+    can read it. Every new incident is appended as one JSON line to
+    `<snapshot>.journal` instead of rewriting the whole array. Appends use group
+    commit: concurrent writers share a single fsync, so a surge costs one disk
+    flush per batch rather than one per report. Once the journal grows past
+    `compact_every` records it is rotated and folded into a new snapshot on a
+    background thread.
+
+    Several processes (server workers) may share one journal. Writes and
+    rotations happen under a lock file, so sequence numbers stay global and
+    nobody appends to a file that was just rotated away. poll() tails the
+    journal and hands back every record appended since the last poll, by any
+    process, in sequence order. Replacing the data with reset() still needs the
+    servers to be restarted.
+    """
+
+    def __init__(self, snapshot_path: str, compact_every: int = COMPACT_EVERY, fsync: bool = True):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path + JOURNAL_SUFFIX
+        self.compacting_path = snapshot_path + COMPACTING_SUFFIX
+        self.compact_every = compact_every
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._file_lock = FileLock(snapshot_path + LOCK_SUFFIX)
+        self._compact_file_lock = FileLock(snapshot_path + COMPACT_LOCK_SUFFIX)
+        self._file = None
+        self._file_ino = None
+        self._reader = None        # tails the journal for poll()
+        self._reader_ino = None
+        self._read_offset = 0
+        self._torn = False         # the journal ends in a partial line
+        self._own = {}             # seq -> incident appended here, so tailing need not re-parse it
+        self._pending = []         # (seq, incident) read from the journal, not yet polled
+        self._polled_seq = 0
+        self.epoch = None
+        self._last_seq = 0
+        self._durable_seq = 0
+        self._syncing = False
+        self._records_since_rotate = 0
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+
+    def recover(self) -> list:
+        """
+        Rebuilds the full incident list (newest first) from snapshot + journal(s)
+        and opens the journal for appending. Raises FileNotFoundError when there
+        is neither a snapshot nor a journal, like the old file-based path did.
+        """
+        if not any(os.path.exists(p) for p in (self.snapshot_path, self.journal_path, self.compacting_path)):
+            raise FileNotFoundError(self.snapshot_path)
+
+        with self._lock, self._file_lock:
+            snapshot = _read_snapshot(self.snapshot_path)
+            pending = _read_journal(self.compacting_path) + _read_journal(self.journal_path)
+            incidents = _merge(snapshot, pending)
+
+            self._open_writer()
+            self._open_reader()
+            self._read_offset = os.path.getsize(self.journal_path)
+            self._pending = []
+            self._own = {}
+            seqs = [seq for seq, _ in pending] + [last_seq(item) for item in snapshot]
+            self._last_seq = self._durable_seq = self._polled_seq = max(seqs, default=0)
+            self.epoch = self._read_epoch()
+            self._records_since_rotate = len(pending)
+
+        if os.path.exists(self.compacting_path):
+            # A compaction was interrupted; finish it now that we know the full state.
+            self._start_compaction(rotate=False)
+        return incidents
+
+    def append(self, incident: dict) -> int:
+        """Durably appends one incident (or merged_report_record) and returns its journal sequence number."""
+        with self._lock:
+            with self._file_lock:
+                if self._reader is None and self._file is None:
+                    # Nothing was there to recover(): the journal starts here, so poll() reads it from the top.
+                    self._open_writer()
+                    self._open_reader()
+                journal_ino = self._tail()   # catch up first, so our sequence number follows every other process's
+                if self._torn:
+                    # Nobody else can be writing now, so these bytes are a line a crashed writer left half done.
+                    os.truncate(self.journal_path, self._read_offset)
+                    self._torn = False
+                if self._file is None or self._file_ino != journal_ino:
+                    # Another process rotated the journal; everything it holds is already flushed.
+                    self._open_writer()
+                self._last_seq += 1
+                seq = self._last_seq
+                incident["journal_seq"] = seq
+                line = json.dumps({"seq": seq, "incident": incident}, separators=(",", ":"))
+                self._file.write(line.encode("utf-8") + b"\n")
+                self._file.flush()
+                self._own[seq] = incident
+                self._records_since_rotate += 1
+            self._wait_durable(seq)
+            needs_compaction = self._records_since_rotate >= self.compact_every
+        if needs_compaction:
+            self._start_compaction(rotate=True)
+        return seq
+
+    def poll(self) -> list:
+        """(seq, incident) pairs appended since recover() or the last poll, by any process, oldest first."""
+        with self._lock:
+            self._tail()
+            pending, self._pending = self._pending, []
+        return pending
+
+    def stats(self) -> dict:
+        """Queue depths: records written but not yet fsynced, read but not yet polled, and since the last rotation."""
+        with self._lock:
+            return {"unsynced": self._last_seq - self._durable_seq, "unpolled": len(self._pending),
+                    "since_rotate": self._records_since_rotate}
+
+    def compact(self):
+        """Rotates the journal and folds it into the snapshot, blocking until done."""
+        self._start_compaction(rotate=True)
+        self.wait_for_compaction()
+
+    def wait_for_compaction(self):
+        # A finishing compaction may chain a catch-up run, so keep joining until idle.
+        thread = self._compact_thread
+        while thread is not None and thread.is_alive():
+            thread.join()
+            thread = self._compact_thread
+
+    def close(self):
+        self.wait_for_compaction()
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            self._own = {}
+
+    # --- internal helpers ---
+    def _read_epoch(self) -> str:
+        """Caller holds the file lock. Every process recovering the same data gets the same epoch."""
+        path = self.snapshot_path + EPOCH_SUFFIX
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                epoch = f.read().strip()
+            if epoch:
+                return epoch
+        except FileNotFoundError:
+            pass
+        epoch = uuid.uuid4().hex[:8]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(epoch)
+        return epoch
+
+    def _open_writer(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, 'ab')
+        self._file_ino = os.fstat(self._file.fileno()).st_ino
+
+    def _open_reader(self):
+        if self._reader is not None:
+            self._reader.close()
+        self._reader, self._read_offset = open(self.journal_path, 'rb'), 0
+        self._reader_ino = os.fstat(self._reader.fileno()).st_ino
+
+    def _tail(self):
+        """
+        Queues complete records appended to the journal since we last read it and returns
+        the journal's current inode. Caller holds self._lock.
+        """
+        if self._reader is None:
+            return None
+        self._read_new_lines()
+        journal_ino = _inode(self.journal_path)
+        if journal_ino is not None and journal_ino != self._reader_ino:
+            # Rotated: drain what was written before the rename, then follow the new file.
+            self._read_new_lines()
+            self._open_reader()
+            self._read_new_lines()
+        return journal_ino
+
+    def _read_new_lines(self):
+        self._reader.seek(self._read_offset)
+        data = self._reader.read()
+        end = data.rfind(b"\n") + 1    # a line still being written is picked up next time
+        self._torn = end < len(data)
+        for raw in data[:end].splitlines():
+            seq = _line_seq(raw)
+            if seq is not None and seq <= self._polled_seq and seq <= self._last_seq:
+                continue   # already handed out (a rotated file being re-read)
+            incident = self._own.pop(seq, None)
+            if incident is None:
+                try:
+                    entry = json.loads(raw)
+                    seq, incident = entry["seq"], entry["incident"]
+                except (ValueError, KeyError, TypeError):
+                    log.warning("Skipping corrupt journal record while tailing", extra={"path": self.journal_path})
+                    continue
+            if seq > self._last_seq:   # another process's record
+                self._last_seq = seq
+                self._records_since_rotate += 1
+            if seq > self._polled_seq:
+                self._polled_seq = seq
+                self._pending.append((seq, incident))
+        self._read_offset += end
+
+    def _wait_durable(self, seq: int):
+        """Group commit. Caller holds self._lock; one writer fsyncs on behalf of everyone queued."""
+        while self._durable_seq < seq:
+            if self._syncing:
+                self._synced.wait()
+                continue
+            self._syncing = True
+            target = self._last_seq
+            batch = target - self._durable_seq
+            f = self._file
+            f.flush()
+            self._lock.release()
+            try:
+                if self.fsync:
+                    with FSYNC_SECONDS.time():
+                        os.fsync(f.fileno())
+                GROUP_COMMIT_RECORDS.observe(batch)
+            finally:
+                self._lock.acquire()
+                self._syncing = False
+            self._durable_seq = max(self._durable_seq, target)
+            self._synced.notify_all()
+
+    def _start_compaction(self, rotate: bool):
+        if not self._compact_lock.acquire(blocking=False):
+            return  # single flight: one compaction at a time
+        try:
+            if rotate:
+                with self._lock:
+                    # Let an in-flight group commit finish before taking the file lock; it needs self._lock back.
+                    while self._syncing:
+                        self._synced.wait()
+                    with self._file_lock:
+                        if os.path.exists(self.compacting_path):
+                            # Previous rotation not folded in yet; let it finish first.
+                            rotate = False
+                        else:
+                            if self._file is not None:
+                                self._file.flush()
+                                if self.fsync:
+                                    os.fsync(self._file.fileno())
+                            self._durable_seq = self._last_seq
+                            self._synced.notify_all()
+                            self._tail()
+                            os.replace(self.journal_path, self.compacting_path)
+                            _fsync_dir(self.journal_path)
+                            self._open_writer()
+                            self._records_since_rotate = 0
+        except Exception:
+            self._compact_lock.release()
+            raise
+        self._compact_thread = threading.Thread(target=self._compact_rotated, daemon=True)
+        self._compact_thread.start()
+
+    def _compact_rotated(self):
+        if not self._compact_file_lock.acquire(blocking=False):
+            self._compact_lock.release()
+            return   # another process is folding the same file in
+        try:
+            if not os.path.exists(self.compacting_path):
+                return
+            started = time.perf_counter()
+            merged = _merge(_read_snapshot(self.snapshot_path), _read_journal(self.compacting_path))
+            tmp_path = _write_temp_snapshot(self.snapshot_path, merged)
+            with self._file_lock:
+                # Swap under the journal lock so a recovering process never sees the new
+                # snapshot without the rotated records, or the old one without them.
+                os.replace(tmp_path, self.snapshot_path)
+                os.remove(self.compacting_path)
+            _fsync_dir(self.compacting_path)
+            COMPACTION_SECONDS.observe(time.perf_counter() - started)
+            log.info("Compacted journal", extra={"path": self.snapshot_path, "incidents": len(merged)})
+        except Exception as e:
+            log.error("Journal compaction failed", extra={"path": self.snapshot_path, "error": str(e)})
+            return
+        finally:
+            self._compact_file_lock.release()
+            self._compact_lock.release()
+        if self._records_since_rotate >= self.compact_every:
+            # Writers kept going while we compacted; catch up straight away.
+            self._start_compaction(rotate=True)
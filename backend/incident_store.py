@@ -0,0 +1,436 @@
+import base64
+import bisect
+import json
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from incident_table import MISSING_INT, IncidentTable, json_document
+from incident_journal import MERGED_REPORT, IncidentJournal, apply_merged_report, last_seq, merged_report_record
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+MIN_AUTHENTICITY_SCORE = 4
+CHANGE_LOG_LIMIT = 10000   # changes kept for ?since= deltas before clients must resync
+FOLLOW_INTERVAL_SECONDS = 0.5
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 50000
+
+log = logging.getLogger(__name__)
+FEED_CACHE = get_registry().counter(
+    "incident_feed_cache_total", "Full-feed bodies served from the cache (hit) or re-encoded (rebuild), per format.",
+    ("format", "result"))
+FEED_ENCODE_SECONDS = get_registry().histogram(
+    "incident_feed_encode_seconds", "Time to re-encode the full feed.", ("format",))
+
+
+def is_visible(incident: dict) -> bool:
+    """Same filter /get_sos_data has always applied: geocoded and credible enough to show."""
+    return bool(incident.get("coordinates")) and (incident.get("authenticity_score") or 0) >= MIN_AUTHENTICITY_SCORE
+
+
+def _sort_key(incident: dict, seq: int) -> tuple:
+    return -(incident.get("severity_score") or 0), seq
+
+
+def _id_mask(column: np.ndarray, ids, keep_unknown: bool) -> np.ndarray:
+    """
+    Rows of an id column holding one of `ids`. Ids the column cannot hold (strings, huge ints) are stored
+    as MISSING_INT; with keep_unknown those rows are kept too, for the caller to check once decoded.
+    """
+    ids = list(ids)
+    mask = np.isin(column, [i for i in ids if type(i) is int and MISSING_INT < i < -MISSING_INT])
+    if keep_unknown and any(type(i) is not int or not MISSING_INT < i < -MISSING_INT for i in ids):
+        mask |= column == MISSING_INT
+    return mask
+
+
+def incident_category(incident: dict) -> str:
+    """Generated incidents carry a category; analysed and reported ones only need_type (a string or list)."""
+    if incident.get("category"):
+        return incident["category"]
+    need = incident.get("need_type")
+    if isinstance(need, list):
+        need = need[0] if need else None
+    return need or "Unknown"
+
+
+def incident_summary(incident: dict) -> dict:
+    """The few fields a map marker needs, for ?view=summary."""
+    return {
+        "id": incident.get("id"),
+        "lat": incident["coordinates"]["lat"],
+        "lng": incident["coordinates"]["lng"],
+        "severity_score": incident.get("severity_score"),
+        "category": incident_category(incident),
+        "urgency": incident.get("urgency") or incident.get("priority"),
+        "timestamp": incident.get("timestamp"),
+        "city": incident.get("city"),   # ids are only unique within a city
+    }
+
+
+def encode_cursor(key: tuple) -> str:
+    return base64.urlsafe_b64encode(f"{key[0]}:{key[1]}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Raises ValueError for anything encode_cursor did not produce."""
+    try:
+        severity, seq = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        return float(severity), int(seq)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor '{cursor}'.") from e
+
+
+class IncidentStore:
+    """
+    Process-wide incident store.
+
+    The data file (snapshot + journal) is recovered once, then every visible
+    incident is kept ordered by severity (highest first). New reports are
+    appended to the journal and slotted into place with a binary search, so
+    serving the dashboard never re-reads or re-sorts anything. Incidents with
+    equal severity keep file order, and fresh reports go in front of older ones,
+    which matches the old "insert at the top of the file" behaviour.
+
+    Every change is kept in a bounded change log, so the feed can answer "what
+    changed since revision N" and wake streaming clients. The revision is the
+    journal sequence number of the newest incident folded in, and `epoch` names
+    the data generation (a new one after reset()), so the two mean the same in
+    every process serving the file and survive restarts.
+
+    Incidents are held in an IncidentTable (typed columns, interned strings
+    and each incident pre-encoded as JSON) rather than as dicts, and indexed
+    by geohash, so query() can filter by viewport, time, category and score
+    and page through the result with a cursor (the sort key of the last
+    incident returned), and tiles() can count incidents per map cell. Methods
+    that hand out incidents as dicts decode them on every call.
+
+    When several worker processes serve the same data file, each keeps its own
+    index. Incidents are folded in from the journal in sequence order, whoever
+    wrote them: add() appends and then refresh()es, and refresh() also picks up
+    what the other processes journaled.
+    """
+
+    def __init__(self, path: str, journal: IncidentJournal = None):
+        self.path = path
+        self.journal = journal or IncidentJournal(path)
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.revision = 0
+        self._base_revision = 0    # the change log covers everything after this revision
+        self._changes = []     # (revision, op, table row), oldest first
+        self._refresh_lock = threading.Lock()
+        self._keys = []        # (-severity, sequence) in sorted order, parallel to the table's order
+        self._table = IncidentTable()
+        self._hidden_count = 0
+        self._next_old_seq = 0     # file order counts up, new reports use -journal_seq
+        self._snapshot_json = None
+        self._snapshot_columns = None
+
+    def load(self, missing_ok: bool = False) -> int:
+        """
+        (Re)builds the index from snapshot + journal. Raises FileNotFoundError /
+        JSONDecodeError like json.load does, unless missing_ok starts an empty store.
+        """
+        with self._refresh_lock:
+            try:
+                all_data = self.journal.recover()
+            except FileNotFoundError:
+                if not missing_ok:
+                    raise
+                all_data = []
+            with self._lock:
+                self._reset()
+                visible = []
+                for incident in all_data:
+                    # Journaled reports keep their journal key even once compacted into the snapshot,
+                    # so sort keys (and cursors) are the same in every process and across restarts.
+                    if incident.get("journal_seq"):
+                        seq = -incident["journal_seq"]
+                    else:
+                        seq = self._next_old_seq
+                        self._next_old_seq += 1
+                    if is_visible(incident):
+                        visible.append((_sort_key(incident, seq), incident))
+                    else:
+                        self._hidden_count += 1
+                visible.sort(key=lambda entry: entry[0])   # one sort instead of n list inserts
+                self._keys = [key for key, _ in visible]
+                incidents = [incident for _, incident in visible]
+                self._table.extend(incidents, [incident_category(i) for i in incidents], self._keys)
+                self.revision = self._base_revision = max((last_seq(incident) for incident in all_data), default=0)
+                self.loaded = True
+                self._changed.notify_all()
+        return len(all_data)
+
+    def add(self, incident: dict) -> None:
+        """Journals a freshly reported incident, then indexes it in O(log n) comparisons."""
+        self.journal.append(incident)
+        self.refresh()
+
+    def merge_reports(self, journal_seq: int, report_count: int, duplicate_ids: list, last_reported=None) -> None:
+        """
+        Journals that the incident added as `journal_seq` has been reported `report_count`
+        times in all (duplicate_ids being the repeats since the last merge), then re-indexes it.
+        """
+        self.journal.append(merged_report_record(journal_seq, report_count, duplicate_ids, last_reported))
+        self.refresh()
+
+    def refresh(self) -> int:
+        """Indexes what was journaled since the last refresh, by this or any other process; returns how many."""
+        if not self.loaded:
+            return 0
+        with self._refresh_lock:   # one poller at a time, so revisions only move forward
+            records = self.journal.poll()
+            if records:
+                with self._lock:
+                    for seq, incident in records:
+                        if MERGED_REPORT in incident:
+                            op, row = "updated", self._apply_merged_report(incident[MERGED_REPORT], seq)
+                        else:
+                            op, row = "added", self._insert(incident, -seq)
+                        if row is not None:
+                            self._record_change(op, row, seq)
+                        else:
+                            self.revision = seq
+                    self._changed.notify_all()
+        return len(records)
+
+    def start_following(self, interval_seconds: float = FOLLOW_INTERVAL_SECONDS):
+        """Refreshes in the background, so streaming clients hear about other processes' reports."""
+        def follow():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    log.error("Incident journal follow failed", extra={"error": str(e)})
+
+        threading.Thread(target=follow, name="incident-follow", daemon=True).start()
+
+    def snapshot(self) -> list:
+        """Visible incidents as dicts, highest severity first (decoded afresh on every call)."""
+        return self.incidents()
+
+    def incidents(self, ids=None, min_severity: float = None, exclude_ids=None) -> list:
+        """
+        Visible incidents as dicts in feed order, optionally only the given ids / at least min_severity /
+        none of exclude_ids. Rows are filtered on the table's columns first; only the survivors are decoded.
+        """
+        with self._lock:
+            table = self._table
+            rows = table.order_array
+            if min_severity is not None:
+                rows = rows[table.column("severity")[rows] >= min_severity]
+            if ids is not None:
+                rows = rows[_id_mask(table.column("id")[rows], ids, keep_unknown=True)]
+            if exclude_ids:
+                rows = rows[~_id_mask(table.column("id")[rows], exclude_ids, keep_unknown=False)]
+            encoded = [table.encoded[row] for row in rows.tolist()]
+        incidents = [json.loads(text) for text in encoded]
+        if ids is not None:
+            wanted = set(ids)
+            incidents = [incident for incident in incidents if incident.get("id") in wanted]
+        if exclude_ids:
+            unwanted = set(exclude_ids)
+            incidents = [incident for incident in incidents if incident.get("id") not in unwanted]
+        return incidents
+
+    def snapshot_json(self) -> str:
+        """The snapshot already encoded as JSON, cached until the next change."""
+        with self._lock:
+            return self._encoded()
+
+    def versioned_snapshot_json(self) -> tuple:
+        """(etag, body) taken together, so the tag always describes the body it ships with."""
+        with self._lock:
+            return self._etag(), self._encoded()
+
+    def versioned_snapshot_columns(self) -> tuple:
+        """(etag, body) of the snapshot in the binary columnar layout (see incident_table), cached likewise."""
+        with self._lock:
+            if self._snapshot_columns is None:
+                with FEED_ENCODE_SECONDS.time("columns"):
+                    self._snapshot_columns = self._table.to_columns(self._table.order_array)
+                FEED_CACHE.inc("columns", "rebuild")
+            else:
+                FEED_CACHE.inc("columns", "hit")
+            return self._etag(), self._snapshot_columns
+
+    def changes_since(self, since: int, epoch: str = None) -> dict:
+        """
+        Delta between `since` and now. When the revision is from another epoch or
+        has aged out of the change log, `reset` is set and `added` holds the full
+        snapshot so the client can start over. Added and updated incidents come
+        as JSON text, ready to send (see changes_since_json). `removed_cities`
+        holds the city of each removed id, in the same order (ids repeat across cities).
+        """
+        with self._lock:
+            table = self._table
+            delta = {"etag": self._etag(), "epoch": self.epoch, "revision": self.revision, "reset": False,
+                     "added": [], "updated": [], "removed": [], "removed_cities": []}
+            stale = (epoch is not None and epoch != self.epoch) or since > self.revision or since < self._base_revision
+            if stale:
+                delta["reset"] = True
+                delta["added"] = [table.encoded[row] for row in table.order]
+                return delta
+            start = bisect.bisect_left(self._changes, (since + 1,))
+            for _, op, row in self._changes[start:]:
+                if op == "removed":
+                    incident = table.record(row)
+                    delta["removed"].append(incident.get("id"))
+                    delta["removed_cities"].append(incident.get("city"))
+                else:
+                    delta[op].append(table.encoded[row])
+            return delta
+
+    def changes_since_json(self, since: int, epoch: str = None) -> tuple:
+        """(etag, body, number of added incidents) of changes_since() as one JSON object."""
+        delta = self.changes_since(since, epoch)
+        etag, added, updated = delta.pop("etag"), delta.pop("added"), delta.pop("updated")
+        return etag, json_document(delta, added=added, updated=updated), len(added)
+
+    def query(self, bbox: tuple = None, after: float = None, before: float = None, categories: list = None,
+              min_severity: float = None, min_authenticity: float = None, cursor: str = None,
+              limit: int = DEFAULT_PAGE_SIZE, view: str = "full", cursors: bool = False) -> dict:
+        """
+        One page of the visible incidents passing every filter, in feed order.
+        bbox is (south, west, north, east); after/before are epoch seconds.
+        `next_cursor` fetches the following page and is None on the last one.
+        view="full" returns the incidents as JSON text (see json_document),
+        "summary" as incident_summary() dicts and "columns" as one binary
+        body (incident_table's columnar layout, page fields in its header).
+        cursors=True adds `cursors`, each incident's own position as a cursor, so a
+        caller merging pages from several stores (router.py) can resume after any of them.
+        """
+        filters = {"bbox": bbox, "after": after, "before": before, "categories": categories,
+                   "min_severity": min_severity, "min_authenticity": min_authenticity}
+        after_key = decode_cursor(cursor) if cursor else None
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        with self._lock:
+            table = self._table
+            rows = table.candidates(bbox)
+            if rows is not None:
+                # Small viewport: filter and sort just the rows in the covered cells.
+                rows = rows[table.matches(rows, **filters)]
+                total = len(rows)
+                neg_severity, seq = -table.column("severity")[rows], table.column("seq")[rows]
+                if after_key is not None:
+                    later = (neg_severity > after_key[0]) | ((neg_severity == after_key[0]) & (seq > after_key[1]))
+                    rows, neg_severity, seq = rows[later], neg_severity[later], seq[later]
+                page = rows[np.lexsort((seq, neg_severity))[:limit + 1]]
+            else:
+                # Wide viewport: one vectorized pass over every row, walked in feed order.
+                mask = table.matches(None, **filters)
+                total = int(mask.sum())
+                ordered = table.order_array[bisect.bisect_right(self._keys, after_key) if after_key else 0:]
+                page = ordered[mask[ordered]][:limit + 1]
+            rows = page[:limit].tolist()
+            next_cursor = None
+            if len(page) > limit:
+                last = rows[-1]
+                next_cursor = encode_cursor((-float(table.column("severity")[last]), int(table.column("seq")[last])))
+            result = {"etag": self._etag(), "epoch": self.epoch, "revision": self.revision, "total": total,
+                      "next_cursor": next_cursor}
+            if cursors:
+                result["cursors"] = [encode_cursor((-severity, seq)) for severity, seq in
+                                     zip(table.column("severity")[rows].tolist(), table.column("seq")[rows].tolist())]
+            if view == "columns":
+                result["body"] = table.to_columns(rows, **{k: v for k, v in result.items() if k != "etag"})
+                return result
+            encoded = [table.encoded[row] for row in rows]
+        if view == "summary":
+            result["incidents"] = [incident_summary(json.loads(text)) for text in encoded]
+        else:
+            result["incidents"] = encoded
+        return result
+
+    def tiles(self, precision: int, bbox: tuple = None, **filters) -> dict:
+        """Incident counts per geohash cell of the given precision (see IncidentTable.tiles)."""
+        with self._lock:
+            table = self._table
+            rows = table.candidates(bbox)
+            if rows is None:
+                rows = np.flatnonzero(table.matches(None, bbox=bbox, **filters))
+            else:
+                rows = rows[table.matches(rows, bbox=bbox, **filters)]
+            return {"etag": self._etag(), "epoch": self.epoch, "revision": self.revision, "precision": precision,
+                    "total": len(rows), "cells": table.tiles(rows, precision)}
+
+    def wait_for_change(self, revision: int, timeout: float) -> int:
+        """Blocks until the store moves past `revision` (or timeout); returns the current revision."""
+        with self._lock:
+            self._changed.wait_for(lambda: self.revision > revision, timeout=timeout)
+            return self.revision
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"visible": self._table.size, "hidden": self._hidden_count, "revision": self.revision,
+                    "change_log": len(self._changes)}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._table.size + self._hidden_count
+
+    # --- internal helpers (caller holds the lock) ---
+    def _etag(self) -> str:
+        return f"{self.epoch}-{self.revision}"
+
+    def _encoded(self) -> str:
+        if self._snapshot_json is None:
+            with FEED_ENCODE_SECONDS.time("json"):
+                self._snapshot_json = self._table.json_array(self._table.order)
+            FEED_CACHE.inc("json", "rebuild")
+        else:
+            FEED_CACHE.inc("json", "hit")
+        return self._snapshot_json
+
+    def _reset(self):
+        self._keys = []
+        self._hidden_count = 0
+        self._next_old_seq = 0
+        self._changes = []
+        self._table = IncidentTable()
+        self.epoch = self.journal.epoch or uuid.uuid4().hex[:8]   # no data file yet: a private epoch
+        self._invalidate()
+
+    def _insert(self, incident: dict, seq: int):
+        """The new table row, or None for an incident that is not shown."""
+        if not is_visible(incident):
+            self._hidden_count += 1
+            return None
+        key = _sort_key(incident, seq)
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        row = self._table.add(incident, incident_category(incident), key, index)
+        self._invalidate()
+        return row
+
+    def _apply_merged_report(self, report: dict, seq: int):
+        """The updated table row, or None when the incident is not shown."""
+        rows = np.flatnonzero(self._table.column("seq") == -report["journal_seq"])
+        if not len(rows):
+            return None
+        row = int(rows[0])
+        incident = self._table.record(row)
+        apply_merged_report(incident, report, seq)
+        self._table.replace(row, incident, incident_category(incident))
+        self._invalidate()
+        return row
+
+    def _record_change(self, op: str, row: int, revision: int):
+        self.revision = revision
+        self._changes.append((revision, op, row))
+        if len(self._changes) > 2 * CHANGE_LOG_LIMIT:
+            self._base_revision = self._changes[-CHANGE_LOG_LIMIT - 1][0]
+            del self._changes[:-CHANGE_LOG_LIMIT]
+
+    def _invalidate(self):
+        self._snapshot_json = None
+        self._snapshot_columns = None
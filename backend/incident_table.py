@@ -0,0 +1,265 @@
+"""
+Compact in-memory table of the visible incidents: what IncidentStore keeps
+instead of one dict per incident.
+
+Typed fields live in one NumPy structured array (RECORD_DTYPE, 80 bytes a
+row): id, coordinates, scores, the timestamp as epoch milliseconds, the store
+sort key and a 40-bit geohash (precision 8, ~38 m; any coarser geohash is a
+prefix of it, i.e. a right shift, so tiles at every zoom level come from the
+same field). Repeated strings (category, urgency, need type, location) are
+interned once in a StringTable and rows hold their integer code. The full
+incident is kept once, already encoded as JSON text: every full response is
+made of those, so the feed is a join of ready fragments instead of a
+json.dumps of every dict, and dicts are only decoded for the few callers that
+need them (record()).
+
+Rows are bucketed by their precision-6 cell (~1.2 x 0.6 km), so a zoomed-in
+viewport only filters the rows in the cells it covers. `order` lists rows in
+the store's sort order (severity, then arrival), kept in step with the
+store's keys.
+
+to_columns() writes rows in a binary columnar layout for clients that ask for
+it (Accept: application/x-incident-columns), little-endian throughout:
+
+    b"INCC" | u32 header length | header (UTF-8 JSON, space-padded) | column buffers
+
+The header holds {"version", "rows", "columns": [{"name", "type", "offset",
+"length"}, ...], "dictionaries": {field: [null, "Fire", ...]}} plus the
+response metadata (epoch, revision, ...). Offsets count from the first
+buffer and every buffer starts on an 8-byte boundary, so a browser can wrap
+each one in a typed array without copying. Dictionary-coded columns hold an
+index into their dictionary (0 = missing); id and timestamp hold
+MISSING_INT when the incident has no integer id / parseable timestamp.
+"""
+import json
+import math
+import struct
+
+import numpy as np
+
+from geo_index import (CODE_PRECISION, FULL_SCAN_FRACTION, INDEX_PRECISION, code_to_geohash, covering_cells,
+                       geohash_code, geohash_codes, parse_time)
+
+# --- CONFIGURATION ---
+RECORD_DTYPE = np.dtype([
+    ("id", "<i8"), ("lat", "<f8"), ("lng", "<f8"), ("severity", "<f8"), ("authenticity", "<f8"),
+    ("timestamp", "<i8"), ("seq", "<i8"), ("code", "<i8"),
+    ("category", "<u4"), ("urgency", "<u4"), ("need", "<u4"), ("location", "<u4"),
+])
+STRING_FIELDS = ("category", "urgency", "need", "location")
+COLUMNS_MIME = "application/x-incident-columns"
+COLUMNS_MAGIC = b"INCC"
+COLUMNS_VERSION = 1
+# Fields sent by to_columns() and their wire types (scores fit float32; everything else as stored).
+WIRE_COLUMNS = (("id", "<i8"), ("lat", "<f8"), ("lng", "<f8"), ("severity", "<f4"), ("authenticity", "<f4"),
+                ("timestamp", "<i8"), ("category", "<u4"), ("urgency", "<u4"), ("need", "<u4"),
+                ("location", "<u4"))
+MISSING_INT = int(np.iinfo(np.int64).min)
+_INDEX_SHIFT = 5 * (CODE_PRECISION - INDEX_PRECISION)
+
+
+class StringTable:
+    """Interned strings: each distinct value is stored once and rows hold its code (0 = missing)."""
+
+    def __init__(self):
+        self.values = [None]
+        self._codes = {}
+
+    def code(self, value) -> int:
+        if type(value) is not str:
+            if value is None:
+                return 0
+            value = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+        code = self._codes.get(value)
+        if code is None:
+            if not value:
+                return 0
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def json_document(fields: dict, **encoded_arrays) -> str:
+    """json.dumps(fields) plus, per keyword, an array spliced together from already-encoded JSON values."""
+    parts = [json.dumps(fields)[:-1]]
+    for name, values in encoded_arrays.items():
+        separator = ", " if len(parts) > 1 or fields else ""
+        parts.append(f"{separator}{json.dumps(name)}: [{', '.join(values)}]")
+    return "".join(parts) + "}"
+
+
+def read_columns(data: bytes) -> tuple:
+    """Parses a to_columns() buffer into (header, {name: array}); raises ValueError on anything else."""
+    if data[:len(COLUMNS_MAGIC)] != COLUMNS_MAGIC:
+        raise ValueError("Not an incident column buffer.")
+    (length,) = struct.unpack_from("<I", data, len(COLUMNS_MAGIC))
+    base = len(COLUMNS_MAGIC) + 4 + length
+    header = json.loads(data[len(COLUMNS_MAGIC) + 4:base])
+    columns = {column["name"]: np.frombuffer(data, dtype=np.dtype(column["type"]).newbyteorder("<"),
+                                             count=header["rows"], offset=base + column["offset"])
+               for column in header["columns"]}
+    return header, columns
+
+
+class IncidentTable:
+    """Not thread-safe: IncidentStore guards it."""
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.encoded = []           # row -> the incident as JSON text
+        self.strings = {name: StringTable() for name in STRING_FIELDS}
+        self.cells = {}             # precision-6 prefix code -> list of rows
+        self.order = []             # rows in store order
+        self._order_array = None    # ... as an array, rebuilt on the first query after a change
+
+    @property
+    def order_array(self):
+        if self._order_array is None:
+            self._order_array = np.array(self.order, dtype=np.int64)
+        return self._order_array
+
+    def add(self, incident: dict, category: str, key: tuple, position: int) -> int:
+        """Appends one incident; `key` is its store sort key and `position` where the store put it. Returns the row."""
+        self._reserve(1)
+        row = self.size
+        values = self._values(incident, category, key)
+        code = geohash_code(values[1], values[2])
+        self.records[row] = values[:7] + (code,) + values[8:]
+        self.cells.setdefault(code >> _INDEX_SHIFT, []).append(row)
+        self.encoded.append(json.dumps(incident))
+        self.order.insert(position, row)
+        self._order_array = None
+        self.size += 1
+        return row
+
+    def extend(self, incidents: list, categories: list, keys: list):
+        """Appends many incidents at once, after the rows already in `order` (as when loading, in store order)."""
+        count = len(incidents)
+        self._reserve(count)
+        rows = slice(self.size, self.size + count)
+        block = np.array([self._values(incident, category, key)
+                          for incident, category, key in zip(incidents, categories, keys)], dtype=RECORD_DTYPE)
+        block["code"] = geohash_codes(block["lat"], block["lng"])
+        self.records[rows] = block
+        for row, cell in enumerate((block["code"] >> _INDEX_SHIFT).tolist(), self.size):
+            self.cells.setdefault(cell, []).append(row)
+        self.encoded.extend(json.dumps(incident) for incident in incidents)
+        self.order.extend(range(self.size, self.size + count))
+        self._order_array = None
+        self.size += count
+
+    def replace(self, row: int, incident: dict, category: str):
+        """Swaps in a new version of a row's incident; its sort key, position and map cell stay as they were."""
+        old = self.records[row]
+        values = self._values(incident, category, (None, int(old["seq"])))
+        self.records[row] = values[:7] + (int(old["code"]),) + values[8:]
+        self.encoded[row] = json.dumps(incident)
+
+    def column(self, name: str):
+        return self.records[name][:self.size]
+
+    def record(self, row: int) -> dict:
+        """The incident as it was added (a fresh dict)."""
+        return json.loads(self.encoded[row])
+
+    def json_array(self, rows) -> str:
+        """The given rows as a JSON array, byte for byte what json.dumps of their dicts gives."""
+        encoded = self.encoded
+        return "[" + ", ".join([encoded[row] for row in rows]) + "]"
+
+    def to_columns(self, rows, **meta) -> bytes:
+        """The given rows in the binary columnar layout described in the module docstring."""
+        picked = self.records[np.asarray(rows, dtype=np.int64)]
+        columns, buffers, offset = [], [], 0
+        for name, wire_type in WIRE_COLUMNS:
+            data = picked[name].astype(wire_type).tobytes()
+            columns.append({"name": name, "type": np.dtype(wire_type).name, "offset": offset, "length": len(data)})
+            buffers.append(data + bytes(-len(data) % 8))
+            offset += len(buffers[-1])
+        header = json.dumps({"version": COLUMNS_VERSION, "rows": len(picked), "columns": columns,
+                             "dictionaries": {name: table.values for name, table in self.strings.items()},
+                             **meta}).encode()
+        header += b" " * (-(len(COLUMNS_MAGIC) + 4 + len(header)) % 8)
+        return b"".join([COLUMNS_MAGIC, struct.pack("<I", len(header)), header, *buffers])
+
+    def candidates(self, bbox: tuple = None):
+        """Rows that may match: the index cells under a bbox, or None meaning scan every row."""
+        if bbox is None:
+            return None
+        cells = covering_cells(bbox, INDEX_PRECISION)
+        if cells is None:
+            return None
+        buckets = [self.cells[code] for code in cells.tolist() if code in self.cells]
+        if sum(len(bucket) for bucket in buckets) * FULL_SCAN_FRACTION > self.size:
+            return None     # most rows are in view: one vectorized pass beats gathering them
+        if not buckets:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.asarray(bucket, dtype=np.int64) for bucket in buckets])
+
+    def matches(self, rows, bbox: tuple = None, after: float = None, before: float = None,
+                categories: list = None, min_severity: float = None, min_authenticity: float = None):
+        """Boolean mask over `rows` (None = all rows) of the incidents passing every filter; after/before in epoch seconds."""
+        def col(name):
+            values = self.column(name)
+            return values if rows is None else values[rows]
+
+        mask = np.ones(self.size if rows is None else len(rows), dtype=bool)
+        if bbox is not None:
+            south, west, north, east = bbox
+            lat, lng = col("lat"), col("lng")
+            mask &= (lat >= south) & (lat <= north) & (lng >= west) & (lng <= east)
+        if after is not None or before is not None:
+            timestamp = col("timestamp")
+            mask &= timestamp != MISSING_INT
+            if after is not None:
+                mask &= timestamp >= after * 1000
+            if before is not None:
+                mask &= timestamp <= before * 1000
+        if categories:
+            wanted = {name.lower() for name in categories}
+            codes = [code for code, name in enumerate(self.strings["category"].values)
+                     if name is not None and name.lower() in wanted]
+            mask &= np.isin(col("category"), codes)
+        if min_severity is not None:
+            mask &= col("severity") >= min_severity
+        if min_authenticity is not None:
+            mask &= col("authenticity") >= min_authenticity
+        return mask
+
+    def tiles(self, rows, precision: int) -> list:
+        """Per precision-p cell: count, mean position and highest severity of the given rows."""
+        if len(rows) == 0:
+            return []
+        prefixes = self.column("code")[rows] >> (5 * (CODE_PRECISION - precision))
+        cells, inverse, counts = np.unique(prefixes, return_inverse=True, return_counts=True)
+        lat = np.bincount(inverse, weights=self.column("lat")[rows]) / counts
+        lng = np.bincount(inverse, weights=self.column("lng")[rows]) / counts
+        max_severity = np.zeros(len(cells))
+        np.maximum.at(max_severity, inverse, self.column("severity")[rows])
+        return [{"geohash": code_to_geohash(code, precision), "count": int(count), "lat": round(float(y), 6),
+                 "lng": round(float(x), 6), "max_severity": int(severity) if severity.is_integer() else float(severity)}
+                for code, count, y, x, severity in zip(cells.tolist(), counts, lat, lng, max_severity)]
+
+    # --- internal helpers ---
+    def _values(self, incident: dict, category: str, key: tuple) -> tuple:
+        """One RECORD_DTYPE row as a tuple (geohash left at 0)."""
+        coords = incident["coordinates"]
+        incident_id = incident.get("id")
+        if type(incident_id) is not int or not MISSING_INT < incident_id < -MISSING_INT:
+            incident_id = MISSING_INT
+        reported_at = parse_time(incident.get("timestamp"))
+        strings = self.strings
+        return (incident_id, float(coords["lat"]), float(coords["lng"]),
+                float(incident.get("severity_score") or 0), float(incident.get("authenticity_score") or 0),
+                MISSING_INT if math.isnan(reported_at) else round(reported_at * 1000), key[1], 0,
+                strings["category"].code(category),
+                strings["urgency"].code(incident.get("urgency") or incident.get("priority")),
+                strings["need"].code(incident.get("need_type")),
+                strings["location"].code(incident.get("location") or incident.get("location_text")))
+
+    def _reserve(self, count: int):
+        if self.size + count > len(self.records):
+            grown = np.zeros(max(2 * len(self.records), self.size + count), dtype=RECORD_DTYPE)
+            grown[:self.size] = self.records[:self.size]
+            self.records = grown
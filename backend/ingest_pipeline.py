@@ -0,0 +1,345 @@
+"""
+Streaming SOS ingestion pipeline.
+
+    source (lazy CSV / JSONL) -> [dedup] -> [triage] -> batcher -> LLM analysis workers -> geocoding workers -> sink
+
+Each arrow is a bounded queue, so a slow stage pushes back on the one before it
+instead of buffering the whole flood in memory. Analysis packs up to
+`batch_size` messages into one LLM prompt; anything the batch reply misses is
+retried one message at a time. Finished incidents go straight to the sink
+(normally IncidentStore.add) as they complete.
+
+With a SOSDeduplicator (sos_dedup.py), messages are fingerprinted in chunks
+before batching and only the first report of each incident is analysed; its
+record carries `report_count`, the ids of the duplicates folded into it and
+when it was `last_reported`. Repeats that arrive after the incident reached
+the sink go to `on_duplicate`, which the CLI points at
+IncidentStore.merge_reports so the stored incident keeps counting.
+With a TriageClassifier (triage.py), each chunk is classified locally and only
+low-confidence messages are escalated to the LLM; the rest go straight to
+geocoding.
+
+Run from backend/:
+    python ingest_pipeline.py sos_messages.csv            # real Gemini + Geocoding
+    python ingest_pipeline.py sos_messages.csv --stub     # offline stubs
+    python ingest_pipeline.py burst.jsonl --dedup         # collapse repeat reports first
+    python ingest_pipeline.py sos_messages.csv --triage   # answer confident messages locally
+    CITY=pune CITIES_FILE=cities.json python ingest_pipeline.py pune.csv   # another configured city
+    LLM_MODE=replay python ingest_pipeline.py burst.jsonl # cached/recorded Gemini replies only (llm_cache.py)
+"""
+import argparse
+import csv
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from cities import get_city
+
+# --- CONFIGURATION ---
+BATCH_SIZE = 8          # messages per LLM prompt
+LLM_WORKERS = 4         # concurrent LLM calls
+GEOCODE_WORKERS = 8     # concurrent geocoding calls
+QUEUE_SIZE = 32         # items buffered between stages
+DEDUP_CHUNK = 256       # messages fingerprinted together by the dedup stage
+TRIAGE_CHUNK = 256      # messages classified together by the triage stage
+LEADERS_KEPT = 10000    # recent first reports the dedup stage can still fold repeats into
+
+_DONE = object()
+
+log = logging.getLogger(__name__)
+
+
+# --- SOURCES ---
+def read_csv_messages(path: str):
+    """Lazily yields message dicts ({"id", "message", "timestamp", "source"}) from a CSV like sos_messages.csv."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get("message"):
+                if row.get("id", "").isdigit():
+                    row["id"] = int(row["id"])
+                yield row
+
+
+def read_jsonl_messages(path: str):
+    """Lazily yields message dicts from a JSON Lines file, one object per line."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                if row.get("message"):
+                    yield row
+
+
+def read_messages(path: str):
+    return read_jsonl_messages(path) if path.endswith((".jsonl", ".ndjson")) else read_csv_messages(path)
+
+
+# --- PIPELINE ---
+class IngestPipeline:
+    """
+    analyze_batch: [(message_id, text)] -> {message_id: analysis}
+    analyze_one:   text -> analysis or None (fallback for messages a batch reply dropped)
+    geocode:       location text -> {"lat", "lng"} or None
+    sink:          called with every finished incident record; must be thread-safe
+    dedup:         optional SOSDeduplicator; duplicates skip analysis entirely
+    on_duplicate:  called with (incident, [rows]) for repeats of an incident already given to the sink;
+                   the incident's report_count, duplicate_ids and last_reported already count them
+    triage:        optional TriageClassifier; confident messages skip the LLM
+    """
+
+    def __init__(self, analyze_batch, analyze_one, geocode, sink,
+                 batch_size: int = BATCH_SIZE, llm_workers: int = LLM_WORKERS,
+                 geocode_workers: int = GEOCODE_WORKERS, queue_size: int = QUEUE_SIZE,
+                 dedup=None, dedup_chunk: int = DEDUP_CHUNK, on_duplicate=None,
+                 triage=None, triage_chunk: int = TRIAGE_CHUNK, city=None):
+        from ai_core import build_incident_record
+        self.city = city or get_city()   # locations are geocoded within this city
+        self.build_incident_record = build_incident_record
+        self.analyze_batch = analyze_batch
+        self.analyze_one = analyze_one
+        self.geocode = geocode
+        self.sink = sink
+        self.batch_size = batch_size
+        self.llm_workers = llm_workers
+        self.geocode_workers = geocode_workers
+        self.queue_size = queue_size
+        self.dedup = dedup
+        self.dedup_chunk = dedup_chunk
+        self.on_duplicate = on_duplicate
+        self.triage = triage
+        self.triage_chunk = triage_chunk
+        self._stats_lock = threading.Lock()
+        self._leaders = OrderedDict()   # cluster id -> first report's row (with "incident" once sunk)
+        self._leaders_lock = threading.Lock()
+
+    def run(self, messages) -> dict:
+        """Drains `messages` through the pipeline and returns throughput stats."""
+        stats = {"received": 0, "ingested": 0, "failed": 0, "llm_calls": 0, "duplicates": 0,
+                 "llm_avoided": 0}
+        batches = queue.Queue(maxsize=self.queue_size)
+        analyzed = queue.Queue(maxsize=self.queue_size * self.batch_size)
+
+        llm_threads = [threading.Thread(target=self._llm_worker, args=(batches, analyzed, stats), daemon=True)
+                       for _ in range(self.llm_workers)]
+        geo_threads = [threading.Thread(target=self._geocode_worker, args=(analyzed, stats), daemon=True)
+                       for _ in range(self.geocode_workers)]
+        for t in llm_threads + geo_threads:
+            t.start()
+
+        start = time.perf_counter()
+        batch = []
+        for row in self._escalate(self._dedupe(messages, stats), analyzed, stats):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                batches.put(batch)  # blocks when the LLM stage is saturated
+                batch = []
+        if batch:
+            batches.put(batch)
+
+        for _ in llm_threads:
+            batches.put(_DONE)
+        for t in llm_threads:
+            t.join()
+        for _ in geo_threads:
+            analyzed.put(_DONE)
+        for t in geo_threads:
+            t.join()
+
+        stats["seconds"] = time.perf_counter() - start
+        stats["messages_per_sec"] = stats["received"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _dedupe(self, messages, stats: dict):
+        """Yields the rows that need analysis; without a deduplicator that is every row."""
+        if self.dedup is None:
+            for row in messages:
+                stats["received"] += 1
+                yield row
+            return
+        chunk = []
+        for row in messages:
+            stats["received"] += 1
+            chunk.append(row)
+            if len(chunk) >= self.dedup_chunk:
+                yield from self._dedupe_chunk(chunk, stats)
+                chunk = []
+        if chunk:
+            yield from self._dedupe_chunk(chunk, stats)
+
+    def _dedupe_chunk(self, chunk: list, stats: dict) -> list:
+        leaders, sunk = [], {}   # sunk: cluster id -> (leader row, [repeats in this chunk])
+        assignments = self.dedup.assign(chunk)
+        with self._leaders_lock:
+            for row, (cluster_id, is_new) in zip(chunk, assignments):
+                if is_new:
+                    leader = dict(row, report_count=1, duplicate_ids=[])
+                    self._leaders[cluster_id] = leader
+                    leaders.append(leader)
+                    continue
+                stats["duplicates"] += 1
+                leader = self._leaders.get(cluster_id)
+                if leader is None:
+                    continue   # its first report is long gone (or failed analysis)
+                self._leaders.move_to_end(cluster_id)
+                leader["report_count"] += 1
+                leader["duplicate_ids"].append(row["id"])
+                if row.get("timestamp"):
+                    leader["last_reported"] = row["timestamp"]
+                if "incident" in leader:
+                    sunk.setdefault(cluster_id, (leader, []))[1].append(row)
+            while len(self._leaders) > LEADERS_KEPT:
+                self._leaders.popitem(last=False)
+            merges = [(leader, rows, {"report_count": leader["report_count"],
+                                      "duplicate_ids": list(leader["duplicate_ids"]),
+                                      "last_reported": leader.get("last_reported")})
+                      for leader, rows in sunk.values()]
+        for leader, rows, counts in merges:
+            leader["sunk"].wait()   # the sink may still be storing it
+            if self.on_duplicate is not None:
+                self.on_duplicate(dict(leader["incident"], **counts), rows)
+        return leaders
+
+    def _escalate(self, rows, analyzed: queue.Queue, stats: dict):
+        """Yields the rows the LLM must see; confidently triaged ones go straight to geocoding."""
+        if self.triage is None:
+            yield from rows
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.triage_chunk:
+                yield from self._triage_chunk(chunk, analyzed, stats)
+                chunk = []
+        if chunk:
+            yield from self._triage_chunk(chunk, analyzed, stats)
+
+    def _triage_chunk(self, chunk: list, analyzed: queue.Queue, stats: dict) -> list:
+        texts = [row["message"] for row in chunk]
+        escalated = []
+        for row, text, result in zip(chunk, texts, self.triage.classify_batch(texts)):
+            if result["escalate"]:
+                escalated.append(row)
+            else:
+                stats["llm_avoided"] += 1
+                analyzed.put((row, self.triage.to_analysis(text, result)))
+        return escalated
+
+    def _count(self, stats: dict, key: str, amount: int = 1):
+        with self._stats_lock:
+            stats[key] += amount
+
+    def _llm_worker(self, batches: queue.Queue, analyzed: queue.Queue, stats: dict):
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            pairs = [(row["id"], row["message"]) for row in batch]
+            results = {}
+            if len(pairs) > 1:
+                self._count(stats, "llm_calls")
+                try:
+                    results = self.analyze_batch(pairs)
+                except Exception as e:
+                    log.warning("Batch analysis failed, falling back to single messages",
+                                extra={"messages": len(pairs), "error": str(e)})
+            for row in batch:
+                analysis = results.get(row["id"])
+                if analysis is None:
+                    try:
+                        analysis = self.analyze_one(row["message"])
+                    except Exception as e:
+                        log.warning("Analysis failed", extra={"message_id": row["id"], "error": str(e)})
+                        analysis = None
+                    self._count(stats, "llm_calls")
+                if not analysis:
+                    self._count(stats, "failed")
+                    continue
+                analyzed.put((row, analysis))
+
+    def _geocode_worker(self, analyzed: queue.Queue, stats: dict):
+        while True:
+            item = analyzed.get()
+            if item is _DONE:
+                return
+            row, analysis = item
+            try:
+                location_text = analysis.get("location")
+                has_location = location_text and location_text != "Unknown"
+                coordinates = self.geocode(self.city.geocode_query(location_text)) if has_location else None
+                incident = self.build_incident_record(row["id"], row["message"], analysis, coordinates)
+                incident["city"] = self.city.name
+                with self._leaders_lock:   # repeats counted from here on are merged into the stored incident
+                    for field in ("timestamp", "source", "report_count", "duplicate_ids", "last_reported"):
+                        if row.get(field):
+                            incident[field] = list(row[field]) if field == "duplicate_ids" else row[field]
+                    if "report_count" in row:
+                        row["incident"], row["sunk"] = incident, threading.Event()
+                try:
+                    self.sink(incident)
+                finally:
+                    if "sunk" in row:
+                        row["sunk"].set()
+                self._count(stats, "ingested")
+            except Exception as e:
+                log.error("Ingest failed", extra={"message_id": row.get("id"), "error": str(e)})
+                self._count(stats, "failed")
+
+
+def merge_into_store(store):
+    """on_duplicate callback that folds late repeats into the incident already in `store`."""
+    def merge(incident: dict, rows: list):
+        if incident.get("journal_seq"):   # absent if the sink failed to store it
+            store.merge_reports(incident["journal_seq"], incident["report_count"],
+                                [row["id"] for row in rows], incident.get("last_reported"))
+    return merge
+
+
+def real_pipeline(sink, **options) -> IngestPipeline:
+    """Pipeline wired to Gemini and the Google Geocoding API."""
+    import ai_core
+    return IngestPipeline(ai_core.analyze_sos_batch_with_gemini, ai_core.analyze_sos_with_gemini,
+                          ai_core.get_coordinates, sink, **options)
+
+
+def stub_pipeline(sink, **options) -> IngestPipeline:
+    """Pipeline wired to the local stubs in ingest_stubs.py (no network, deterministic)."""
+    from ingest_stubs import StubGeocoder, StubLLM
+    llm = StubLLM()
+    return IngestPipeline(llm.analyze_batch, llm.analyze_one, StubGeocoder().geocode, sink, **options)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest SOS messages into the incident store.")
+    parser.add_argument("source", help="CSV (id,timestamp,source,message) or JSONL file")
+    parser.add_argument("--stub", action="store_true", help="use the offline LLM/geocoder stubs")
+    parser.add_argument("--data-file", help="default: processed_data.json in the city's data_dir")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--llm-workers", type=int, default=LLM_WORKERS)
+    parser.add_argument("--geocode-workers", type=int, default=GEOCODE_WORKERS)
+    parser.add_argument("--dedup", action="store_true", help="collapse near-duplicate reports before analysis")
+    parser.add_argument("--triage", action="store_true", help="answer confident messages with the local classifier")
+    args = parser.parse_args()
+
+    from logs import configure_logging
+    configure_logging()
+    from incident_store import IncidentStore
+    from triage import get_triage
+    city = get_city()
+    store = IncidentStore(args.data_file or city.path("processed_data.json"))
+    store.load(missing_ok=True)
+
+    build = stub_pipeline if args.stub else real_pipeline
+    dedup = None
+    if args.dedup:
+        from sos_dedup import SOSDeduplicator
+        dedup = SOSDeduplicator(gazetteer=city.gazetteer)
+    pipeline = build(store.add, batch_size=args.batch_size, llm_workers=args.llm_workers,
+                     geocode_workers=args.geocode_workers, dedup=dedup, on_duplicate=merge_into_store(store),
+                     triage=get_triage() if args.triage else None, city=city)
+    stats = pipeline.run(read_messages(args.source))
+    store.journal.close()
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,209 @@
+"""
+Response cache and record/replay for the Gemini calls in ai_core.py.
+
+LLMCache is content-addressed: the key is a hash of the operation, the
+prompt version and the message text normalized the way repeats of the same
+report differ ("RT @user:", "Fwd:", case, whitespace), so a retweet or a
+forwarded SMS reuses the first copy's analysis instead of another call. Links
+stay in the key as their domain: a link is what the authenticity score reacts
+to, so a copy carrying one (or another one) gets an analysis of its own. It
+mirrors GeocodeCache: an in-memory LRU in front of SQLite on disk, which
+survives restarts and is shared between worker processes. The disk tier
+keeps at most `max_entries` rows, dropping the least recently used, and
+entries older than `ttl` are treated as misses.
+
+LLM_MODE picks what happens on a cache miss:
+    live     call Gemini (the default)
+    record   call Gemini and also append every raw reply to LLM_RECORDINGS_FILE
+    replay   never call Gemini: answer from the cache, then from the recorded
+             replies (matched by prompt hash); anything else raises
+             ReplayMissError, which callers treat like a failed call
+
+so a recorded run can be replayed offline, deterministically:
+    LLM_MODE=record python ingest_pipeline.py burst.jsonl   # fills the cache and the recordings
+    LLM_MODE=replay python ingest_pipeline.py burst.jsonl   # same analyses, no network
+The recordings cover what the cache does not (situation reports), and replay
+against an empty cache (another LLM_CACHE_FILE) re-parses every recorded
+reply; run both with --llm-workers 1 then, so batches form the same way.
+Bump PROMPT_VERSION whenever a prompt or schema changes, so old answers stop matching.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "llm_cache.sqlite3")
+LLM_RECORDINGS_FILE = os.getenv("LLM_RECORDINGS_FILE", "llm_recordings.jsonl")
+LLM_MODE = os.getenv("LLM_MODE", "live")   # "live", "record" or "replay"
+PROMPT_VERSION = "2"
+MAX_ENTRIES = 100_000
+TTL_SECONDS = 7 * 24 * 60 * 60
+MEMORY_CACHE_SIZE = 4096
+EVICT_EVERY = 256          # puts between disk evictions
+TOUCH_SECONDS = 60 * 60    # a hit only rewrites used_at if the stored one is older than this
+
+_FORWARD_PREFIX = re.compile(r"^(?:\s*(?:rt\s+@\w+\s*:?|rt\s*:|fwd?\s*:|fw\s*:))+")
+_URL = re.compile(r"(?:https?://|www\.)(?:www\.)?([^/\s?#]*)\S*")
+_WHITESPACE = re.compile(r"\s+")
+
+CACHE_LOOKUPS = get_registry().counter(
+    "llm_cache_total", "LLM response cache lookups by result (hit, miss).", ("operation", "result"))
+
+
+class ReplayMissError(LookupError):
+    """Replay mode was asked for a reply it has no cached or recorded answer for."""
+
+
+def normalize_message(text: str) -> str:
+    """'RT @ravi: Fwd:  Trapped at Andheri https://bit.ly/x' -> 'trapped at andheri <link:bit.ly>'."""
+    text = _FORWARD_PREFIX.sub("", (text or "").lower().strip())
+    return _WHITESPACE.sub(" ", _URL.sub(lambda m: f" <link:{m.group(1)}> ", text)).strip()
+
+
+def cache_key(operation: str, text: str) -> str:
+    return hashlib.sha256(f"{operation}\0{PROMPT_VERSION}\0{normalize_message(text)}".encode("utf-8")).hexdigest()
+
+
+def prompt_key(operation: str, prompt: str) -> str:
+    return hashlib.sha256(f"{operation}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_FILE, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 memory_size: int = MEMORY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> (created_at, result as JSON), so callers get their own copy
+        self._puts = 0
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, operation TEXT, result TEXT, created_at REAL, used_at REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        self._db.commit()
+
+    # --- public API ---
+    def get(self, operation: str, text: str):
+        """The cached result for this message, or None."""
+        key = cache_key(operation, text)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] + self.ttl > now:
+                self._memory.move_to_end(key)
+                return self._record(operation, "hit", json.loads(entry[1]))
+            row = self._db.execute("SELECT result, created_at, used_at FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+            if row is None or row[1] + self.ttl <= now:
+                return self._record(operation, "miss", None)
+            if row[2] + TOUCH_SECONDS < now:
+                self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+            self._remember(key, row[1], row[0])
+            return self._record(operation, "hit", json.loads(row[0]))
+
+    def put(self, operation: str, text: str, result: dict):
+        key = cache_key(operation, text)
+        encoded = json.dumps(result)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                             (key, operation, encoded, now, now))
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+            self._db.commit()
+            self._remember(key, now, encoded)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {**self._stats, "lookups": lookups, "entries": entries,
+                    "hit_rate": self._stats["hits"] / lookups if lookups else 0.0}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- internal helpers ---
+    def _evict(self):
+        now = time.time()
+        expired = self._db.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,)).rowcount
+        excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute("""DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY used_at LIMIT ?)""", (excess,))
+        self._stats["evicted"] += expired + max(excess, 0)
+
+    def _remember(self, key: str, created_at: float, encoded: str):
+        self._memory[key] = (created_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _record(self, operation: str, result: str, value):
+        CACHE_LOOKUPS.inc(operation, result)
+        self._stats["hits" if result == "hit" else "misses"] += 1
+        return value
+
+
+class Recordings:
+    """Raw Gemini replies by prompt hash, appended to a JSONL file as they arrive (LLM_MODE=record)."""
+
+    def __init__(self, path: str = LLM_RECORDINGS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._replies = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._replies[entry["key"]] = entry["text"]
+
+    def get(self, operation: str, prompt: str):
+        """The recorded reply text to this prompt, or None."""
+        with self._lock:
+            return self._replies.get(prompt_key(operation, prompt))
+
+    def add(self, operation: str, prompt: str, text: str):
+        key = prompt_key(operation, prompt)
+        with self._lock:
+            self._replies[key] = text
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"key": key, "operation": operation, "text": text}) + "\n")
+
+
+_shared_cache = None
+_shared_recordings = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """Process-wide cache; a relative LLM_CACHE_FILE is kept next to this module."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), LLM_CACHE_FILE))
+        return _shared_cache
+
+
+def get_recordings() -> Recordings:
+    """Process-wide recordings on LLM_RECORDINGS_FILE (relative to the working directory)."""
+    global _shared_recordings
+    with _shared_lock:
+        if _shared_recordings is None:
+            _shared_recordings = Recordings(LLM_RECORDINGS_FILE)
+        return _shared_recordings
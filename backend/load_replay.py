@@ -0,0 +1,256 @@
+"""
+Replay harness: drives the API at a target request rate and reports throughput
+and latency percentiles per endpoint. This is the standard capacity-planning
+benchmark.
+
+Load is open-loop. Request i is due at start + i / rate no matter how earlier
+requests fared, and latency is measured from that due time. A server that
+falls behind therefore shows up as queueing delay in the percentiles rather
+than as a quietly lower offered load.
+
+Request payloads (report descriptions, coordinates) come from a generated
+scenario file (JSONL or columnar, see scenario_generator.py) or are generated
+on the fly.
+
+Run from backend/:
+    python load_replay.py --url http://localhost:5000 --rate 200 --duration 30
+    python load_replay.py --in-process --rate 500 --duration 20 --seed-incidents 100000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from scenario_generator import ScenarioGenerator, iter_records, to_records
+
+# --- CONFIGURATION ---
+DEFAULT_RATE = 100.0          # requests per second
+DEFAULT_DURATION = 10.0       # seconds
+DEFAULT_CONCURRENCY = 64
+REQUEST_TIMEOUT_SECONDS = 30
+# Endpoint -> share of requests; roughly a room of dashboards polling while reports come in.
+DEFAULT_MIX = {"get_sos_data": 50, "get_sos_delta": 20, "report_incident": 10,
+               "get_route": 10, "get_nearby_places": 8, "get_situation_update": 2}
+PERCENTILES = (50, 90, 99)
+
+
+# --- REQUEST BUILDERS ---
+# Each returns (method, path, query params, JSON body, headers) for one call.
+def _sos_data(record, state):
+    headers = {"If-None-Match": state["etag"]} if state.get("etag") else {}
+    return "GET", "/get_sos_data", {}, None, headers
+
+
+def _sos_delta(record, state):
+    return "GET", "/get_sos_data", {"since": state.get("revision", 0)}, None, {}
+
+
+def _report(record, state):
+    body = {"description": record["original_message"],
+            "lat": record["coordinates"]["lat"], "lng": record["coordinates"]["lng"]}
+    return "POST", "/report_incident", {}, body, {}
+
+
+def _route(record, state):
+    return "GET", "/get_route", {"lat": record["coordinates"]["lat"], "lng": record["coordinates"]["lng"]}, None, {}
+
+
+def _nearby(record, state):
+    params = {"lat": record["coordinates"]["lat"], "lng": record["coordinates"]["lng"]}
+    return "GET", "/get_nearby_places", params, None, {}
+
+
+def _situation(record, state):
+    return "GET", "/get_situation_update", {}, None, {}
+
+
+BUILDERS = {"get_sos_data": _sos_data, "get_sos_delta": _sos_delta, "report_incident": _report,
+            "get_route": _route, "get_nearby_places": _nearby, "get_situation_update": _situation}
+
+
+# --- TRANSPORTS ---
+class HTTPTarget:
+    """A running server, one pooled requests.Session per worker thread."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self._local = threading.local()
+
+    def send(self, method, path, params, body, headers):
+        import requests
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(method, self.base_url + path, params=params, json=body, headers=headers,
+                                   timeout=REQUEST_TIMEOUT_SECONDS)
+        return response.status_code, response.headers, len(response.content)
+
+
+class InProcessTarget:
+    """The Flask app in this process via its test client, on a scratch copy of the incident data."""
+
+    def __init__(self, seed_incidents: int = 0):
+        import app as backend
+        from incident_journal import reset
+        from incident_store import IncidentStore
+        from scenario_generator import generate_incidents
+
+        self._workdir = tempfile.mkdtemp(prefix="load_replay_")
+        path = os.path.join(self._workdir, "processed_data.json")
+        if seed_incidents:
+            reset(path, generate_incidents(seed_incidents, seed=1))
+        else:
+            shutil.copy(backend.PROCESSED_DATA_FILE, path)
+        backend.incident_store = IncidentStore(path)
+        backend.incident_store.load()
+        self.store = backend.incident_store
+        self.app = backend.app
+        self._local = threading.local()
+
+    def send(self, method, path, params, body, headers):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, query_string=params, json=body, headers=headers)
+        return response.status_code, response.headers, len(response.get_data())
+
+    def close(self):
+        self.store.journal.close()
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+
+# --- RUNNER ---
+def payload_records(source: str = None):
+    """Endless stream of incident records to draw coordinates and descriptions from."""
+    if source:
+        return itertools.cycle(list(itertools.islice(iter_records(source), 100000)))
+    return itertools.cycle(to_records(next(ScenarioGenerator(10000, seed=2, chunk_size=10000).chunks())))
+
+
+def replay(target, rate: float, duration: float, mix: dict = None, concurrency: int = DEFAULT_CONCURRENCY,
+           source: str = None) -> dict:
+    """Fires rate * duration requests on schedule and returns per-endpoint results."""
+    mix = mix or DEFAULT_MIX
+    names = list(mix)
+    weights = np.array([mix[name] for name in names], dtype=np.float64)
+    total = int(rate * duration)
+    schedule = np.random.default_rng(0).choice(len(names), size=total, p=weights / weights.sum())
+    records = payload_records(source)
+    state = {}   # latest ETag / revision seen, shared like a dashboard's polling state
+    results = []
+    results_lock = threading.Lock()
+
+    def fire(name, due, request):
+        sent = time.perf_counter()
+        try:
+            status, headers, size = target.send(*request)
+            if headers.get("ETag"):
+                state["etag"] = headers["ETag"]
+            if headers.get("X-Incident-Revision"):
+                state["revision"] = int(headers["X-Incident-Revision"])
+        except Exception as e:
+            status, size = f"error: {type(e).__name__}", 0
+        done = time.perf_counter()
+        with results_lock:
+            results.append((name, status, done - due, done - sent, size))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, endpoint in enumerate(schedule):
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = names[endpoint]
+            pool.submit(fire, name, due, BUILDERS[name](next(records), state))
+    elapsed = time.perf_counter() - start
+    return summarize(results, elapsed, rate)
+
+
+def summarize(results: list, elapsed: float, rate: float) -> dict:
+    by_endpoint = {}
+    for name, status, latency, service, size in results:
+        by_endpoint.setdefault(name, []).append((status, latency, service, size))
+    report = {"offered_rate": rate, "achieved_rate": len(results) / elapsed if elapsed else 0.0,
+              "requests": len(results), "seconds": elapsed, "endpoints": {}}
+    everything = []
+    for name, rows in sorted(by_endpoint.items()):
+        latencies = np.array([row[1] for row in rows]) * 1000
+        everything.append(latencies)
+        errors = sum(1 for row in rows if not isinstance(row[0], int) or row[0] >= 500)
+        report["endpoints"][name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "not_modified": sum(1 for row in rows if row[0] == 304),
+            "avg_bytes": int(np.mean([row[3] for row in rows])),
+            **{f"p{p}_ms": round(float(np.percentile(latencies, p)), 2) for p in PERCENTILES},
+            "max_ms": round(float(latencies.max()), 2),
+        }
+    if everything:
+        latencies = np.concatenate(everything)
+        report["overall"] = {**{f"p{p}_ms": round(float(np.percentile(latencies, p)), 2) for p in PERCENTILES},
+                             "max_ms": round(float(latencies.max()), 2)}
+    return report
+
+
+def print_report(report: dict):
+    print(f"Offered {report['offered_rate']:.0f} req/s, achieved {report['achieved_rate']:.1f} req/s "
+          f"({report['requests']} requests in {report['seconds']:.1f}s)\n")
+    header = f"{'endpoint':<22} | {'reqs':>6} | {'errors':>6} | {'304':>5} | {'bytes':>8}"
+    header += "".join(f" | {f'p{p} ms':>8}" for p in PERCENTILES) + f" | {'max ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, row in report["endpoints"].items():
+        line = f"{name:<22} | {row['requests']:>6} | {row['errors']:>6} | {row['not_modified']:>5} | {row['avg_bytes']:>8}"
+        line += "".join(f" | {row[f'p{p}_ms']:>8.2f}" for p in PERCENTILES) + f" | {row['max_ms']:>8.2f}"
+        print(line)
+    if "overall" in report:
+        overall = report["overall"]
+        print("\noverall: " + ", ".join(f"{key} {value:.2f}" for key, value in overall.items()))
+
+
+def parse_mix(text: str) -> dict:
+    """'get_sos_data=5,report_incident=1' -> {"get_sos_data": 5.0, "report_incident": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in BUILDERS:
+            raise ValueError(f"Unknown endpoint '{name}'. Choose from: {', '.join(BUILDERS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay load against the disaster-response API.")
+    target_group = parser.add_mutually_exclusive_group(required=True)
+    target_group.add_argument("--url", help="base URL of a running server")
+    target_group.add_argument("--in-process", action="store_true", help="drive app.py through Flask's test client")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="requests per second")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds of load")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--mix", type=parse_mix, help="endpoint=weight,... (default: dashboard-like mix)")
+    parser.add_argument("--source", help="scenario JSONL file or columnar directory for payloads")
+    parser.add_argument("--seed-incidents", type=int, default=0,
+                        help="in-process only: start from this many generated incidents")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    random.seed(0)
+    target = HTTPTarget(args.url) if args.url else InProcessTarget(args.seed_incidents)
+    try:
+        result = replay(target, args.rate, args.duration, args.mix, args.concurrency, args.source)
+    finally:
+        if isinstance(target, InProcessTarget):
+            target.close()
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
@@ -0,0 +1,256 @@
+"""
+Prometheus-style metrics: counters, gauges and histograms, served as text on /metrics.
+
+Instruments are cheap enough for the request path: one lock, a dict lookup
+by label values and, for histograms, a bisect into the bucket bounds. Numbers
+a component already keeps (queue sizes, circuit states, store size) are not
+mirrored on every change; collectors added with add_collector() read them
+when /metrics is scraped.
+
+With several worker processes (asgi.py), each process writes its samples to
+METRICS_DIR/<pid>.json every few seconds (and right before it answers a
+scrape), and /metrics adds up every file, so whichever worker answers speaks
+for the whole server. Counters and histograms are added up (exited workers
+keep their totals); gauges are reported per worker, with a `worker` label,
+and dropped once that worker's file goes stale.
+
+    from metrics import get_registry
+    REQUESTS = get_registry().counter("x_requests_total", "Requests handled.", ("endpoint",))
+    REQUESTS.inc("get_sos_data")
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+METRICS_DIR = "metrics"           # per-worker sample files when several processes serve the app
+FLUSH_SECONDS = 5.0
+STALE_SECONDS = 3 * FLUSH_SECONDS  # a worker file this old no longer contributes gauges
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+log = logging.getLogger(__name__)
+
+
+class Counter:
+    """Monotonic total per label combination."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> list:
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Current value per label combination."""
+    kind = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = float(value)
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram:
+    """Observation counts per bucket (upper bounds in seconds by default), plus their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}   # label values -> [per-bucket counts (last = +Inf), sum]
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def time(self, *label_values):
+        """Context manager observing the seconds spent inside it."""
+        return _Timer(self, label_values)
+
+    def samples(self) -> list:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram, self.label_values = histogram, label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self.shared_dir = None
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collect):
+        """collect() -> [(name, kind, help, [(labels dict, value), ...]), ...], called on every scrape."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def families(self) -> list:
+        """This process's metrics as [{"name", "kind", "help", "samples": [[name, labels, value], ...]}]."""
+        with self._lock:
+            metrics, collectors = list(self._metrics.values()), list(self._collectors)
+        families = [{"name": m.name, "kind": m.kind, "help": m.help,
+                     "samples": [list(sample) for sample in m.samples()]} for m in metrics]
+        for collect in collectors:
+            try:
+                for name, kind, help_text, samples in collect():
+                    families.append({"name": name, "kind": kind, "help": help_text,
+                                     "samples": [[name, labels, value] for labels, value in samples]})
+            except Exception as e:
+                log.warning("Metrics collector failed", extra={"collector": getattr(collect, "__name__", "?"),
+                                                               "error": str(e)})
+        return families
+
+    def share(self, directory: str = METRICS_DIR, interval_seconds: float = FLUSH_SECONDS):
+        """Publishes this process's samples for the other workers' scrapes, every interval_seconds."""
+        os.makedirs(directory, exist_ok=True)
+        self.shared_dir = directory
+
+        def flush_loop():
+            while True:
+                try:
+                    self._flush()
+                except OSError as e:
+                    log.warning("Metrics flush failed", extra={"error": str(e)})
+                time.sleep(interval_seconds)
+
+        threading.Thread(target=flush_loop, name="metrics-flush", daemon=True).start()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        families = self.families() if self.shared_dir is None else self._merged()
+        lines = []
+        for family in _combine(families):
+            lines.append(f"# HELP {family['name']} {family['help']}")
+            lines.append(f"# TYPE {family['name']} {family['kind']}")
+            for name, labels, value in family["samples"]:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    # --- internal helpers ---
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing     # module reloads / repeated factories share one instrument
+            self._metrics[metric.name] = metric
+            return metric
+
+    def _flush(self):
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.families(), f)
+        os.replace(path + ".tmp", path)
+
+    def _merged(self) -> list:
+        self._flush()
+        families = []
+        now = time.time()
+        for name in os.listdir(self.shared_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.shared_dir, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    worker = json.load(f)
+                fresh = now - os.path.getmtime(path) < STALE_SECONDS
+            except (OSError, ValueError):
+                continue    # replaced or half-written: the next scrape sees it
+            pid = name[:-len(".json")]
+            for family in worker:
+                if family["kind"] != "gauge":
+                    families.append(family)
+                elif fresh:
+                    # Gauges are per-process state (each worker has its own store copy, queues...),
+                    # so they stay apart, labelled by worker, rather than being added up.
+                    family["samples"] = [[sample, {**labels, "worker": pid}, value]
+                                         for sample, labels, value in family["samples"]]
+                    families.append(family)
+        return families
+
+
+def _combine(families: list) -> list:
+    """Adds up same-named samples with the same labels (one family per name, first seen order)."""
+    combined = {}
+    for family in families:
+        target = combined.setdefault(family["name"], {**family, "samples": {}})
+        for name, labels, value in family["samples"]:
+            key = (name, tuple(labels.items()))
+            target["samples"][key] = target["samples"].get(key, 0) + value
+    return [{**family, "samples": [(name, dict(labels), value) for (name, labels), value in family["samples"].items()]}
+            for family in combined.values()]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def get_registry() -> Registry:
+    """Process-wide registry, created on first use."""
+    global _shared_registry
+    with _shared_lock:
+        if _shared_registry is None:
+            _shared_registry = Registry()
+        return _shared_registry
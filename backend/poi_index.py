@@ -0,0 +1,182 @@
+"""
+Local points-of-interest index for /get_nearby_places.
+
+Hospitals, police stations and fire stations are loaded from poi_data.json
+into one KD-tree per category (over locally projected km coordinates), so a
+nearby-places lookup is an in-memory radius query instead of three Places API
+round trips. Batch queries for many incident coordinates are vectorised.
+
+The data file can be rebuilt from the Places API, either on demand
+(`python poi_index.py --refresh`) or by a background thread started with
+start_background_refresh(); the three place types are fetched concurrently and
+the index is swapped in atomically once the refresh finishes.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import requests
+from scipy.spatial import cKDTree
+
+from geo_projection import project_km
+from http_client import get_http_client, maps_url
+from cities import get_city
+
+# --- CONFIGURATION ---
+POI_DATA_FILE = "poi_data.json"
+DEFAULT_RADIUS_M = 5000
+MAX_RESULTS_PER_CATEGORY = 20          # the Places API returns at most 20 per page
+REFRESH_WORKERS = 8
+# Response key -> Places API type, in the order /get_nearby_places has always used.
+CATEGORIES = {"hospitals": "hospital", "police_stations": "police", "fire_stations": "fire_station"}
+
+log = logging.getLogger(__name__)
+
+
+class POIIndex:
+    def __init__(self, places: dict):
+        self._categories = {}
+        for category in CATEGORIES:
+            items = places.get(category, [])
+            points = project_km([p["lat"] for p in items], [p["lng"] for p in items])
+            tree = cKDTree(points) if items else None
+            results = [{"name": p["name"], "location": {"lat": p["lat"], "lng": p["lng"]}} for p in items]
+            self._categories[category] = (tree, results)
+
+    @classmethod
+    def from_file(cls, path: str = POI_DATA_FILE) -> "POIIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f)["places"])
+
+    def __len__(self) -> int:
+        return sum(len(results) for _, results in self._categories.values())
+
+    def nearby(self, lat: float, lng: float, radius_m: float = DEFAULT_RADIUS_M,
+               limit: int = MAX_RESULTS_PER_CATEGORY) -> dict:
+        """Places within radius_m, nearest first, in /get_nearby_places' response shape."""
+        return self.nearby_batch([(lat, lng)], radius_m, limit)[0]
+
+    def nearby_batch(self, points: list, radius_m: float = DEFAULT_RADIUS_M,
+                     limit: int = MAX_RESULTS_PER_CATEGORY) -> list:
+        """nearby() for many (lat, lng) points at once; one tree query per category."""
+        if not points:
+            return []
+        query = project_km([p[0] for p in points], [p[1] for p in points])
+        answers = [{} for _ in points]
+        for category, (tree, results) in self._categories.items():
+            if tree is None:
+                for answer in answers:
+                    answer[category] = []
+                continue
+            k = min(limit, tree.n)
+            distances, indices = tree.query(query, k=k, distance_upper_bound=radius_m / 1000.0)
+            distances = np.asarray(distances).reshape(len(points), k)
+            indices = np.asarray(indices).reshape(len(points), k)
+            for answer, row_d, row_i in zip(answers, distances, indices):
+                answer[category] = [results[i] for d, i in zip(row_d, row_i) if np.isfinite(d)]
+        return answers
+
+    def nearest(self, lat: float, lng: float, category: str, k: int = 1) -> list:
+        """k nearest places of one category regardless of radius, as (place, km)."""
+        tree, results = self._categories[category]
+        if tree is None:
+            return []
+        k = min(k, tree.n)
+        distances, indices = tree.query(project_km([lat], [lng])[0], k=k)
+        return [(results[i], float(d)) for d, i in zip(np.atleast_1d(distances), np.atleast_1d(indices))]
+
+
+# --- REFRESH FROM THE PLACES API ---
+def fetch_places(api_key: str, lat: float, lng: float, place_type: str, radius_m: int = DEFAULT_RADIUS_M) -> list:
+    url = maps_url("/maps/api/place/nearbysearch/json")
+    params = {'location': f"{lat},{lng}", 'radius': radius_m, 'type': place_type, 'key': api_key}
+    response = get_http_client().get("places", url, params=params)
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+
+def refresh_poi_file(api_key: str, path: str = POI_DATA_FILE, centers: list = None) -> dict:
+    """
+    Re-fetches all three place types around every landmark of this process's city (or the given
+    (lat, lng) centers), concurrently, de-duplicates by place_id and atomically rewrites the data file.
+    """
+    centers = centers or [(loc["lat"], loc["lng"]) for loc in get_city().gazetteer]
+    jobs = [(category, place_type, lat, lng) for category, place_type in CATEGORIES.items() for lat, lng in centers]
+    merged = {category: {} for category in CATEGORIES}
+    with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+        futures = {pool.submit(fetch_places, api_key, lat, lng, place_type): category
+                   for category, place_type, lat, lng in jobs}
+        for future, category in futures.items():
+            try:
+                for place in future.result():
+                    location = place['geometry']['location']
+                    key = place.get('place_id') or (place['name'], location['lat'], location['lng'])
+                    merged[category][key] = {"name": place['name'], "lat": location['lat'], "lng": location['lng']}
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                log.warning("POI refresh lookup failed", extra={"category": category, "error": str(e)})
+
+    if not any(merged.values()):
+        raise RuntimeError("POI refresh returned no places; keeping the existing data file.")
+    data = {
+        "source": "Google Places API nearby search around the city gazetteer",
+        "updated_at": datetime.now().isoformat(),
+        "places": {category: list(places.values()) for category, places in merged.items()},
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+    return data
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_poi_index(path: str = POI_DATA_FILE) -> POIIndex:
+    """Process-wide index, loaded on first use."""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = POIIndex.from_file(path)
+        return _shared_index
+
+
+def start_background_refresh(api_key: str, interval_seconds: float, path: str = POI_DATA_FILE,
+                             centers: list = None) -> threading.Thread:
+    """Refreshes the data file every interval and swaps the shared index in place."""
+    def loop():
+        global _shared_index
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                data = refresh_poi_file(api_key, path, centers)
+                index = POIIndex(data["places"])
+                with _shared_lock:
+                    _shared_index = index
+                log.info("POI index refreshed", extra={"places": len(index)})
+            except Exception as e:
+                log.error("POI refresh failed", extra={"error": str(e)})
+
+    thread = threading.Thread(target=loop, name="poi-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or rebuild the local POI index.")
+    parser.add_argument("--refresh", action="store_true", help="rebuild poi_data.json from the Places API")
+    args = parser.parse_args()
+    if args.refresh:
+        from dotenv import load_dotenv
+        load_dotenv()
+        data = refresh_poi_file(os.environ["GOOGLE_MAPS_API_KEY"])
+        print({category: len(places) for category, places in data["places"].items()})
+    else:
+        print(f"{len(POIIndex.from_file())} places in {POI_DATA_FILE}")
@@ -1,7 +1,9 @@
-import json
+import os
 import random
 from datetime import datetime, timedelta
 
+from incident_journal import reset as reset_incident_journal
+
 # --- CONFIGURATION ---
 OUTPUT_JSON_FILE = "processed_data.json"
 
@@ -52,45 +54,57 @@ SCENARIOS = [
     {"type": "Tree Fall", "severity": 5, "desc": "Huge tree fell on a parked car, blocking traffic.", "needs": ["Fire", "Municipality"]},
 ]
 
-def generate_data():
-    print("--- Generating Pan-Mumbai Disaster Data ---")
-    data = []
-    
-    # Generate 50 incidents
-    for i in range(1, 51):
-        loc = random.choice(LOCATIONS)
-        # Add slight random jitter to location so they don't stack perfectly
-        lat_jitter = random.uniform(-0.005, 0.005)
-        lng_jitter = random.uniform(-0.005, 0.005)
-        
-        scenario = random.choice(SCENARIOS)
-        
-        # Authenticity Score (Weighted towards high)
-        auth_score = random.choices([3, 5, 7, 8, 9, 10], weights=[5, 10, 20, 30, 20, 15])[0]
+def make_incident(incident_id: int) -> dict:
+    """Builds one random incident around a known Mumbai landmark."""
+    loc = random.choice(LOCATIONS)
+    # Add slight random jitter to location so they don't stack perfectly
+    lat_jitter = random.uniform(-0.005, 0.005)
+    lng_jitter = random.uniform(-0.005, 0.005)
+
+    scenario = random.choice(SCENARIOS)
+
+    # Authenticity Score (Weighted towards high)
+    auth_score = random.choices([3, 5, 7, 8, 9, 10], weights=[5, 10, 20, 30, 20, 15])[0]
+
+    return {
+        "id": incident_id,
+        "original_message": f"SOS! {scenario['desc']} at {loc['name']}.",
+        "category": scenario['type'],
+        "priority": "Critical" if scenario['severity'] >= 8 else "High" if scenario['severity'] >= 6 else "Moderate",
+        "severity_score": scenario['severity'],
+        "authenticity_score": auth_score,
+        "location": f"{loc['name']}, {loc['area']}, Mumbai",
+        "coordinates": {
+            "lat": loc['lat'] + lat_jitter,
+            "lng": loc['lng'] + lng_jitter
+        },
+        "need_type": scenario['needs'],
+        "timestamp": (datetime.now() - timedelta(minutes=random.randint(1, 120))).isoformat()
+    }
+
+def generate_data(count: int = 50, seed: int = None):
+    """Demo snapshot for this process's city (CITY / CITIES_FILE, see cities.py), in its data_dir."""
+    from cities import get_city
+    city = get_city()
+    print(f"--- Generating Pan-{city.label} Disaster Data ---")
 
-        incident = {
-            "id": i,
-            "original_message": f"SOS! {scenario['desc']} at {loc['name']}.",
-            "category": scenario['type'],
-            "priority": "Critical" if scenario['severity'] >= 8 else "High" if scenario['severity'] >= 6 else "Moderate",
-            "severity_score": scenario['severity'],
-            "authenticity_score": auth_score,
-            "location": f"{loc['name']}, {loc['area']}, Mumbai",
-            "coordinates": {
-                "lat": loc['lat'] + lat_jitter,
-                "lng": loc['lng'] + lng_jitter
-            },
-            "need_type": scenario['needs'],
-            "timestamp": (datetime.now() - timedelta(minutes=random.randint(1, 120))).isoformat()
-        }
-        data.append(incident)
+    # Hotspots, arrival surges and duplicate bursts come from the vectorized generator
+    from scenario_generator import generate_incidents
+    data = generate_incidents(count, seed=seed if seed is not None else random.randrange(2 ** 32), city=city)
 
-    # Save to file
-    with open(OUTPUT_JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+    # Save as a fresh snapshot; reports journaled against the old data no longer apply
+    if city.data_dir:
+        os.makedirs(city.data_dir, exist_ok=True)
+    output = city.path(OUTPUT_JSON_FILE)
+    reset_incident_journal(output, data)
     
-    print(f"Successfully generated {len(data)} incidents across {len(LOCATIONS)} key locations.")
-    print(f"Saved to {OUTPUT_JSON_FILE}")
+    print(f"Successfully generated {len(data)} incidents across {len(city.gazetteer)} key locations.")
+    print(f"Saved to {output}")
 
 if __name__ == '__main__':
-    generate_data()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Regenerate the demo incident snapshot.")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    generate_data(args.count, args.seed)
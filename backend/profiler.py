@@ -0,0 +1,85 @@
+"""
+Opt-in sampling profiler for a running server.
+
+A daemon thread wakes `hz` times a second, reads every other thread's
+current stack (sys._current_frames) and counts it. Nothing is installed in
+the profiled code, so the cost is the sampling thread alone and stays off the
+request path. collapsed() returns the counts in the folded-stack format that
+flamegraph.pl and speedscope read ("outer;inner;leaf 42" per line).
+
+Enabled in app.py with PROFILER_HZ > 0, which also adds /debug/profile.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# --- CONFIGURATION ---
+DEFAULT_HZ = 100
+MAX_DEPTH = 64
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    def __init__(self, hz: float = DEFAULT_HZ):
+        self.interval = 1.0 / hz
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Folded stacks, most sampled first; reset=True starts a new profile window."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+            if reset:
+                self._stacks = Counter()
+                self.samples = 0
+                self.started_at = time.time()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    # --- internal helpers ---
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                path = []
+                while frame is not None and len(path) < MAX_DEPTH:
+                    path.append(_frame_name(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                # Pool threads differ only by number ("request_3", "Thread-12"), so their stacks add up.
+                thread_name = re.sub(r"[-_]\d+", "", names.get(ident, "thread"))
+                stacks.append(";".join([thread_name] + path[::-1]))
+            del frames
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
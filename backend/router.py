@@ -0,0 +1,493 @@
+"""
+City router: one API endpoint in front of a shard server per city.
+
+Each city of CITIES_FILE (cities.py) is served by its own asgi.py process
+tree with its own incident store and journal, fleet, situation report,
+geocode cache and metrics, so reports and queries for different cities never
+share a lock, a journal file or a core. The router owns no incident state;
+it sends each request to the city that owns it, or fans out and merges:
+
+    ?city=<name>                  any endpoint, proxied to that city unchanged
+    /report_incident, /get_route, /get_nearby_places
+                                  the city whose bounds hold lat/lng
+    /get_sos_data                 every city's feed, concatenated (each shard's feed is cached
+                                  here and revalidated with If-None-Match)
+    /get_sos_data?bbox=...        the cities the bbox touches; pages merged in feed order, with one
+                                  cursor holding each city's position
+    /get_sos_tiles                cells merged by geohash
+    /sos_stream                   every city's events on one stream; the event id holds each city's id
+    anything else                 the first city (fleet, dispatch, situation report...)
+
+Merged responses are JSON; binary columns (Accept: application/x-incident-columns)
+and ?since= deltas are per city, so they need city=.
+
+Run from backend/:
+    CITIES_FILE=cities.json python router.py --port 5001    # also starts a shard per city on 5101, 5102, ...
+"""
+import argparse
+import base64
+import heapq
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+
+from cities import city_for_point, get_cities, get_city
+from http_client import get_http_client
+from incident_store import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+from logs import configure_logging
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+DEFAULT_PORT = 5001
+SHARD_BASE_PORT = 5101
+SHARD_URLS = json.loads(os.getenv("SHARD_URLS", "{}"))   # city name -> base URL, set by the launcher
+ROUTER_WORKERS = int(os.getenv("ROUTER_WORKERS", "1"))
+ROUTER_METRICS_DIR = "router_metrics"
+# Shards are local and trusted: no rate limit, fail fast, and only a short breaker pause when one is down.
+SHARD_POLICY = {"timeout": (1.0, 30.0), "retries": 1, "failure_threshold": 20, "reset_seconds": 5.0,
+                "rate_per_second": 1e9, "burst": 10 ** 9, "max_wait_seconds": 0.0}
+FAN_OUT_THREADS = 64
+FORWARDED_HEADERS = ("Accept", "Content-Type", "If-None-Match", "Last-Event-ID")
+RETURNED_HEADERS = {"content-type", "etag", "x-incident-revision", "vary", "cache-control", "x-profile-samples"}
+SSE_HEARTBEAT_SECONDS = 15
+STREAM_RETRY_SECONDS = 2.0
+STARTUP_TIMEOUT_SECONDS = 60
+
+configure_logging()
+log = logging.getLogger("router")
+
+app = Flask(__name__)
+CORS(app)
+
+CITIES = get_cities()
+client = get_http_client()
+for _city in CITIES:
+    client.configure(f"shard:{_city.name}", **SHARD_POLICY)
+fan_out_pool = ThreadPoolExecutor(FAN_OUT_THREADS, thread_name_prefix="router-fan-out")
+
+metrics = get_registry()
+ROUTED = metrics.counter("router_requests_total", "Requests by endpoint and how the router served them.",
+                         ("endpoint", "mode"))
+if ROUTER_WORKERS > 1:
+    metrics.share(ROUTER_METRICS_DIR)
+
+
+class FeedCache:
+    """Each city's last full feed (etag, array body without brackets) and the concatenation they make."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._feeds = {}      # city name -> (etag, inner body)
+        self._combined = None  # (etag, body)
+
+    def etag(self, city) -> str:
+        with self._lock:
+            return self._feeds.get(city.name, (None,))[0]
+
+    def update(self, city, etag: str, body: bytes):
+        inner = body.strip()[1:-1].strip()
+        with self._lock:
+            self._feeds[city.name] = (etag, inner)
+
+    def combined(self, cities: list) -> tuple:
+        """(etag, JSON array of every city's incidents, in city order)."""
+        with self._lock:
+            feeds = [self._feeds[city.name] for city in cities]
+            etag = "r-%08x" % zlib.crc32(" ".join(etag for etag, _ in feeds).encode())
+            if self._combined is None or self._combined[0] != etag:
+                self._combined = (etag, b"[" + b", ".join(inner for _, inner in feeds if inner) + b"]")
+            return self._combined
+
+
+feed_cache = FeedCache()
+
+
+# --- API Endpoints ---
+@app.route('/cities', methods=['GET'])
+def list_cities():
+    """The configured cities: name, label, HQ, map center and bounds (south, west, north, east)."""
+    return jsonify([{"name": city.name, "label": city.label, "hq": city.hq, "center": city.center,
+                     "bounds": city.bounds} for city in CITIES])
+
+@app.route('/get_sos_data', methods=['GET'])
+def get_sos_data():
+    """Full feed of every city, or (bbox and friends, see app.query_sos_data) a merged query page."""
+    try:
+        city = requested_city()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if city is not None:
+        return proxy(city, "get_sos_data")
+    if 'since' in request.args:
+        return jsonify({"error": "Deltas are per city: add city=<name> (see /cities)."}), 400
+    if any(name in request.args for name in ("bbox", "after", "before", "hours", "category", "min_severity",
+                                             "min_authenticity", "cursor", "limit", "view")):
+        return query_cities()
+    ROUTED.inc("get_sos_data", "fan_out")
+    responses = fan_out(CITIES, lambda city: call_shard(
+        city, "GET", "/get_sos_data", headers=with_etag({"Accept": "application/json"}, feed_cache.etag(city))))
+    for city, upstream in responses:
+        if isinstance(upstream, Exception) or upstream.status_code not in (200, 304):
+            return shard_failed(city, upstream)
+        if upstream.status_code == 200:
+            feed_cache.update(city, upstream.headers.get('ETag', '').strip('"'), upstream.content)
+    etag, body = feed_cache.combined(CITIES)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    return response
+
+def query_cities():
+    """
+    One page across the cities the bbox touches, in feed order (severity first; ties by city order).
+    Shards return each incident's own cursor (cursors=1), so the next page resumes every city
+    right after the last of its incidents this page used. The cursor is {city: shard cursor} in base64.
+    """
+    ROUTED.inc("get_sos_data", "fan_out")
+    try:
+        cities = cities_for_bbox(request.args.get('bbox'))
+        positions = decode_positions(request.args.get('cursor'))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if positions is not None:
+        cities = [city for city in cities if city.name in positions]   # the rest were used up
+    params = [(name, value) for name, value in request.args.items(multi=True)
+              if name not in ("city", "cursor", "cursors")]
+
+    def page(city):
+        cursor = (positions or {}).get(city.name)
+        return call_shard(city, "GET", "/get_sos_data", params=params + [("cursors", "1")] +
+                          ([("cursor", cursor)] if cursor else []), headers={"Accept": "application/json"})
+
+    pages = {}
+    for city, upstream in fan_out(cities, page):
+        if isinstance(upstream, Exception) or upstream.status_code != 200:
+            return shard_failed(city, upstream)
+        pages[city.name] = upstream.json()
+    streams = [[(decode_cursor(cursor), index, incident, cursor)
+                for incident, cursor in zip(pages[city.name]["incidents"], pages[city.name]["cursors"])]
+               for index, city in enumerate(cities)]
+    merged = list(heapq.merge(*streams, key=lambda item: (item[0][0], item[1], item[0][1])))
+    merged = merged[:max(1, min(limit, MAX_PAGE_SIZE))]
+
+    taken, resume = {}, dict(positions or {})
+    for _, index, _, cursor in merged:
+        taken[cities[index].name] = taken.get(cities[index].name, 0) + 1
+        resume[cities[index].name] = cursor
+    # Cities with incidents left keep a position (None = from the start); finished ones drop out.
+    next_positions = {city.name: resume.get(city.name) for city in cities
+                      if taken.get(city.name, 0) < len(pages[city.name]["incidents"]) or pages[city.name]["next_cursor"]}
+    body = {
+        "incidents": [incident for _, _, incident, _ in merged],
+        "total": sum(pages[city.name]["total"] for city in cities),
+        "next_cursor": encode_positions(next_positions) if next_positions else None,
+        "cities": {city.name: {"epoch": pages[city.name]["epoch"], "revision": pages[city.name]["revision"]}
+                   for city in cities},
+    }
+    etag = "r-%08x" % zlib.crc32(json.dumps(body, sort_keys=True).encode())
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = jsonify(body)
+    response.set_etag(etag)
+    return response
+
+@app.route('/get_sos_tiles', methods=['GET'])
+def get_sos_tiles():
+    """Tiles of the cities the bbox touches, merged per geohash cell (counts add up, positions weighted)."""
+    try:
+        city = requested_city()
+        cities = [city] if city is not None else cities_for_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if city is not None:
+        return proxy(city, "get_sos_tiles")
+    ROUTED.inc("get_sos_tiles", "fan_out")
+    params = list(request.args.items(multi=True))
+    cells, total, precision, etags = {}, 0, None, []
+    for city, upstream in fan_out(cities, lambda city: call_shard(city, "GET", "/get_sos_tiles", params=params)):
+        if isinstance(upstream, Exception) or upstream.status_code != 200:
+            return shard_failed(city, upstream)
+        tiles = upstream.json()
+        total, precision = total + tiles["total"], tiles["precision"]
+        etags.append(upstream.headers.get('ETag', ''))
+        for cell in tiles["cells"]:
+            merged = cells.get(cell["geohash"])
+            if merged is None:
+                cells[cell["geohash"]] = dict(cell)
+                continue
+            count = merged["count"] + cell["count"]
+            merged["lat"] = round((merged["lat"] * merged["count"] + cell["lat"] * cell["count"]) / count, 6)
+            merged["lng"] = round((merged["lng"] * merged["count"] + cell["lng"] * cell["count"]) / count, 6)
+            merged["count"] = count
+            merged["max_severity"] = max(merged["max_severity"], cell["max_severity"])
+    etag = "r-%08x" % zlib.crc32(" ".join(etags).encode())
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    response = jsonify({"precision": precision, "total": total,
+                        "cells": sorted(cells.values(), key=lambda cell: cell["geohash"])})
+    response.set_etag(etag)
+    return response
+
+@app.route('/sos_stream', methods=['GET'])
+def sos_stream():
+    """
+    Every city's /sos_stream (or city='s alone) as one event stream. Event ids encode each city's
+    last event id, so an EventSource reconnect resumes every city where it left off.
+    """
+    try:
+        city = requested_city()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    cities = [city] if city is not None else CITIES
+    try:
+        positions = decode_positions(request.headers.get('Last-Event-ID')) or {}
+    except ValueError:
+        positions = {}
+    ROUTED.inc("sos_stream", "fan_out")
+    events, stop = queue.Queue(), threading.Event()
+    readers = [threading.Thread(target=follow_shard, args=(city, positions.get(city.name), events, stop),
+                                name=f"router-stream-{city.name}", daemon=True) for city in cities]
+    for reader in readers:
+        reader.start()
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    city_name, event_id, lines = events.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_id is not None:
+                    positions[city_name] = event_id
+                yield "".join(line + "\n" for line in lines) + f"id: {encode_positions(positions)}\n\n"
+        finally:
+            stop.set()
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/report_incident', methods=['POST'])
+def report_incident():
+    """Goes to the city whose bounds hold the reported lat/lng."""
+    data = request.get_json(silent=True) or {}
+    try:
+        city = requested_city() or city_for_point(CITIES, float(data['lat']), float(data['lng']))
+    except (KeyError, TypeError, ValueError):
+        city = CITIES[0]   # let the shard report what is wrong with the request
+    if city is None:
+        return jsonify({"error": "Location is outside every configured city (see /cities)."}), 400
+    return proxy(city, "report_incident")
+
+@app.route('/get_route', methods=['GET'])
+@app.route('/get_nearby_places', methods=['GET'])
+def point_lookup():
+    """Served by the city holding the destination (lat/lng); the first city for points outside them all."""
+    try:
+        city = requested_city() or city_for_point(CITIES, float(request.args['lat']), float(request.args['lng']))
+    except (KeyError, ValueError):
+        city = None
+    return proxy(city or CITIES[0], request.endpoint)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """The router's own metrics (each shard serves its city's on /metrics?city=<name>)."""
+    if 'city' in request.args:
+        return default_route('metrics')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/<path:path>', methods=['GET', 'POST'])
+def default_route(path):
+    """Everything else belongs to one city: city= or the first one."""
+    try:
+        city = requested_city() or CITIES[0]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return proxy(city, path)
+
+
+# --- internal helpers ---
+def requested_city():
+    """The city= argument's city, None without one; raises ValueError for an unknown name."""
+    name = request.args.get('city')
+    return get_city(name) if name else None
+
+def call_shard(city, method: str, path: str, params=None, data=None, headers=None, stream: bool = False):
+    url = SHARD_URLS.get(city.name)
+    if url is None:
+        raise requests.exceptions.ConnectionError(f"No shard URL for city '{city.name}' (SHARD_URLS).")
+    return client.request(f"shard:{city.name}", method, url + path, idempotent=method == "GET",
+                          params=params, data=data, headers=headers, stream=stream)
+
+def proxy(city, endpoint: str):
+    """The request as it came, minus city=, answered by one shard."""
+    ROUTED.inc(endpoint, "proxy")
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    params = [(name, value) for name, value in request.args.items(multi=True) if name != "city"]
+    try:
+        upstream = call_shard(city, request.method, request.path, params=params,
+                              data=request.get_data() or None, headers=headers)
+    except requests.exceptions.RequestException as e:
+        return shard_failed(city, e)
+    return Response(upstream.content, status=upstream.status_code,
+                    headers=[(name, value) for name, value in upstream.headers.items()
+                             if name.lower() in RETURNED_HEADERS])
+
+def fan_out(cities: list, call) -> list:
+    """[(city, response or the exception it raised)] for call(city) run on every city at once."""
+    def attempt(city):
+        try:
+            return call(city)
+        except requests.exceptions.RequestException as e:
+            return e
+    return list(zip(cities, fan_out_pool.map(attempt, cities)))
+
+def shard_failed(city, outcome):
+    """An unreachable shard fails the whole merged response rather than silently dropping its city."""
+    if isinstance(outcome, Exception):
+        log.warning("Shard unreachable", extra={"city": city.name, "error": str(outcome)})
+        return jsonify({"error": f"City '{city.name}' is unavailable."}), 502
+    return Response(outcome.content, status=outcome.status_code, mimetype=outcome.headers.get('Content-Type'))
+
+def with_etag(headers: dict, etag: str) -> dict:
+    return {**headers, "If-None-Match": f'"{etag}"'} if etag else headers
+
+def cities_for_bbox(bbox: str) -> list:
+    """Cities whose bounds meet a south,west,north,east bbox (all of them without one)."""
+    if not bbox:
+        return list(CITIES)
+    try:
+        box = tuple(float(value) for value in bbox.split(','))
+    except ValueError:
+        raise ValueError("bbox must be four numbers: south,west,north,east.")
+    if len(box) != 4:
+        raise ValueError("bbox must be four numbers: south,west,north,east.")
+    return [city for city in CITIES if city.intersects(box)]
+
+def encode_positions(positions: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(positions, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_positions(token: str):
+    """{city name: shard cursor or event id} from encode_positions(); None without a token."""
+    if not token:
+        return None
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor '{token}'.") from e
+    if not isinstance(positions, dict):
+        raise ValueError(f"Invalid cursor '{token}'.")
+    return positions
+
+def follow_shard(city, event_id, events: queue.Queue, stop: threading.Event):
+    """Reads one city's /sos_stream into `events` as (city, id, lines) until stop, reconnecting as needed."""
+    while not stop.is_set():
+        try:
+            headers = {"Last-Event-ID": event_id} if event_id else {}
+            with call_shard(city, "GET", "/sos_stream", headers=headers, stream=True) as upstream:
+                lines, block_id = [], None
+                for line in upstream.iter_lines(decode_unicode=True):
+                    if stop.is_set():
+                        return
+                    if line:
+                        if line.startswith("id:"):
+                            block_id = line[3:].strip()
+                        elif not line.startswith(("retry:", ":")):
+                            lines.append(line)
+                        continue
+                    if block_id is not None:
+                        event_id = block_id
+                    if lines or block_id is not None:
+                        # A block with only an id moves this city's resume point without an event.
+                        events.put((city.name, block_id, lines))
+                    lines, block_id = [], None
+        except requests.exceptions.RequestException as e:
+            log.warning("Shard stream interrupted", extra={"city": city.name, "error": str(e)})
+        stop.wait(STREAM_RETRY_SECONDS)
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def create_app():
+    """ASGI app factory (see asgi.py); runs once in each router worker."""
+    from asgi import ExecutorWSGI
+    asgi_app = ExecutorWSGI(app, multiprocess=ROUTER_WORKERS > 1)
+    metrics.add_collector(asgi_app.collect_metrics)
+    return asgi_app
+
+
+def start_shards(cities: list, base_port: int, workers: int) -> tuple:
+    """One `asgi.py --city` server per city on consecutive ports; returns ({city: url}, processes)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    urls, processes = {}, []
+    for offset, city in enumerate(cities):
+        port = base_port + offset
+        urls[city.name] = f"http://127.0.0.1:{port}"
+        processes.append(subprocess.Popen(
+            [sys.executable, os.path.join(here, "asgi.py"), "--city", city.name, "--host", "127.0.0.1",
+             "--port", str(port), "--workers", str(workers)], start_new_session=True))
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    for name, url in urls.items():
+        while True:
+            try:
+                requests.get(url + "/fleet", timeout=1)
+                break
+            except requests.exceptions.RequestException:
+                if time.monotonic() > deadline:
+                    stop_shards(processes)
+                    raise RuntimeError(f"Shard for {name} did not come up on {url}")
+                time.sleep(0.1)
+    return urls, processes
+
+
+def stop_shards(processes: list):
+    for process in processes:
+        os.killpg(process.pid, signal.SIGTERM)   # uvicorn's workers are in the shard's process group
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve every configured city behind one endpoint.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=1, help="router worker processes")
+    parser.add_argument("--shard-workers", type=int, default=1, help="worker processes per city")
+    parser.add_argument("--shard-base-port", type=int, default=SHARD_BASE_PORT)
+    args = parser.parse_args()
+
+    import shutil
+    import uvicorn
+
+    urls, processes = start_shards(CITIES, args.shard_base_port, args.shard_workers)
+    os.environ.update({"SHARD_URLS": json.dumps(urls), "ROUTER_WORKERS": str(args.workers)})
+    shutil.rmtree(ROUTER_METRICS_DIR, ignore_errors=True)
+    log.info("Shards up", extra={"shards": urls})
+    # uvicorn re-raises SIGTERM once it has shut down; exit through `finally` so the shards go too.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        uvicorn.run("router:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                    access_log=False, log_level="warning")
+    finally:
+        stop_shards(processes)
@@ -0,0 +1,233 @@
+"""
+Offline routing engine for /get_route.
+
+Loads a road graph (road_graph.json, exported from the dashboard's
+MumbaiNavigationGraph.js, or any larger OSM-derived file in the same format)
+into compressed sparse row arrays, snaps the origin and destination to their
+nearest nodes and runs A* with a straight-line travel-time heuristic. Answers
+come back in the same shape the Directions API path of /get_route returns
+(distance text, duration text, encoded overview polyline).
+
+Graph file format:
+    {"nodes": [{"name", "lat", "lng"}, ...],
+     "edges": [[from, to], [from, to, {"length_m", "speed_kph", "oneway"}], ...]}
+"""
+import heapq
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# --- CONFIGURATION ---
+ROAD_GRAPH_FILE = "road_graph.json"
+DEFAULT_SPEED_KPH = 25.0      # average emergency-vehicle speed on city roads
+ROAD_DETOUR_FACTOR = 1.3      # real roads are longer than the straight segment between nodes
+ROUTE_CACHE_SIZE = 10000
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres; works on scalars or NumPy arrays."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def encode_polyline(points) -> str:
+    """Google's encoded polyline algorithm, for the frontend's @googlemaps/polyline-codec decoder."""
+    result = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_e5, lng_e5 = int(round(lat * 1e5)), int(round(lng * 1e5))
+        for delta in (lat_e5 - prev_lat, lng_e5 - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                result.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            result.append(chr(value + 63))
+        prev_lat, prev_lng = lat_e5, lng_e5
+    return "".join(result)
+
+
+def format_distance(metres: float) -> str:
+    return f"{metres / 1000:.1f} km" if metres >= 1000 else f"{int(round(metres))} m"
+
+
+def format_duration(seconds: float) -> str:
+    minutes = max(1, int(round(seconds / 60)))
+    if minutes < 60:
+        return f"{minutes} min" if minutes == 1 else f"{minutes} mins"
+    hours, minutes = divmod(minutes, 60)
+    hours_text = "1 hour" if hours == 1 else f"{hours} hours"
+    return hours_text if minutes == 0 else f"{hours_text} {minutes} mins"
+
+
+class RoadGraph:
+    """Array-backed road graph (CSR adjacency, edge weights in seconds) with A* and a route cache."""
+
+    def __init__(self, names: list, lats, lngs, edges: list, cache_size: int = ROUTE_CACHE_SIZE):
+        self.names = list(names)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self._cos_lat = math.cos(math.radians(float(self.lats.mean()))) if len(self.lats) else 1.0
+
+        # edges: (from_index, to_index, length_m, speed_kph)
+        order = sorted(edges, key=lambda e: e[0])
+        counts = np.bincount([e[0] for e in order], minlength=len(self.names))
+        self.offsets = np.zeros(len(self.names) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.targets = np.array([e[1] for e in order], dtype=np.int32)
+        self.lengths_m = np.array([e[2] for e in order], dtype=np.float32)
+        self.seconds = np.array([e[2] / (e[3] / 3.6) for e in order], dtype=np.float32)
+        self.max_speed_mps = max((e[3] for e in order), default=DEFAULT_SPEED_KPH) / 3.6
+
+        # Plain-list mirrors: scalar indexing into lists is much faster than into NumPy from Python loops.
+        self._offsets = self.offsets.tolist()
+        self._targets = self.targets.tolist()
+        self._seconds = self.seconds.tolist()
+        self._lengths = self.lengths_m.tolist()
+        self._lat_list = self.lats.tolist()
+        self._lng_list = self.lngs.tolist()
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @classmethod
+    def from_file(cls, path: str = ROAD_GRAPH_FILE, **options) -> "RoadGraph":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        names = [node["name"] for node in data["nodes"]]
+        index = {name: i for i, name in enumerate(names)}
+        lats = [node["lat"] for node in data["nodes"]]
+        lngs = [node["lng"] for node in data["nodes"]]
+        edges = []
+        for edge in data["edges"]:
+            a, b = index[edge[0]], index[edge[1]]
+            attrs = edge[2] if len(edge) > 2 else {}
+            length = attrs.get("length_m")
+            if length is None:
+                length = float(haversine_m(lats[a], lngs[a], lats[b], lngs[b])) * ROAD_DETOUR_FACTOR
+            speed = attrs.get("speed_kph", DEFAULT_SPEED_KPH)
+            edges.append((a, b, length, speed))
+            if not attrs.get("oneway"):
+                edges.append((b, a, length, speed))
+        return cls(names, lats, lngs, edges, **options)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def nearest_node(self, lat: float, lng: float) -> int:
+        dlat = self.lats - lat
+        dlng = (self.lngs - lng) * self._cos_lat
+        return int(np.argmin(dlat * dlat + dlng * dlng))
+
+    def shortest_path(self, source: int, target: int):
+        """A* over node indices. Returns (node path, metres, seconds) or None if unreachable."""
+        if source == target:
+            return [source], 0.0, 0.0
+        offsets, targets, seconds, lengths = self._offsets, self._targets, self._seconds, self._lengths
+        lats, lngs = self._lat_list, self._lng_list
+        goal_lat, goal_lng = lats[target], lngs[target]
+        cos_lat = self._cos_lat
+        # Equirectangular straight-line time to the goal at top speed never overestimates.
+        metres_per_degree = math.radians(1) * EARTH_RADIUS_M
+        inv_speed = 1.0 / self.max_speed_mps
+
+        def heuristic(node):
+            dy = lats[node] - goal_lat
+            dx = (lngs[node] - goal_lng) * cos_lat
+            return math.sqrt(dx * dx + dy * dy) * metres_per_degree * inv_speed * 0.999
+
+        best = {source: 0.0}
+        prev = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            for i in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[i]
+                new_cost = cost + seconds[i]
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    prev[neighbour] = (node, i)
+                    heapq.heappush(heap, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        else:
+            return None
+
+        path, metres = [target], 0.0
+        node = target
+        while node != source:
+            node, edge = prev[node]
+            metres += lengths[edge]
+            path.append(node)
+        path.reverse()
+        return path, metres, best[target]
+
+    def cached_path(self, source: int, target: int):
+        key = (source, target)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+        result = self.shortest_path(source, target)
+        with self._cache_lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> dict:
+        """
+        Route between two coordinates in /get_route's response shape, or None if the
+        snapped nodes are not connected. The stretches to and from the snapped nodes
+        are added as straight legs, like the dashboard's findPath does.
+        """
+        source = self.nearest_node(start_lat, start_lng)
+        target = self.nearest_node(end_lat, end_lng)
+        result = self.cached_path(source, target)
+        if result is None:
+            return None
+        path, metres, seconds = result
+
+        speed_mps = DEFAULT_SPEED_KPH / 3.6
+        for lat, lng, node in ((start_lat, start_lng, source), (end_lat, end_lng, target)):
+            leg = float(haversine_m(lat, lng, self._lat_list[node], self._lng_list[node])) * ROAD_DETOUR_FACTOR
+            metres += leg
+            seconds += leg / speed_mps
+
+        points = [(start_lat, start_lng)]
+        points += [(self._lat_list[node], self._lng_list[node]) for node in path]
+        points.append((end_lat, end_lng))
+        return {
+            "distance": format_distance(metres),
+            "duration": format_duration(seconds),
+            "overview_polyline": encode_polyline(points),
+            "distance_m": int(round(metres)),
+            "duration_s": int(round(seconds)),
+            "provider": "local",
+        }
+
+
+_shared_graph = None
+_shared_lock = threading.Lock()
+
+
+def get_road_graph(path: str = ROAD_GRAPH_FILE) -> RoadGraph:
+    """Process-wide graph, loaded on first use."""
+    global _shared_graph
+    with _shared_lock:
+        if _shared_graph is None:
+            _shared_graph = RoadGraph.from_file(path)
+        return _shared_graph
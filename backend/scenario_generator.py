@@ -0,0 +1,250 @@
+"""
+Vectorized large-scale incident generator for load testing.
+
+Builds incidents column by column with NumPy, a chunk at a time, so millions
+of records never sit in memory at once:
+    * spatial hotspots: each landmark of the city's gazetteer (cities.py) gets a
+      Dirichlet-drawn share of the traffic and its own Gaussian spread
+    * time-varying arrivals: a daily cycle plus random surges, sampled through
+      the inverse of the cumulative rate. Chunks cover consecutive slices of that
+      cumulative rate, so the output comes out in time order
+    * duplicate bursts: a share of incidents is re-reported a few times, close
+      by and minutes later, with `duplicate_of` pointing at the original
+
+Chunks are streamed to JSON Lines (one incident record per line, the same
+shape as preprocess_data.make_incident) or to a columnar directory: one
+part-NNNNN.npz per chunk plus manifest.json, with location and scenario
+dictionary-encoded like Parquet does.
+
+Run from backend/:
+    python scenario_generator.py --count 1000000 --out scenarios.jsonl
+    python scenario_generator.py --count 5000000 --format columnar --out scenarios/
+    CITY=pune CITIES_FILE=cities.json python scenario_generator.py --count 100000   # another configured city
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from cities import get_city
+from preprocess_data import SCENARIOS
+
+# --- CONFIGURATION ---
+CHUNK_SIZE = 100000
+HOURS = 2.0                   # incidents are spread over the HOURS before now
+DUPLICATE_RATE = 0.1          # share of records that are repeat reports
+MEAN_BURST = 3.0              # average repeats per duplicated incident
+SURGES = 3                    # random surges layered over the daily cycle
+RATE_BIN_SECONDS = 60
+HOTSPOT_CONCENTRATION = 0.7   # Dirichlet alpha; lower = more lopsided hotspots
+AUTHENTICITY_SCORES = np.array([3, 5, 7, 8, 9, 10], dtype=np.int8)
+AUTHENTICITY_WEIGHTS = np.array([5, 10, 20, 30, 20, 15], dtype=np.float64) / 100
+COLUMNS = {"id": "int64", "timestamp": "float64", "location": "int16", "scenario": "int16",
+           "lat": "float64", "lng": "float64", "authenticity_score": "int8", "duplicate_of": "int64"}
+
+
+class ScenarioGenerator:
+    def __init__(self, count: int, seed: int = 0, hours: float = HOURS, end_time: float = None,
+                 duplicate_rate: float = DUPLICATE_RATE, chunk_size: int = CHUNK_SIZE, city=None):
+        self.count = count
+        self.city = city or get_city()
+        self.chunk_size = chunk_size
+        self.duplicate_rate = duplicate_rate
+        self.rng = np.random.default_rng(seed)
+        self.end_time = end_time if end_time is not None else time.time()
+        self.start_time = self.end_time - hours * 3600
+
+        locations = self.city.gazetteer
+        self.loc_lat = np.array([loc["lat"] for loc in locations])
+        self.loc_lng = np.array([loc["lng"] for loc in locations])
+        self.loc_weight = self.rng.dirichlet(np.full(len(locations), HOTSPOT_CONCENTRATION))
+        self.loc_spread = self.rng.uniform(0.002, 0.008, size=len(locations))   # degrees
+        self.scenario_weight = self.rng.dirichlet(np.full(len(SCENARIOS), 2.0))
+        self._bin_edges, self._cumulative = self._rate_profile(hours)
+
+    def chunks(self):
+        """Yields dicts of equal-length column arrays (see COLUMNS), in time order."""
+        next_id = 1
+        for start in range(0, self.count, self.chunk_size):
+            size = min(self.chunk_size, self.count - start)
+            chunk = self._chunk(next_id, size, start / self.count, (start + size) / self.count)
+            next_id += size
+            yield chunk
+
+    # --- internal helpers ---
+    def _rate_profile(self, hours: float):
+        """Bin edges (s) and normalized cumulative arrival intensity over the horizon."""
+        bins = max(1, int(hours * 3600 / RATE_BIN_SECONDS))
+        edges = np.linspace(self.start_time, self.end_time, bins + 1)
+        centres = (edges[:-1] + edges[1:]) / 2
+        hour_of_day = (centres / 3600.0) % 24
+        rate = 1.0 + 0.6 * np.sin((hour_of_day - 9) / 24 * 2 * np.pi)    # busiest mid-afternoon
+        for _ in range(SURGES):
+            peak = self.rng.uniform(self.start_time, self.end_time)
+            width = self.rng.uniform(300, 1800)
+            rate += self.rng.uniform(1.0, 4.0) * np.exp(-0.5 * ((centres - peak) / width) ** 2)
+        cumulative = np.concatenate(([0.0], np.cumsum(rate)))
+        return edges, cumulative / cumulative[-1]
+
+    def _chunk(self, first_id: int, size: int, q_start: float, q_end: float) -> dict:
+        rng = self.rng
+        n_dup = int(size * self.duplicate_rate)
+        n_base = size - n_dup
+
+        quantiles = np.sort(rng.uniform(q_start, q_end, n_base))
+        timestamps = np.interp(quantiles, self._cumulative, self._bin_edges)
+        location = rng.choice(len(self.loc_weight), size=n_base, p=self.loc_weight).astype(np.int16)
+        scenario = rng.choice(len(SCENARIOS), size=n_base, p=self.scenario_weight).astype(np.int16)
+        spread = self.loc_spread[location]
+        lat = self.loc_lat[location] + rng.normal(0, 1, n_base) * spread
+        lng = self.loc_lng[location] + rng.normal(0, 1, n_base) * spread
+        duplicate_of = np.full(n_base, -1, dtype=np.int64)
+
+        if n_dup:
+            # Bursts: geometric repeat counts over randomly picked originals, trimmed to n_dup rows.
+            n_parents = max(1, int(np.ceil(n_dup / MEAN_BURST)))
+            parents = rng.choice(n_base, size=n_parents, replace=n_base < n_parents)
+            repeats = rng.geometric(1.0 / MEAN_BURST, size=n_parents)
+            source = np.repeat(parents, repeats)[:n_dup]
+            if len(source) < n_dup:
+                source = np.concatenate((source, rng.choice(parents, n_dup - len(source))))
+            timestamps = np.concatenate((timestamps, np.minimum(
+                timestamps[source] + rng.exponential(180.0, n_dup), self.end_time)))
+            location = np.concatenate((location, location[source]))
+            scenario = np.concatenate((scenario, scenario[source]))
+            lat = np.concatenate((lat, lat[source] + rng.normal(0, 0.0005, n_dup)))
+            lng = np.concatenate((lng, lng[source] + rng.normal(0, 0.0005, n_dup)))
+            duplicate_of = np.concatenate((duplicate_of, source))
+
+        order = np.argsort(timestamps, kind="stable")
+        ids = np.arange(first_id, first_id + size, dtype=np.int64)
+        rank = np.empty(size, dtype=np.int64)
+        rank[order] = np.arange(size)
+        # Re-point duplicates at their original's id after the time sort.
+        duplicate_of = np.where(duplicate_of >= 0, ids[rank[np.maximum(duplicate_of, 0)]], -1)
+        return {
+            "id": ids,
+            "timestamp": timestamps[order],
+            "location": location[order],
+            "scenario": scenario[order],
+            "lat": lat[order],
+            "lng": lng[order],
+            "authenticity_score": rng.choice(AUTHENTICITY_SCORES, size=size, p=AUTHENTICITY_WEIGHTS),
+            "duplicate_of": duplicate_of[order],
+        }
+
+
+def to_records(chunk: dict, city=None) -> list:
+    """Column chunk (generated for `city`, default this process's) -> incident dicts shaped like preprocess_data.make_incident."""
+    city = city or get_city()
+    scenarios = [(s["type"], s["severity"], s["desc"], s["needs"],
+                  "Critical" if s["severity"] >= 8 else "High" if s["severity"] >= 6 else "Moderate")
+                 for s in SCENARIOS]
+    records = []
+    columns = zip(chunk["id"].tolist(), chunk["timestamp"].tolist(), chunk["location"].tolist(),
+                  chunk["scenario"].tolist(), chunk["lat"].tolist(), chunk["lng"].tolist(),
+                  chunk["authenticity_score"].tolist(), chunk["duplicate_of"].tolist())
+    for incident_id, timestamp, loc_index, scenario_index, lat, lng, authenticity, duplicate_of in columns:
+        loc = city.gazetteer[loc_index]
+        category, severity, desc, needs, priority = scenarios[scenario_index]
+        record = {
+            "id": incident_id,
+            "original_message": f"SOS! {desc} at {loc['name']}.",
+            "category": category,
+            "priority": priority,
+            "severity_score": severity,
+            "authenticity_score": authenticity,
+            "location": f"{loc['name']}, {loc['area']}, {city.label}",
+            "coordinates": {"lat": lat, "lng": lng},
+            "need_type": needs,
+            "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+            "city": city.name,
+        }
+        if duplicate_of >= 0:
+            record["duplicate_of"] = duplicate_of
+        records.append(record)
+    return records
+
+
+# --- WRITERS / READERS ---
+def write_jsonl(chunks, path: str, city=None) -> int:
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.writelines(json.dumps(record) + "\n" for record in to_records(chunk, city))
+            written += len(chunk["id"])
+    return written
+
+
+def write_columnar(chunks, directory: str, city=None) -> int:
+    city = city or get_city()
+    os.makedirs(directory, exist_ok=True)
+    parts, written = [], 0
+    for number, chunk in enumerate(chunks):
+        name = f"part-{number:05d}.npz"
+        np.savez(os.path.join(directory, name), **chunk)
+        parts.append({"file": name, "rows": len(chunk["id"]),
+                      "min_timestamp": float(chunk["timestamp"][0]), "max_timestamp": float(chunk["timestamp"][-1])})
+        written += len(chunk["id"])
+    manifest = {
+        "columns": COLUMNS,
+        "dictionaries": {"location": [loc["name"] for loc in city.gazetteer], "scenario": [s["type"] for s in SCENARIOS]},
+        "rows": written,
+        "parts": parts,
+    }
+    with open(os.path.join(directory, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    return written
+
+
+def read_columnar(directory: str):
+    """Yields the column chunks written by write_columnar, in order."""
+    with open(os.path.join(directory, "manifest.json"), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    for part in manifest["parts"]:
+        with np.load(os.path.join(directory, part["file"])) as data:
+            yield {name: data[name] for name in manifest["columns"]}
+
+
+def iter_records(path: str):
+    """Incident records from a JSONL file or a columnar directory."""
+    if os.path.isdir(path):
+        for chunk in read_columnar(path):
+            yield from to_records(chunk)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def generate_incidents(count: int, seed: int = 0, **options) -> list:
+    """All records in memory; for small sets such as the demo snapshot."""
+    records = []
+    generator = ScenarioGenerator(count, seed=seed, **options)
+    for chunk in generator.chunks():
+        records += to_records(chunk, generator.city)
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic incidents at scale.")
+    parser.add_argument("--count", type=int, default=1000000)
+    parser.add_argument("--out", default="scenarios.jsonl")
+    parser.add_argument("--format", choices=("jsonl", "columnar"), default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--hours", type=float, default=HOURS)
+    parser.add_argument("--duplicate-rate", type=float, default=DUPLICATE_RATE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generator = ScenarioGenerator(args.count, seed=args.seed, hours=args.hours,
+                                  duplicate_rate=args.duplicate_rate, chunk_size=args.chunk_size)
+    started = time.perf_counter()
+    write = write_columnar if args.format == "columnar" else write_jsonl
+    rows = write(generator.chunks(), args.out)
+    seconds = time.perf_counter() - started
+    print(f"Wrote {rows} incidents to {args.out} in {seconds:.1f}s ({rows / seconds:,.0f} incidents/s).")
@@ -0,0 +1,200 @@
+"""
+Shared, scheduled cache for /get_situation_update.
+
+A background thread regenerates the report every `interval_seconds`; requests
+only ever read the cache. A stale report is served while a refresh runs
+(stale-while-revalidate), and refreshes are single-flight: however many
+requests arrive on a cold cache, exactly one LLM call is made and everyone
+waits for that one result.
+
+With `shared_path`, several worker processes share one report: whichever
+holds the lock file generates it and publishes it to `shared_path`, and the
+others read that file instead of calling the LLM themselves. If the
+generating process exits, another worker takes over on its next tick.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from file_lock import FileLock
+from incident_store import incident_category
+from metrics import get_registry
+
+# --- CONFIGURATION ---
+REPORT_INTERVAL_SECONDS = 300
+COLD_WAIT_SECONDS = 30          # how long a request waits for the very first report
+SITUATION_REPORT_FILE = "situation_report.json"   # shared copy when several server workers run
+FOLLOW_SECONDS = 2.0            # how often non-generating workers look for a newer shared report
+TOP_N = 5
+TREND_WINDOW = timedelta(hours=1)
+
+log = logging.getLogger(__name__)
+REFRESH_SECONDS = get_registry().histogram(
+    "situation_report_refresh_seconds", "Report refreshes: generated (leader) or read from the shared file (follower).",
+    ("role", "outcome"))
+REPORT_REQUESTS = get_registry().counter(
+    "situation_report_requests_total", "Reports served fresh, stale (refreshing in the background) or cold.",
+    ("result",))
+
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _area(incident: dict) -> str:
+    # Generated incidents carry "Landmark, Area, Mumbai"; reported ones only location_text.
+    parts = [part.strip() for part in str(incident.get("location") or "").split(",")]
+    if len(parts) >= 2:
+        return parts[1]
+    return incident.get("location_text") or parts[0] or "Unknown"
+
+
+def incident_aggregates(incidents: list, now: datetime = None) -> dict:
+    """Counts by category/area and the severity trend over the last hour vs. the hour before."""
+    now = now or datetime.now()
+    by_category, by_area = Counter(), Counter()
+    recent, previous = [], []
+    for incident in incidents:
+        by_category[incident_category(incident)] += 1
+        by_area[_area(incident)] += 1
+        reported_at = _parse_time(incident.get("timestamp"))
+        if reported_at is None:
+            continue
+        age = now - reported_at
+        if age <= TREND_WINDOW:
+            recent.append(incident.get("severity_score") or 0)
+        elif age <= 2 * TREND_WINDOW:
+            previous.append(incident.get("severity_score") or 0)
+
+    def mean(values):
+        return round(sum(values) / len(values), 2) if values else None
+
+    recent_avg, previous_avg = mean(recent), mean(previous)
+    if recent_avg is None or previous_avg is None:
+        direction = "unknown"
+    else:
+        direction = "rising" if recent_avg > previous_avg else "falling" if recent_avg < previous_avg else "steady"
+    return {
+        "open_incidents": len(incidents),
+        "critical_incidents": sum(1 for i in incidents if (i.get("severity_score") or 0) >= 8),
+        "top_categories": dict(by_category.most_common(TOP_N)),
+        "top_areas": dict(by_area.most_common(TOP_N)),
+        "severity_trend": {
+            "last_hour": {"count": len(recent), "avg_severity": recent_avg},
+            "previous_hour": {"count": len(previous), "avg_severity": previous_avg},
+            "direction": direction,
+        },
+    }
+
+
+class SituationReportCache:
+    def __init__(self, generate, interval_seconds: float = REPORT_INTERVAL_SECONDS,
+                 cold_wait_seconds: float = COLD_WAIT_SECONDS, shared_path: str = None):
+        self.generate = generate
+        self.interval_seconds = interval_seconds
+        self.cold_wait_seconds = cold_wait_seconds
+        self.shared_path = shared_path
+        self._leader_lock = FileLock(shared_path + ".lock") if shared_path else None
+        self._leader = shared_path is None
+        self._lock = threading.Lock()
+        self._report = None
+        self._generated_at = 0.0
+        self._inflight = None        # threading.Event of the refresh in progress, if any
+        self._scheduler = None
+        self.refresh_count = 0
+
+    def start(self):
+        """Warms the cache in the background and keeps it fresh on the configured interval."""
+        if self._scheduler is not None:
+            return
+        self._scheduler = threading.Thread(target=self._run_scheduler, name="situation-report", daemon=True)
+        self._scheduler.start()
+
+    def get(self) -> dict:
+        """The cached report; only waits when nothing has been generated yet."""
+        with self._lock:
+            report, generated_at = self._report, self._generated_at
+        if report is None:
+            REPORT_REQUESTS.inc("cold")
+            self._refresh_single_flight(wait=True)
+            with self._lock:
+                report, generated_at = self._report, self._generated_at
+            if report is None:
+                raise TimeoutError("Situation report is not ready yet.")
+        elif time.time() - generated_at > self.interval_seconds:
+            REPORT_REQUESTS.inc("stale")
+            self._refresh_single_flight(wait=False)   # serve stale, revalidate in the background
+        else:
+            REPORT_REQUESTS.inc("fresh")
+        age = time.time() - generated_at
+        return {**report, "generated_at": datetime.fromtimestamp(generated_at).isoformat(),
+                "stale": age > self.interval_seconds}
+
+    # --- internal helpers ---
+    def _run_scheduler(self):
+        while True:
+            if not self._leader:
+                self._leader = self._leader_lock.acquire(blocking=False)   # held for the process lifetime
+            self._refresh_single_flight(wait=True)
+            time.sleep(self.interval_seconds if self._leader else min(FOLLOW_SECONDS, self.interval_seconds))
+
+    def _refresh_single_flight(self, wait: bool):
+        with self._lock:
+            inflight = self._inflight
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight = threading.Event()
+        if leader:
+            worker = threading.Thread(target=self._refresh, args=(inflight,), daemon=True)
+            worker.start()
+        if wait:
+            inflight.wait(self.cold_wait_seconds)
+
+    def _refresh(self, done: threading.Event):
+        started, outcome = time.perf_counter(), "error"
+        try:
+            if self._leader:
+                report, generated_at = self.generate(), time.time()
+                if self.shared_path:
+                    self._publish(report, generated_at)
+            else:
+                report, generated_at = self._read_shared()
+            with self._lock:
+                if generated_at > self._generated_at:
+                    self._report = report
+                    self._generated_at = generated_at
+                    self.refresh_count += 1
+            outcome = "ok"
+        except Exception as e:
+            log.warning("Situation report refresh failed", extra={"error": str(e)})
+        finally:
+            REFRESH_SECONDS.observe(time.perf_counter() - started, "leader" if self._leader else "follower", outcome)
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+    def _publish(self, report: dict, generated_at: float):
+        tmp_path = f"{self.shared_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"report": report, "generated_at": generated_at}, f)
+        os.replace(tmp_path, self.shared_path)
+
+    def _read_shared(self):
+        """The published report; on a cold start waits (up to cold_wait_seconds) for the first one."""
+        deadline = time.monotonic() + self.cold_wait_seconds
+        while True:
+            try:
+                with open(self.shared_path, 'r', encoding='utf-8') as f:
+                    shared = json.load(f)
+                return shared["report"], shared["generated_at"]
+            except FileNotFoundError:
+                if self._report is not None or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.25)
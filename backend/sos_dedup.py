@@ -0,0 +1,224 @@
+"""
+Near-duplicate detection for incoming SOS messages, ahead of LLM analysis.
+
+During a large event the same incident is reported many times with small
+variations ("building collapsed near Dadar stn", "URGENT old bldg collapsed at
+Dadar Station!!"). Each message gets a MinHash signature over character
+5-grams of its normalized text, computed for a whole chunk at once with NumPy.
+LSH banding finds earlier clusters that may match; a candidate is accepted when
+the estimated Jaccard similarity clears the threshold, it was last reported
+within the time window, and the gazetteer places mentioned (if any) are within
+the radius. Only messages that open a new cluster need an LLM call. A message
+with less than a shingle of text left after normalization never matches
+anything: with no content to compare, it always opens a cluster of its own.
+"""
+import math
+import re
+import time
+from datetime import datetime
+
+import numpy as np
+
+from geocode_cache import ABBREVIATIONS, FILLER_WORDS, normalize_location
+from preprocess_data import LOCATIONS
+
+# --- CONFIGURATION ---
+SHINGLE_SIZE = 5              # characters per shingle; packed exactly into one uint64
+NUM_PERM = 64                 # MinHash permutations
+BANDS = 16                    # LSH bands of NUM_PERM / BANDS rows (~0.5 similarity threshold)
+SIMILARITY_THRESHOLD = 0.5
+WINDOW_SECONDS = 30 * 60      # a report this long after the last one starts a new incident
+RADIUS_KM = 1.0
+PURGE_EVERY = 1024            # assignments between sweeps of expired clusters
+MEMBER_SIGNATURES = 8         # reports per cluster kept for matching, so paraphrases chain together
+SEED = 1234
+
+NOISE_WORDS = {"sos", "help", "urgent", "urgently", "please", "pls", "plz", "asap", "emergency", "immediately",
+               "need", "needed", "send", "someone", "anyone", "hurry", "quick", "quickly", "here", "there",
+               "is", "are", "a", "an", "and", "we", "us", "our", "has", "have", "been", "reported"}
+# Unicode word characters, plus the Indic blocks (Devanagari to Malayalam) whose vowel signs \w does not match.
+_NON_WORD = re.compile(r"[^\w\u0900-\u0d7f]+|_+")
+
+
+def normalize_message(text: str) -> str:
+    """Lowercased, abbreviations expanded, filler and plea words dropped; any script, not just Latin."""
+    words = (ABBREVIATIONS.get(word, word) for word in _NON_WORD.sub(" ", (text or "").lower()).split())
+    return " ".join(word for word in words if word not in NOISE_WORDS and word not in FILLER_WORDS)
+
+
+def _parse_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value:
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _distance_km(a: tuple, b: tuple) -> float:
+    x = math.radians(b[1] - a[1]) * math.cos(math.radians((a[0] + b[0]) / 2))
+    y = math.radians(b[0] - a[0])
+    return 6371.0 * math.hypot(x, y)
+
+
+class SOSDeduplicator:
+    """
+    Streaming clusterer. assign() takes a chunk of message rows ({"id", "message",
+    optional "timestamp", "coordinates"}) and returns, for each row, the id of the
+    cluster it joined and whether it opened that cluster. Cluster ids are the id
+    of the first message in the cluster.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, num_perm: int = NUM_PERM, bands: int = BANDS,
+                 window_seconds: float = WINDOW_SECONDS, radius_km: float = RADIUS_KM, gazetteer: list = LOCATIONS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.window_seconds = window_seconds
+        self.radius_km = radius_km
+        rng = np.random.default_rng(SEED)
+        # Multiply-shift hashing: (a * x + b) >> 32 over wrapping uint64 arithmetic, a odd.
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 2 ** 63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+        self._places = self._build_places(gazetteer)
+
+        self._buckets = [{} for _ in range(bands)]   # band key -> [cluster id, ...]
+        self._clusters = {}    # cluster id -> {"signatures", "place", "last_seen", "count"}
+        self._since_purge = 0
+
+    # --- public API ---
+    def signatures(self, texts: list) -> np.ndarray:
+        """(len(texts), num_perm) uint32 MinHash signatures, one vectorized pass over the chunk."""
+        return self._minhash([normalize_message(text) for text in texts])
+
+    def assign(self, rows: list) -> list:
+        """[(cluster id, is_new)] for each row, in order; earlier rows in the chunk are visible to later ones."""
+        if not rows:
+            return []
+        normalized = [normalize_message(row["message"]) for row in rows]
+        signatures = self._minhash(normalized)
+        band_keys = self._band_keys(signatures)
+        results = []
+        for row, text, signature, keys in zip(rows, normalized, signatures, band_keys):
+            seen_at = _parse_timestamp(row.get("timestamp"))
+            place = self._place_of(row)
+            # Too little text to compare ("help!!", an emoji): its own cluster, and never indexed for matching.
+            contentful = len(text) >= SHINGLE_SIZE
+            cluster_id = self._match(signature, keys, seen_at, place) if contentful else None
+            if cluster_id is None:
+                cluster_id = row["id"]
+                self._clusters[cluster_id] = {"signatures": [signature], "place": place,
+                                              "last_seen": seen_at, "count": 1}
+                if contentful:
+                    self._index(cluster_id, keys)
+                results.append((cluster_id, True))
+            else:
+                cluster = self._clusters[cluster_id]
+                cluster["count"] += 1
+                cluster["last_seen"] = max(cluster["last_seen"], seen_at)
+                if len(cluster["signatures"]) < MEMBER_SIGNATURES:
+                    cluster["signatures"].append(signature)
+                    self._index(cluster_id, keys)
+                results.append((cluster_id, False))
+        self._since_purge += len(rows)
+        if self._since_purge >= PURGE_EVERY:
+            self.purge(max(c["last_seen"] for c in self._clusters.values()))
+        return results
+
+    def report_count(self, cluster_id) -> int:
+        cluster = self._clusters.get(cluster_id)
+        return cluster["count"] if cluster else 0
+
+    def purge(self, now: float = None):
+        """Forgets clusters that have been quiet for longer than the window."""
+        now = time.time() if now is None else now
+        expired = {cid for cid, c in self._clusters.items() if now - c["last_seen"] > self.window_seconds}
+        if expired:
+            for cid in expired:
+                del self._clusters[cid]
+            for bucket in self._buckets:
+                for key in list(bucket):
+                    live = [cid for cid in bucket[key] if cid not in expired]
+                    if live:
+                        bucket[key] = live
+                    else:
+                        del bucket[key]
+        self._since_purge = 0
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    # --- internal helpers ---
+    def _minhash(self, normalized: list) -> np.ndarray:
+        padded = [text.ljust(SHINGLE_SIZE).encode("utf-8") for text in normalized]
+        lengths = np.array([len(p) for p in padded], dtype=np.int64)
+        data = np.frombuffer(b"".join(padded), dtype=np.uint8).astype(np.uint64)
+
+        # Every SHINGLE_SIZE-byte window of the concatenation, packed into one integer...
+        span = len(data) - SHINGLE_SIZE + 1
+        shingles = np.zeros(span, dtype=np.uint64)
+        for offset in range(SHINGLE_SIZE):
+            shingles |= data[offset:offset + span] << np.uint64(8 * offset)
+        # ...keeping only windows that start and end inside a single message.
+        counts = lengths - SHINGLE_SIZE + 1
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        segment_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        keep = np.arange(counts.sum()) + np.repeat(starts - segment_starts, counts)
+        shingles = shingles[keep]
+
+        hashed = (shingles[:, None] * self._a + self._b) >> np.uint64(32)
+        return np.minimum.reduceat(hashed, segment_starts, axis=0).astype(np.uint32)
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        rows = self.num_perm // self.bands
+        banded = signatures.astype(np.uint64).reshape(len(signatures), self.bands, rows)
+        return (banded * self._band_mix).sum(axis=2)   # wraps; only used as a dict key
+
+    def _index(self, cluster_id, keys: np.ndarray):
+        for bucket, key in zip(self._buckets, keys.tolist()):
+            members = bucket.setdefault(key, [])
+            if cluster_id not in members:
+                members.append(cluster_id)
+
+    def _match(self, signature: np.ndarray, keys: np.ndarray, seen_at: float, place):
+        candidates = {cid for bucket, key in zip(self._buckets, keys.tolist()) for cid in bucket.get(key, ())}
+        if not candidates:
+            return None
+        candidates = [cid for cid in candidates if abs(seen_at - self._clusters[cid]["last_seen"]) <= self.window_seconds
+                      and self._near(place, self._clusters[cid]["place"])]
+        if not candidates:
+            return None
+        owners = [cid for cid in candidates for _ in self._clusters[cid]["signatures"]]
+        stacked = np.stack([sig for cid in candidates for sig in self._clusters[cid]["signatures"]])
+        similarity = (stacked == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        return owners[best] if similarity[best] >= self.threshold else None
+
+    def _near(self, a, b) -> bool:
+        return a is None or b is None or _distance_km(a, b) <= self.radius_km
+
+    def _place_of(self, row: dict):
+        coordinates = row.get("coordinates")
+        if coordinates:
+            return (coordinates["lat"], coordinates["lng"])
+        padded = f" {normalize_location(row['message'])} "
+        for alias, point in self._places:
+            if f" {alias} " in padded:
+                return point
+        return None
+
+    @staticmethod
+    def _build_places(gazetteer: list) -> list:
+        """(normalized alias, (lat, lng)), longest alias first so "andheri station" beats "andheri"."""
+        aliases = {}
+        for loc in gazetteer:
+            for alias in (loc["name"], loc.get("area", "")):
+                key = normalize_location(alias)
+                if key:
+                    aliases.setdefault(key, (loc["lat"], loc["lng"]))
+        return sorted(aliases.items(), key=lambda item: -len(item[0]))
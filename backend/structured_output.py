@@ -0,0 +1,266 @@
+"""
+Structured output for the Gemini calls: a tolerant, incremental JSON parser
+and small schemas the parsed replies are checked and coerced against.
+
+Replies are JSON most of the time, but not always only JSON: markdown
+fences, a sentence before or after, trailing commas, Python's True/None, or
+output cut off at the token limit. JSONStreamParser takes a reply in chunks
+as it streams, skips whatever is not JSON, and hands out each top-level
+object as soon as it closes (for a top-level array, each element), so a
+batch reply cut off half way still yields every analysis before the cut.
+close() closes and repairs a value left unfinished.
+
+validate() checks a parsed value against a schema ({field: Field}): values
+with one obvious reading are coerced ("7" -> 7, "life threatening" ->
+"Life-threatening", ["Medical"] -> "Medical"), missing optional fields get
+their default, unknown fields are dropped, and anything else raises
+SchemaError.
+
+    parser = JSONStreamParser()
+    for chunk in stream:
+        for item in parser.feed(chunk):
+            handle(validate(item, SCHEMA))
+    for item in parser.close():
+        handle(validate(item, SCHEMA))
+"""
+import json
+import re
+
+# --- CONFIGURATION ---
+_VALUE_START = re.compile(r"[{\[]")
+_STRING_STOP = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'[{}\[\]",]')
+_NON_SPACE = re.compile(r"\S")
+# Outside strings: trailing commas and Python literals. Strings are matched first and kept as they are.
+_REPAIRS = re.compile(r'("(?:\\.|[^"\\])*")|,(\s*[}\]])|\b(True|False|None)\b')
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class JSONStreamParser:
+    """Not thread-safe: one parser per reply."""
+
+    def __init__(self):
+        self.malformed = 0       # values dropped because even the repaired text did not parse
+        self._text = ""          # the unfinished top-level value, from its opening bracket
+        self._pos = 0            # how far _text has been scanned
+        self._stack = []         # open brackets, outermost first
+        self._opens = []         # ... and where each one is in _text
+        self._commas = []        # last comma in _text at each level (None before the first)
+        self._in_string = False
+        self._element = None     # where the current element of a top-level array starts
+
+    def feed(self, text: str) -> list:
+        """Adds the next chunk of the reply; returns the values it completed."""
+        items = []
+        self._text += text
+        text, i = self._text, self._pos
+        while i < len(text):
+            if not self._stack:
+                match = _VALUE_START.search(text, i)
+                if match is None:
+                    text, i = "", 0    # prose or fences between values
+                    break
+                text, i = text[match.start():], 1
+                self._stack, self._opens, self._commas, self._element = [text[0]], [0], [None], None
+                continue
+            if self._in_string:
+                match = _STRING_STOP.search(text, i)
+                if match is None:
+                    i = len(text)
+                elif match.group() == "\\":
+                    if match.start() + 1 >= len(text):
+                        i = match.start()   # the escaped character is in the next chunk
+                        break
+                    i = match.start() + 2
+                else:
+                    self._in_string = False
+                    i = match.start() + 1
+                continue
+            in_array = len(self._stack) == 1 and self._stack[0] == "["
+            # Only brackets, quotes and commas matter, plus where each element of a top-level array starts.
+            match = (_NON_SPACE if in_array and self._element is None else _STRUCTURAL).search(text, i)
+            if match is None:
+                i = len(text)
+                break
+            i = match.start()
+            char = text[i]
+            if char in "}]":
+                if len(self._stack) == 1:
+                    if in_array and self._element is not None:
+                        self._emit(text[self._element:i], items)
+                    elif not in_array:
+                        self._emit(text[:i + 1], items)
+                    self._stack = []
+                    text, i = text[i + 1:], 0
+                    continue
+                self._stack.pop()
+                self._opens.pop()
+                self._commas.pop()
+                if len(self._stack) == 1 and self._stack[0] == "[":
+                    self._emit(text[self._element:i + 1], items)   # an object/array element just closed
+                    self._element = None
+            elif char == ",":
+                self._commas[-1] = i
+                if in_array and self._element is not None:
+                    self._emit(text[self._element:i], items)
+                    self._element = None
+            else:
+                if in_array and self._element is None:
+                    self._element = i
+                if char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._stack.append(char)
+                    self._opens.append(i)
+                    self._commas.append(None)
+            i += 1
+        self._text, self._pos = text, i
+        return items
+
+    def close(self) -> list:
+        """The value the reply ended in the middle of, closed and repaired (or [] if nothing was left open)."""
+        items = []
+        if self._stack:
+            if self._stack[0] == "[":
+                if self._element is not None:
+                    self._emit_truncated(self._element, 1, items)
+            else:
+                self._emit_truncated(0, 0, items)
+        malformed = self.malformed
+        self.__init__()
+        self.malformed = malformed
+        return items
+
+    # --- internal helpers ---
+    def _emit(self, fragment: str, items: list):
+        value = _load(fragment)
+        if value is _MALFORMED:
+            self.malformed += 1
+        else:
+            items.append(value)
+
+    def _emit_truncated(self, start: int, level: int, items: list):
+        """Closes the value starting at _text[start] (nested `level` brackets deep) every way that may parse."""
+        text = self._text[start:] + ('"' if self._in_string else "")
+        closers = "".join(_CLOSERS[bracket] for bracket in reversed(self._stack[level:]))
+        candidates = []
+        body = text.rstrip().rstrip(",")
+        candidates.append(body + (" null" if body.endswith(":") else "") + closers)
+        if len(self._stack) > level:
+            # Drop the member cut off mid-way: back to the last comma at the innermost level,
+            # or to its opening bracket if it had none.
+            cut = self._commas[-1] if self._commas[-1] is not None else self._opens[-1] + 1
+            if cut >= start:
+                candidates.append(self._text[start:cut] + closers)
+        for candidate in candidates:
+            value = _load(candidate)
+            if value is not _MALFORMED:
+                items.append(value)
+                return
+        self.malformed += 1
+
+
+_MALFORMED = object()
+
+
+def _load(fragment: str):
+    try:
+        return json.loads(fragment, strict=False)
+    except ValueError:
+        pass
+    repaired = _REPAIRS.sub(lambda m: m.group(1) or m.group(2) or _LITERALS.get(m.group(3), ""), fragment)
+    try:
+        return json.loads(repaired, strict=False)
+    except ValueError:
+        return _MALFORMED
+
+
+def parse_json_values(text: str) -> list:
+    """Every value a whole reply holds (each element, for a top-level array)."""
+    parser = JSONStreamParser()
+    return parser.feed(text) + parser.close()
+
+
+class Field:
+    def __init__(self, kind: str = "string", required: bool = False, default=None, choices: tuple = None,
+                 minimum: float = None, maximum: float = None):
+        self.kind = kind            # "string", "integer" or "list" (of strings)
+        self.required = required
+        self.default = default
+        self.choices = choices      # allowed strings, matched ignoring case and punctuation
+        self.minimum = minimum      # integers are clamped into [minimum, maximum]
+        self.maximum = maximum
+
+    def coerce(self, name: str, value):
+        if self.kind == "integer":
+            return self._integer(name, value)
+        if self.kind == "list":
+            values = value if isinstance(value, list) else [value]
+            return [str(item).strip() for item in values if item is not None and str(item).strip()]
+        if self.choices:
+            for candidate in (value if isinstance(value, list) else [value]):
+                choice = _match_choice(str(candidate), self.choices)
+                if choice is not None:
+                    return choice
+            raise SchemaError(f"'{name}' must be one of {', '.join(self.choices)}; got {value!r}.")
+        if isinstance(value, list):
+            return ", ".join(str(item) for item in value)
+        if isinstance(value, dict):
+            raise SchemaError(f"'{name}' must be a string, not an object.")
+        return str(value).strip()
+
+    def _integer(self, name: str, value) -> int:
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            number = round(float(value.strip() if isinstance(value, str) else value))
+        except (TypeError, ValueError, OverflowError):
+            raise SchemaError(f"'{name}' must be an integer; got {value!r}.")
+        if self.minimum is not None:
+            number = max(number, self.minimum)
+        if self.maximum is not None:
+            number = min(number, self.maximum)
+        return number
+
+
+def _choice_key(text: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def _match_choice(value: str, choices: tuple):
+    key = _choice_key(value)
+    if not key:
+        return None
+    for choice in choices:
+        if _choice_key(choice) == key:
+            return choice
+    for choice in choices:
+        if key.startswith(_choice_key(choice)):   # "Life-threatening emergency"
+            return choice
+    return None
+
+
+def validate(value, schema: dict) -> dict:
+    """The schema's fields of `value`, coerced; raises SchemaError if it cannot be made to fit."""
+    if not isinstance(value, dict):
+        raise SchemaError(f"Expected an object, got {type(value).__name__}.")
+    result = {}
+    for name, field in schema.items():
+        raw = value.get(name)
+        if raw is None or raw == "" or raw == []:
+            if field.required:
+                raise SchemaError(f"Missing '{name}'.")
+            result[name] = list(field.default) if isinstance(field.default, list) else field.default
+            continue
+        try:
+            result[name] = field.coerce(name, raw)
+        except SchemaError:
+            if field.required:
+                raise
+            result[name] = list(field.default) if isinstance(field.default, list) else field.default
+    return result
@@ -0,0 +1,35 @@
+"""Run from backend/:  python -m pytest test_fleet.py"""
+import pytest
+
+from fleet import FleetRegistry
+
+UNITS = [
+    {"id": "fire-1", "type": "fire", "status": "IDLE", "lat": 19.0600, "lng": 72.8500},
+    {"id": "fire-9", "type": "fire", "status": "IDLE", "lat": 19.0700, "lng": 72.8600},
+]
+INCIDENTS = [
+    {"id": 13, "need_type": "Fire", "severity_score": 9, "coordinates": {"lat": 19.0650, "lng": 72.8550}},
+]
+
+
+def test_repeated_batch_does_not_dispatch_a_second_unit():
+    fleet = FleetRegistry(units=[dict(unit) for unit in UNITS])
+    first = fleet.dispatch_batch(INCIDENTS, commit=True)
+    assert [a["incident_id"] for a in first["assignments"]] == [13]
+
+    second = fleet.dispatch_batch(INCIDENTS, commit=True)
+    assert (second["assignments"], second["already_dispatched"]) == ([], [13])
+    assert sorted(unit["status"] for unit in fleet.all()) == ["DISPATCHED", "IDLE"]
+
+
+def test_incident_is_dispatched_again_once_its_unit_is_released():
+    fleet = FleetRegistry(units=[dict(unit) for unit in UNITS])
+    unit_id = fleet.dispatch_batch(INCIDENTS, commit=True)["assignments"][0]["unit_id"]
+    fleet.set_status(unit_id, "IDLE")
+    assert [a["incident_id"] for a in fleet.dispatch_batch(INCIDENTS)["assignments"]] == [13]
+
+
+def test_unknown_unit_status_is_a_value_error():
+    fleet = FleetRegistry(units=[dict(unit) for unit in UNITS])
+    with pytest.raises(ValueError):
+        fleet.set_status("fire-404", "IDLE")
@@ -0,0 +1,22 @@
+"""Run from backend/:  python -m pytest test_geocode_cache.py"""
+from geocode_cache import GeocodeCache
+
+
+def test_remembered_not_found_counts_as_a_miss(tmp_path):
+    fetched = []
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), fetch=lambda text: fetched.append(text))
+    assert cache.lookup("Nowhere Nagar") is None
+    assert cache.lookup("Nowhere Nagar") is None   # answered from memory, without fetching again
+    stats = cache.stats()
+    assert (len(fetched), stats["tiers"]["miss"]["count"], stats["tiers"]["memory"]["count"]) == (1, 2, 0)
+    assert stats["hit_rate"] == 0.0
+    cache.close()
+
+
+def test_reverse_names_gazetteer_landmarks_only(tmp_path):
+    cache = GeocodeCache(str(tmp_path / "geocode.sqlite3"), fetch=lambda text: {"lat": 19.2000, "lng": 72.9000},
+                         gazetteer=[{"name": "Dadar Station", "lat": 19.0180, "lng": 72.8430, "area": "Dadar"}])
+    cache.lookup("some shop near the big tree")
+    assert cache.reverse(19.2000, 72.9000) is None
+    assert cache.reverse(19.0185, 72.8430) == "Dadar Station"
+    cache.close()
@@ -0,0 +1,147 @@
+"""
+OutboundClient against fake_upstream.py with injected faults.
+
+Run from backend/:  python -m pytest test_http_client.py
+"""
+import threading
+import time
+
+import pytest
+import requests
+
+import fake_upstream
+from fake_upstream import FakeUpstream
+from http_client import BudgetExceededError, CircuitOpenError, OutboundClient
+
+FAST = {"timeout": (0.5, 0.5), "retries": 2, "failure_threshold": 100, "reset_seconds": 1.0,
+        "rate_per_second": 1000.0, "burst": 1000}
+HEALTHY = {"latency": 0.0, "jitter": 0.0, "error_rate": 0.0, "throttle_rate": 0.0, "stall_rate": 0.0}
+
+
+@pytest.fixture(scope="module")
+def server():
+    upstream = FakeUpstream().start()
+    yield upstream
+    upstream.stop()
+
+
+@pytest.fixture
+def upstream(server):
+    server.configure(**HEALTHY)
+    return server
+
+
+def geocode(client, upstream, address="Dadar Station, Mumbai"):
+    return client.get("geocoding", upstream.base_url + "/maps/api/geocode/json", params={"address": address})
+
+
+def calls(upstream, fn) -> int:
+    """Upstream requests made while running fn."""
+    before = upstream.requests
+    fn()
+    return upstream.requests - before
+
+
+def test_errors_are_retried_until_the_upstream_recovers(upstream, monkeypatch):
+    def recover(attempt, retry_after):   # the upstream comes back while the client backs off
+        upstream.configure(error_rate=0.0)
+        return 0.0
+
+    upstream.configure(error_rate=1.0)
+    monkeypatch.setattr(OutboundClient, "_backoff", staticmethod(recover))
+    client = OutboundClient({"geocoding": FAST})
+    responses = []
+    assert calls(upstream, lambda: responses.append(geocode(client, upstream))) == 2
+    assert responses[0].status_code == 200
+    assert client.stats()["geocoding"]["retries"] == 1
+
+
+def test_persistent_errors_return_the_last_response_after_every_retry(upstream):
+    upstream.configure(error_rate=1.0)
+    client = OutboundClient({"geocoding": FAST})
+    responses = []
+    assert calls(upstream, lambda: responses.append(geocode(client, upstream))) == 3
+    assert responses[0].status_code == 500
+    assert (client.stats()["geocoding"]["retries"], client.stats()["geocoding"]["failures"]) == (2, 1)
+
+
+def test_throttled_calls_wait_for_retry_after(upstream):
+    upstream.configure(throttle_rate=1.0)   # 429 with Retry-After: 0.1
+    client = OutboundClient({"geocoding": {**FAST, "retries": 1}})
+    started = time.perf_counter()
+    assert geocode(client, upstream).status_code == 429
+    assert time.perf_counter() - started >= 0.1
+
+
+def test_stalled_upstream_times_out(upstream, monkeypatch):
+    monkeypatch.setattr(fake_upstream, "STALL_SECONDS", 1.0)
+    upstream.configure(stall_rate=1.0)
+    client = OutboundClient({"geocoding": {**FAST, "timeout": (0.5, 0.2), "retries": 0}})
+    with pytest.raises(requests.exceptions.Timeout):
+        geocode(client, upstream)
+
+
+def test_circuit_opens_then_half_opens_for_one_trial(upstream):
+    upstream.configure(error_rate=1.0)
+    client = OutboundClient({"geocoding": {**FAST, "retries": 0, "failure_threshold": 2, "reset_seconds": 0.2}})
+    geocode(client, upstream)
+    geocode(client, upstream)
+    assert client.stats()["geocoding"]["circuit"] == "open"
+    before = upstream.requests
+    with pytest.raises(CircuitOpenError):
+        geocode(client, upstream)
+    assert upstream.requests == before   # short-circuited without a call
+
+    time.sleep(0.25)
+    assert client.stats()["geocoding"]["circuit"] == "half-open"
+    assert geocode(client, upstream).status_code == 500   # the trial call fails: open again
+    assert client.stats()["geocoding"]["circuit"] == "open"
+
+    time.sleep(0.25)
+    upstream.configure(error_rate=0.0)
+    assert geocode(client, upstream).status_code == 200   # the trial call succeeds: closed
+    assert client.stats()["geocoding"]["circuit"] == "closed"
+
+
+def test_token_bucket_limits_bursts(upstream):
+    client = OutboundClient({"geocoding": {**FAST, "rate_per_second": 1.0, "burst": 2, "max_wait_seconds": 0.0}})
+    geocode(client, upstream, "Dadar")
+    geocode(client, upstream, "Andheri")
+    before = upstream.requests
+    with pytest.raises(BudgetExceededError):
+        geocode(client, upstream, "Kurla")
+    assert upstream.requests == before
+    assert client.stats()["geocoding"]["throttled"] == 1
+
+
+def test_token_bucket_waits_for_a_token_within_max_wait(upstream):
+    client = OutboundClient({"geocoding": {**FAST, "rate_per_second": 10.0, "burst": 1, "max_wait_seconds": 1.0}})
+    started = time.perf_counter()
+    geocode(client, upstream, "Dadar")
+    geocode(client, upstream, "Andheri")
+    assert time.perf_counter() - started >= 0.09
+
+
+def test_daily_quota(upstream):
+    client = OutboundClient({"geocoding": {**FAST, "daily_quota": 1}})
+    geocode(client, upstream, "Dadar")
+    with pytest.raises(BudgetExceededError):
+        geocode(client, upstream, "Andheri")
+
+
+def test_identical_concurrent_gets_share_one_upstream_call(upstream):
+    upstream.configure(latency=0.3)
+    client = OutboundClient({"geocoding": FAST})
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(geocode(client, upstream).status_code))
+               for _ in range(8)]
+
+    def run():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert calls(upstream, run) == 1
+    assert statuses == [200] * 8
+    assert client.stats()["geocoding"]["coalesced"] == 7
@@ -0,0 +1,46 @@
+"""Run from backend/:  python -m pytest test_ingest_pipeline.py"""
+from incident_store import IncidentStore
+from ingest_pipeline import IngestPipeline, merge_into_store
+from ingest_stubs import StubGeocoder, StubLLM
+from sos_dedup import SOSDeduplicator
+
+MESSAGES = [
+    "Building collapsed near Dadar station, people trapped",
+    "Fire at Andheri station, people trapped inside",
+    "URGENT building collapsed near Dadar stn!! people trapped",
+    "fire at andheri station people trapped inside!!",
+    "building collapsed near Dadar station people trapped please help",
+    "Kurla market flooded, need food",
+]
+
+
+def test_repeats_in_later_chunks_are_merged_into_the_stored_incident(tmp_path):
+    path = str(tmp_path / "processed_data.json")
+    store = IncidentStore(path)
+    store.load(missing_ok=True)
+    llm = StubLLM(call_seconds=0, per_message_seconds=0)
+    pipeline = IngestPipeline(llm.analyze_batch, llm.analyze_one, StubGeocoder(latency_seconds=0).geocode, store.add,
+                              batch_size=1, dedup=SOSDeduplicator(), dedup_chunk=2,
+                              on_duplicate=merge_into_store(store))
+    rows = [{"id": index, "message": message, "timestamp": f"2026-10-18T10:{index:02d}:00"}
+            for index, message in enumerate(MESSAGES)]
+    stats = pipeline.run(iter(rows))
+    assert (stats["ingested"], stats["duplicates"]) == (3, 3)
+
+    def reports(store):
+        return {i["id"]: (i.get("report_count"), i.get("duplicate_ids"), i.get("last_reported")) for i in store.snapshot()}
+
+    expected = {0: (3, [2, 4], "2026-10-18T10:04:00"), 1: (2, [3], "2026-10-18T10:03:00"), 5: (1, None, None)}
+    assert reports(store) == expected
+    store.journal.close()
+
+    reloaded = IncidentStore(path)   # merges are journaled, so they survive a restart...
+    reloaded.load()
+    assert reports(reloaded) == expected
+    reloaded.journal.compact()       # ...and compaction
+    reloaded.journal.wait_for_compaction()
+    reloaded.journal.close()
+    compacted = IncidentStore(path)
+    compacted.load()
+    assert reports(compacted) == expected
+    compacted.journal.close()
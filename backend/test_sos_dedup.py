@@ -0,0 +1,35 @@
+"""Run from backend/:  python -m pytest test_sos_dedup.py"""
+from sos_dedup import SOSDeduplicator, normalize_message
+
+HINDI = [
+    "मदद करो, हमारे घर में पानी भर गया है, दादर",
+    "कुर्ला में इमारत गिर गई, लोग फंसे हैं",
+    "अंधेरी स्टेशन के पास आग लगी है",
+]
+
+
+def rows(messages: list) -> list:
+    return [{"id": index + 1, "message": message, "timestamp": 1000.0 + index} for index, message in enumerate(messages)]
+
+
+def test_non_latin_messages_keep_their_text():
+    assert normalize_message(HINDI[0]) == "मदद करो हमारे घर में पानी भर गया है दादर"
+
+
+def test_distinct_non_latin_messages_are_not_merged():
+    assert SOSDeduplicator().assign(rows(HINDI)) == [(1, True), (2, True), (3, True)]
+
+
+def test_non_latin_repeat_is_merged():
+    assert SOSDeduplicator().assign(rows([HINDI[2], HINDI[2] + "!!"])) == [(1, True), (1, False)]
+
+
+def test_messages_without_content_never_match():
+    results = SOSDeduplicator().assign(rows(["HELP!!", "help please", "SOS", "🙏🙏", "help"]))
+    assert results == [(1, True), (2, True), (3, True), (4, True), (5, True)]
+
+
+def test_latin_paraphrase_is_still_merged():
+    results = SOSDeduplicator().assign(rows(["building collapsed near Dadar stn",
+                                             "URGENT building collapsed near Dadar Station!!"]))
+    assert results == [(1, True), (1, False)]
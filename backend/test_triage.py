@@ -0,0 +1,31 @@
+"""Run from backend/:  python -m pytest test_triage.py"""
+import pytest
+
+from triage import get_triage
+
+HARMLESS = [
+    "Happy birthday to my friend from Powai Lake",
+    "Traffic is slow near Dadar Station today",
+    "Win a free prize near Andheri Station click here",
+]
+
+
+@pytest.mark.parametrize("text", HARMLESS)
+def test_messages_without_a_keyword_go_to_the_llm(text):
+    result = get_triage().classify(text)
+    assert (result["keywords"], result["confident"], result["escalate"]) == ([], False, True)
+
+
+def test_label_and_need_type_come_from_the_same_rule():
+    result = get_triage().classify("Need food for 20 people at Dharavi")
+    assert (result["label"], result["need_type"]) == ("Food Supplies", "Food")
+
+
+def test_clear_report_is_answered_locally():
+    result = get_triage().classify("Massive fire broke out near Dadar Station, people trapped")
+    assert (result["urgency"], result["need_type"], result["escalate"]) == ("Life-threatening", "Rescue", False)
+
+
+def test_unnamed_place_escalates_but_is_not_low_confidence():
+    result = get_triage().classify("Massive fire broke out in our building, people trapped")
+    assert (result["location"], result["confident"], result["escalate"]) == (None, True, True)
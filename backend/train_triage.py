@@ -0,0 +1,239 @@
+"""
+Trains the local triage model (triage_model.npz) used by triage.py.
+
+Training examples come from, in order of trust:
+    1. labeled incident records (--labels, JSON list or JSONL), e.g. pipeline
+       output or processed_data.json: original_message + urgency/need_type/
+       authenticity_score, or the generator's category/priority fields
+    2. raw messages (--messages, sos_messages.csv) joined to those labels by id,
+       or weakly labeled from the keyword lexicon when no label exists
+    3. synthetic reports built from the SCENARIOS x LOCATIONS templates, plus
+       negatives: everyday chatter that names a place (Minor / no need) and
+       spam-style messages (the same, and not credible)
+
+Each head is a softmax (or logistic) regression over hashed word/bigram
+features, fitted with full-batch gradient descent on a sparse matrix.
+HOLDOUT_SHARE of the examples are kept out of training; accuracy is reported
+on them, and the confidence threshold for answering without the LLM
+(stored in the model as escalate_below) is the lowest one at which the
+held-out messages answered locally reach TARGET_PRECISION.
+
+Run from backend/:
+    python train_triage.py --messages sos_messages.csv --labels processed_data.json
+"""
+import argparse
+import json
+import random
+
+import numpy as np
+
+from incident_store import MIN_AUTHENTICITY_SCORE
+from ingest_pipeline import read_messages
+from preprocess_data import LOCATIONS, SCENARIOS
+from triage import (LEXICON_FILE, MODEL_FILE, N_FEATURES, NEED_CLASSES, NO_NEED, URGENCY_CLASSES,
+                    TriageClassifier, hashed_features)
+
+# --- CONFIGURATION ---
+EPOCHS = 300
+LEARNING_RATE = 2.0
+L2 = 1e-4
+SYNTHETIC_PER_TEMPLATE = 6
+SEED = 42
+HOLDOUT_SHARE = 0.2
+TARGET_PRECISION = 0.95     # held-out messages answered locally that must get urgency and need_type right
+THRESHOLDS = [0.5 + 0.025 * i for i in range(19)]   # 0.5 .. 0.95
+
+# Generator category -> (urgency, need_type) in the LLM's vocabulary.
+SCENARIO_LABELS = {
+    "Medical Emergency": ("Life-threatening", "Medical"),
+    "Fire": ("Life-threatening", "Rescue"),
+    "Accident": ("Urgent", "Medical"),
+    "Flooding": ("Urgent", "Infrastructure"),
+    "Riot Control": ("Urgent", "Rescue"),
+    "Structure Collapse": ("Life-threatening", "Rescue"),
+    "Gas Leak": ("Life-threatening", "Rescue"),
+    "Animal Rescue": ("Minor", "Rescue"),
+    "Tree Fall": ("Minor", "Infrastructure"),
+}
+PRIORITY_URGENCY = {"Critical": "Life-threatening", "High": "Urgent", "Moderate": "Minor"}
+SPAM_TEMPLATES = [
+    "Click here to donate for {place} flood victims http://bit.ly/xyz",
+    "Forward this to 10 groups! Free recharge for everyone near {place}",
+    "You have won a lottery prize, claim at www.example.com before the floods",
+    "Send bitcoin to help {place}!!! whatsapp this now",
+    "Government giving free money near {place}, forward to all",
+]
+BENIGN_TEMPLATES = [
+    "Happy birthday to my friend from {place}",
+    "Traffic is slow near {place} today",
+    "Stuck in traffic near {place}, will be late for dinner",
+    "Lovely evening at {place}, the rain has finally stopped",
+    "Meeting friends at {place} for coffee",
+    "Anyone know a good restaurant near {place}?",
+    "Shops near {place} are closed for the holiday",
+    "Great match today, the crowd at {place} was amazing",
+    "Morning walk at {place}, weather is pleasant",
+    "Just moved to a new flat near {place}",
+    "Long queue at the ticket counter at {place}",
+    "Watching the fireworks from {place} tonight",
+]
+PREFIXES = ["SOS!", "Help!", "URGENT:", "Please help,", "", "Emergency -"]
+SUFFIXES = ["", "Please send help!", "pls hurry", "Need help ASAP.", "#MumbaiRains"]
+
+
+def load_labels(paths: list) -> list:
+    """Incident records from JSON list / JSONL files."""
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+        if text.startswith("["):
+            records += json.loads(text)
+        else:
+            records += [json.loads(line) for line in text.splitlines() if line.strip()]
+    return records
+
+
+def label_of(record: dict):
+    """(urgency, need_type, credible) from an incident record, or None if it carries no usable labels."""
+    urgency, need_type = record.get("urgency"), record.get("need_type")
+    if isinstance(need_type, list):
+        need_type = None
+    if urgency not in URGENCY_CLASSES or need_type not in NEED_CLASSES:
+        scenario = SCENARIO_LABELS.get(record.get("category"))
+        if scenario is None:
+            return None
+        urgency = PRIORITY_URGENCY.get(record.get("priority"), scenario[0])
+        need_type = scenario[1]
+    credible = (record.get("authenticity_score") or 0) >= MIN_AUTHENTICITY_SCORE
+    return urgency, need_type, credible
+
+
+def synthetic_examples(per_template: int = SYNTHETIC_PER_TEMPLATE) -> list:
+    examples = []
+    for scenario in SCENARIOS:
+        urgency, need_type = SCENARIO_LABELS[scenario["type"]]
+        for _ in range(per_template):
+            loc = random.choice(LOCATIONS)
+            text = f"{random.choice(PREFIXES)} {scenario['desc']} at {loc['name']}. {random.choice(SUFFIXES)}"
+            examples.append((text, urgency, need_type, True))
+    for templates, credible in ((BENIGN_TEMPLATES, True), (SPAM_TEMPLATES, False)):
+        for template in templates:
+            for _ in range(per_template):
+                examples.append((template.format(place=random.choice(LOCATIONS)["name"]), "Minor", NO_NEED, credible))
+    return examples
+
+
+def build_examples(message_paths: list, label_paths: list) -> list:
+    """[(text, urgency or None, need_type or None, credible)]"""
+    records = load_labels(label_paths)
+    by_id = {str(r.get("id")): r for r in records}
+    examples = []
+    for record in records:
+        label = label_of(record)
+        if label and record.get("original_message"):
+            examples.append((record["original_message"], *label))
+
+    lexicon_only = TriageClassifier(json.load(open(LEXICON_FILE, 'r', encoding='utf-8')))
+    for path in message_paths:
+        for row in read_messages(path):
+            record = by_id.get(str(row.get("id")))
+            label = label_of(record) if record and record.get("original_message") == row["message"] else None
+            if label:
+                continue   # already added from the labels file
+            weak = lexicon_only.classify(row["message"])
+            if weak["keywords"]:
+                examples.append((row["message"], weak["urgency"], weak["need_type"], not weak["spam"]))
+    return examples + synthetic_examples()
+
+
+def fit_softmax(features, labels: np.ndarray, n_classes: int, epochs: int = EPOCHS) -> tuple:
+    n = features.shape[0]
+    weights = np.zeros((n_classes, features.shape[1]), dtype=np.float64)
+    bias = np.zeros(n_classes)
+    targets = np.eye(n_classes)[labels]
+    for _ in range(epochs):
+        logits = np.asarray(features @ weights.T) + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        error = (probs - targets) / n
+        weights -= LEARNING_RATE * (np.asarray((features.T @ error).T) + L2 * weights)
+        bias -= LEARNING_RATE * error.sum(axis=0)
+    return weights.astype(np.float32), bias.astype(np.float32)
+
+
+def fit_logistic(features, labels: np.ndarray, epochs: int = EPOCHS) -> tuple:
+    n = features.shape[0]
+    weights = np.zeros(features.shape[1])
+    bias = 0.0
+    for _ in range(epochs):
+        probs = 1.0 / (1.0 + np.exp(-(features @ weights + bias)))
+        error = (probs - labels) / n
+        weights -= LEARNING_RATE * (features.T @ error + L2 * weights)
+        bias -= LEARNING_RATE * error.sum()
+    return weights.astype(np.float32), np.float32(bias)
+
+
+def train(examples: list, n_features: int = N_FEATURES) -> dict:
+    labeled = [e for e in examples if e[1] is not None]
+    texts = [e[0] for e in labeled]
+    features = hashed_features(texts, n_features).astype(np.float64)
+    urgency_w, urgency_b = fit_softmax(features, np.array([URGENCY_CLASSES.index(e[1]) for e in labeled]),
+                                       len(URGENCY_CLASSES))
+    need_w, need_b = fit_softmax(features, np.array([NEED_CLASSES.index(e[2]) for e in labeled]), len(NEED_CLASSES))
+
+    all_features = hashed_features([e[0] for e in examples], n_features).astype(np.float64)
+    auth_w, auth_b = fit_logistic(all_features, np.array([1.0 if e[3] else 0.0 for e in examples]))
+    return {
+        "n_features": np.int64(n_features),
+        "urgency_classes": np.array(URGENCY_CLASSES), "urgency_weights": urgency_w, "urgency_bias": urgency_b,
+        "need_classes": np.array(NEED_CLASSES), "need_weights": need_w, "need_bias": need_b,
+        "auth_weights": auth_w, "auth_bias": auth_b,
+    }
+
+
+def split_holdout(examples: list, share: float = HOLDOUT_SHARE) -> tuple:
+    """(training, held-out) after a shuffle; call random.seed first for a repeatable split."""
+    shuffled = list(examples)
+    random.shuffle(shuffled)
+    cut = int(len(shuffled) * share)
+    return shuffled[cut:], shuffled[:cut]
+
+
+def evaluate(classifier: TriageClassifier, examples: list) -> dict:
+    """Accuracy of both heads on `examples`, and the threshold at which locally answered ones reach TARGET_PRECISION."""
+    texts = [e[0] for e in examples]
+    predictions = classifier.classify_batch(texts)
+    correct = [(p["urgency"], p["need_type"]) == (e[1], e[2]) for p, e in zip(predictions, examples)]
+    report = {"urgency": np.mean([p["urgency"] == e[1] for p, e in zip(predictions, examples)]),
+              "need_type": np.mean([p["need_type"] == e[2] for p, e in zip(predictions, examples)]),
+              "threshold": THRESHOLDS[-1], "precision": None, "local_share": 0.0}
+    for threshold in THRESHOLDS:
+        classifier.escalate_below = threshold
+        local = [ok for ok, p in zip(correct, classifier.classify_batch(texts)) if p["confident"]]
+        if local and np.mean(local) >= TARGET_PRECISION:
+            report.update(threshold=threshold, precision=np.mean(local), local_share=len(local) / len(examples))
+            break
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local triage model.")
+    parser.add_argument("--messages", nargs="*", default=["sos_messages.csv"], help="raw CSV/JSONL messages")
+    parser.add_argument("--labels", nargs="*", default=["processed_data.json"], help="labeled incident records")
+    parser.add_argument("--output", default=MODEL_FILE)
+    args = parser.parse_args()
+
+    random.seed(SEED)
+    training, held_out = split_holdout(build_examples(args.messages, args.labels))
+    model = train(training)
+    report = evaluate(TriageClassifier(json.load(open(LEXICON_FILE, 'r', encoding='utf-8')), model), held_out)
+    model["escalate_below"] = np.float32(report["threshold"])
+    np.savez_compressed(args.output, **model)
+
+    precision = "n/a" if report["precision"] is None else f"{report['precision']:.2f}"
+    print(f"Trained on {len(training)} examples, held out {len(held_out)}. "
+          f"Held-out accuracy: urgency {report['urgency']:.2f}, need_type {report['need_type']:.2f}. "
+          f"Escalating below {report['threshold']:.3f}: {report['local_share']:.0%} answered locally, "
+          f"precision {precision}. Saved {args.output}.")
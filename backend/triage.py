@@ -0,0 +1,269 @@
+"""
+Local triage for SOS messages: the fast path between keyword checks and Gemini.
+
+Two parts, both cheap enough to run on every message:
+    1. An Aho-Corasick automaton over the keyword lexicon (triage_lexicon.json)
+       and the landmark gazetteer, so every keyword and place in a message is
+       found in one pass over its text.
+    2. A hashed word/bigram logistic regression (triage_model.npz, trained by
+       train_triage.py) predicting urgency, need_type and an authenticity prior.
+       A batch of messages is one sparse matrix product per head.
+
+Lexicon hits push the model's logits towards the rule's classes, and the
+first matched rule sets need_type and label together. A message is answered
+locally (`confident`) only when a rule matched, both heads clear the
+threshold train_triage.py picked on held-out data, and the need head does not
+read it as no emergency at all. It is escalated to the LLM when it is not
+confident or no known place was found; everything else is answered locally in
+the same shape Gemini returns.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import deque
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from cities import get_city
+from geocode_cache import normalize_location
+from preprocess_data import LOCATIONS
+
+# --- CONFIGURATION ---
+LEXICON_FILE = "triage_lexicon.json"
+MODEL_FILE = "triage_model.npz"
+N_FEATURES = 2 ** 15
+LEXICON_BOOST = 2.0          # logit added per matched rule
+SPAM_PENALTY = 2.0           # authenticity logit removed per spam keyword
+ESCALATE_BELOW = 0.6         # minimum confidence to answer without the LLM, unless the model stores its own
+NO_NEED = "None"             # need head's class for chatter and spam; never answered locally
+URGENCY_CLASSES = ["Life-threatening", "Urgent", "Minor"]
+NEED_CLASSES = ["Rescue", "Medical", "Food", "Shelter", "Supplies", "Infrastructure", NO_NEED]
+URGENCY_SEVERITY = {"Life-threatening": 9, "Urgent": 6, "Minor": 3}
+DEFAULT_LABELS = {"Medical": "Medical Support", "Rescue": "Rescue Team", "Food": "Food Supplies",
+                  "Shelter": "Shelter", "Supplies": "Relief Supplies", "Infrastructure": "Municipal Crew",
+                  NO_NEED: "General Assistance"}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+log = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher; matches() reports (start, pattern index) for every occurrence."""
+
+    def __init__(self, patterns: list):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(index)
+
+        queue = deque(self._goto[0].values())   # depth-1 states fail back to the root
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def matches(self, text: str) -> list:
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self.patterns
+        found = []
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                found.append((end - len(patterns[index]) + 1, index))
+        return found
+
+
+def hashed_features(texts: list, n_features: int = N_FEATURES) -> csr_matrix:
+    """Word unigrams + bigrams hashed into n_features columns, L2-normalized per row."""
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        tokens = _TOKEN.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        columns = {zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams}
+        indices.extend(columns)
+        data.extend([1.0 / math.sqrt(len(columns))] * len(columns) if columns else [])
+        indptr.append(len(indices))
+    return csr_matrix((np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32),
+                       np.asarray(indptr, dtype=np.int64)), shape=(len(texts), n_features))
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+class TriageClassifier:
+    def __init__(self, lexicon: dict, model: dict = None, gazetteer: list = LOCATIONS,
+                 escalate_below: float = None):
+        self.rules = lexicon["rules"]
+        keywords, self._keyword_rule = [], []
+        for rule_index, rule in enumerate(self.rules):
+            for keyword in rule["keywords"]:
+                keywords.append(keyword.lower())
+                self._keyword_rule.append(rule_index)
+        self._spam_start = len(keywords)
+        keywords += [keyword.lower() for keyword in lexicon.get("spam", [])]
+        self._keywords = AhoCorasick(keywords)
+
+        places = {}
+        for loc in gazetteer:
+            for alias in (loc["name"], loc.get("area", "")):
+                key = normalize_location(alias)
+                if key:
+                    places.setdefault(key, loc["name"])
+        self._place_names = list(places.values())
+        self._places = AhoCorasick([f" {alias} " for alias in places])
+
+        model = model or {}
+        self.n_features = int(model.get("n_features", N_FEATURES))
+        self.urgency_classes = [str(c) for c in model.get("urgency_classes", URGENCY_CLASSES)]
+        self.need_classes = [str(c) for c in model.get("need_classes", NEED_CLASSES)]
+        # Stored (features, classes) so a batch is a single CSR x dense product with no per-call transpose.
+        self._urgency_w = np.ascontiguousarray(np.asarray(
+            model.get("urgency_weights", np.zeros((len(self.urgency_classes), self.n_features))), dtype=np.float32).T)
+        self._urgency_b = np.asarray(model.get("urgency_bias", np.zeros(len(self.urgency_classes))), dtype=np.float32)
+        self._need_w = np.ascontiguousarray(np.asarray(
+            model.get("need_weights", np.zeros((len(self.need_classes), self.n_features))), dtype=np.float32).T)
+        self._need_b = np.asarray(model.get("need_bias", np.zeros(len(self.need_classes))), dtype=np.float32)
+        self._auth_w = np.asarray(model.get("auth_weights", np.zeros(self.n_features)), dtype=np.float32)
+        self._auth_b = float(np.asarray(model.get("auth_bias", 1.0)))
+        self.trained = "urgency_weights" in model
+        if escalate_below is None:
+            escalate_below = float(model.get("escalate_below", ESCALATE_BELOW))
+        self.escalate_below = escalate_below
+
+    @classmethod
+    def from_files(cls, lexicon_path: str = LEXICON_FILE, model_path: str = MODEL_FILE, **options) -> "TriageClassifier":
+        with open(lexicon_path, 'r', encoding='utf-8') as f:
+            lexicon = json.load(f)
+        model = None
+        if os.path.exists(model_path):
+            with np.load(model_path, allow_pickle=False) as saved:
+                model = {key: saved[key] for key in saved.files}
+        else:
+            log.warning("Triage model not found; classifying from the lexicon only", extra={"path": model_path})
+        return cls(lexicon, model, **options)
+
+    def classify_batch(self, texts: list) -> list:
+        """One result dict per text: urgency, need_type, label, severity, authenticity_prior, confidence, confident, ..."""
+        if not texts:
+            return []
+        features = hashed_features(texts, self.n_features)
+        urgency_logits = np.asarray(features @ self._urgency_w) + self._urgency_b
+        need_logits = np.asarray(features @ self._need_w) + self._need_b
+        auth_logits = np.asarray(features @ self._auth_w).ravel() + self._auth_b
+
+        hits = [self._scan(text) for text in texts]
+        for row, (rules, spam, _) in enumerate(hits):
+            for rule_index in rules:
+                rule = self.rules[rule_index]
+                urgency_logits[row, self.urgency_classes.index(rule["urgency"])] += LEXICON_BOOST
+                need_logits[row, self.need_classes.index(rule["need_type"])] += LEXICON_BOOST
+            auth_logits[row] -= SPAM_PENALTY * len(spam)
+
+        urgency_p, need_p = _softmax(urgency_logits), _softmax(need_logits)
+        auth_p = 1.0 / (1.0 + np.exp(-auth_logits))
+        confidence = np.minimum(urgency_p.max(axis=1), need_p.max(axis=1))
+
+        results = []
+        for row, (rules, spam, place) in enumerate(hits):
+            urgency = self.urgency_classes[int(urgency_p[row].argmax())]
+            need_type = self.need_classes[int(need_p[row].argmax())]
+            confident = bool(rules) and need_type != NO_NEED and confidence[row] >= self.escalate_below
+            first_rule = self.rules[rules[0]] if rules else None
+            if first_rule:
+                need_type = first_rule["need_type"]   # same source as the label: fleet.py dispatches on need_type
+            results.append({
+                "urgency": urgency,
+                "need_type": need_type,
+                "label": first_rule["label"] if first_rule else DEFAULT_LABELS.get(need_type, need_type),
+                "severity": first_rule["severity"] if first_rule else URGENCY_SEVERITY.get(urgency, 5),
+                "authenticity_prior": round(float(auth_p[row]), 3),
+                "confidence": round(float(confidence[row]), 3),
+                "keywords": [self.rules[r]["label"] for r in rules],
+                "spam": spam,
+                "location": place,
+                "confident": bool(confident),
+                "escalate": bool(not confident or place is None),
+            })
+        return results
+
+    def classify(self, text: str) -> dict:
+        return self.classify_batch([text])[0]
+
+    def analyze_batch(self, texts: list) -> list:
+        """classify_batch() shaped like a Gemini analysis, so build_incident_record can use it directly."""
+        return [self.to_analysis(text, result) for text, result in zip(texts, self.classify_batch(texts))]
+
+    @staticmethod
+    def to_analysis(text: str, result: dict) -> dict:
+        flags = [f"spam keyword: {keyword}" for keyword in result["spam"]]
+        if result["location"] is None:
+            flags.append("vague location")
+        return {
+            "location": result["location"] or "Unknown",
+            "urgency": result["urgency"],
+            "need_type": result["need_type"],
+            "summary": text[:120],
+            "authenticity_score": max(1, int(round(result["authenticity_prior"] * 10))),
+            "reasoning": f"Local triage model (confidence {result['confidence']:.2f}).",
+            "flags": flags,
+            "triage_confidence": result["confidence"],
+        }
+
+    # --- internal helpers ---
+    def _scan(self, text: str):
+        """(matched rule indexes in lexicon order, spam keywords, gazetteer place name or None)."""
+        rules, spam = set(), []
+        for _, index in self._keywords.matches(text.lower()):
+            if index >= self._spam_start:
+                spam.append(self._keywords.patterns[index])
+            else:
+                rules.add(self._keyword_rule[index])
+        place = None
+        best = 0
+        for _, index in self._places.matches(f" {normalize_location(text)} "):
+            if len(self._places.patterns[index]) > best:   # longest alias: "andheri station" over "andheri"
+                place, best = self._place_names[index], len(self._places.patterns[index])
+        return sorted(rules), sorted(set(spam)), place
+
+
+_shared_triage = None
+_shared_lock = threading.Lock()
+
+
+def get_triage() -> TriageClassifier:
+    """Process-wide classifier on the lexicon and model files next to this module, spotting this city's places."""
+    global _shared_triage
+    with _shared_lock:
+        if _shared_triage is None:
+            here = os.path.dirname(os.path.abspath(__file__))
+            _shared_triage = TriageClassifier.from_files(os.path.join(here, LEXICON_FILE),
+                                                         os.path.join(here, MODEL_FILE),
+                                                         gazetteer=get_city().gazetteer)
+        return _shared_triage
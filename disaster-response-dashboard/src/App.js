@@ -181,6 +181,39 @@ function App() {
       });
   }, []);
 
+  // 3. Live feed: the backend pushes newly reported incidents instead of us re-polling everything
+  useEffect(() => {
+    const stream = new EventSource('http://127.0.0.1:5001/sos_stream');
+    stream.addEventListener('incident', (e) => {
+      const incident = JSON.parse(e.data);
+      // journal_seq counts per city: behind the city router, several cities' streams arrive here.
+      // An incident we already show comes again when repeats of it are merged in: replace it in place.
+      const isSame = item => item.journal_seq && item.journal_seq === incident.journal_seq
+                             && item.city === incident.city;
+      setSosData(prev => prev.some(isSame)
+        ? prev.map(item => (isSame(item) ? incident : item))
+        : [incident, ...prev]);
+    });
+    // Ids are only unique within a city, so a removal names both (city is null for records without one).
+    stream.addEventListener('removed', (e) => {
+      const removed = JSON.parse(e.data);
+      setSosData(prev => prev.filter(item => !(item.id === removed.id
+                                               && (item.city ?? null) === (removed.city ?? null))));
+    });
+    // The backend could not replay what we missed (restart, compaction): start over from a full fetch.
+    stream.addEventListener('reset', () => {
+      fetch('http://127.0.0.1:5001/get_sos_data')
+        .then(res => {
+          if (!res.ok) throw new Error("Failed to connect to backend");
+          return res.json();
+        })
+        .then(data => setSosData(data.sort((a, b) => new Date(b.timestamp || 0) - new Date(a.timestamp || 0))))
+        .catch(err => console.error("Error refetching SOS data:", err));
+    });
+    stream.onerror = () => console.warn("SOS stream interrupted, browser will reconnect.");
+    return () => stream.close();
+  }, []);
+
   // Helper: Fetch Route in Background
   const fetchRouteForVehicle = async (vehicle, target) => {
     try {